@@ -0,0 +1,100 @@
+"""
+In-process onnx embeddings vs the hugging face endpoint.
+
+    python -m agent.benchmark_embeddings               # onnx backend only
+    python -m agent.benchmark_embeddings --endpoint    # also the endpoint (needs HUGGINGFACEHUB_API_TOKEN)
+
+Embeds chunks of scraped_documentation the same way setup_vectordb.py splits them and reports model load time,
+single query latency (what every retrieval pays), document throughput (what indexing pays) and, with --endpoint,
+how close the two backends' vectors are (an existing chroma_db only keeps working if they match).
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from agent.embeddings import EMBED_BATCH_SIZE, EMBED_THREADS, get_embeddings
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DOCS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraped_documentation")
+
+# related_docs_topic values the architect typically produces
+QUERIES = [
+    "React useState hook", "React useEffect cleanup", "useActionState form handling", "React context provider",
+    "Flask routing", "Flask SQLAlchemy models", "Flask request json body", "Flask blueprints",
+    "Vite config for react", "fetch api with async await", "CSS grid layout", "pytest fixtures",
+    "React component props", "Flask error handlers", "React lists and keys", "Flask templates jinja",
+]
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def load_chunks(limit: int) -> list[str]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(DOCS_PATH, "**", "*.md"), recursive=True)):
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            chunks.extend(splitter.split_text(f.read()))
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+def run(backend: str, chunks: list[str]) -> dict:
+    embeddings = get_embeddings(MODEL, backend)
+
+    start = time.perf_counter()
+    embeddings.embed_query("warm up")  # model load / first connection
+    load = time.perf_counter() - start
+
+    latencies = []
+    for query in QUERIES:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(chunks)
+    elapsed = time.perf_counter() - start
+    return {"load": load, "latencies": latencies, "throughput": len(chunks) / elapsed, "vectors": np.array(vectors)}
+
+def report(name: str, result: dict):
+    print(f"\n{name}")
+    print(f"  first call (load):            {result['load'] * 1000:.0f}ms")
+    print(f"  query latency p50 / p95:      {statistics.median(result['latencies']):.1f}ms / {_percentile(result['latencies'], 95):.1f}ms")
+    print(f"  document throughput:          {result['throughput']:.1f} chunks/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", action="store_true", help="also benchmark HuggingFaceEndpointEmbeddings")
+    parser.add_argument("--docs", type=int, default=256, help="number of documentation chunks to embed")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.docs)
+    if not chunks:
+        print(f"No markdown found under {DOCS_PATH}")
+        return 1
+    print(f"{len(chunks)} chunks, {len(QUERIES)} queries, batch size {EMBED_BATCH_SIZE}, {EMBED_THREADS} onnx threads")
+
+    onnx = run("onnx", chunks)
+    report("ONNX (in process)", onnx)
+    if not args.endpoint:
+        return
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    endpoint = run("endpoint", chunks)
+    report("HF endpoint", endpoint)
+
+    similarity = (onnx["vectors"] * endpoint["vectors"]).sum(axis=1)  # both are normalized
+    print(f"\n  query speedup p50:            {statistics.median(endpoint['latencies']) / statistics.median(onnx['latencies']):.1f}x")
+    print(f"  throughput speedup:           {onnx['throughput'] / endpoint['throughput']:.1f}x")
+    print(f"  cosine onnx vs endpoint:      min {similarity.min():.4f}, mean {similarity.mean():.4f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Local router vs llm router.
+
+    python -m agent.benchmark_router          # local classifier only
+    python -m agent.benchmark_router --llm    # also calls the groq router for every prompt (needs GROQ_API_KEY)
+
+Reports accuracy against hand labels, how many prompts the local classifier answers on its own at the configured
+confidence, its latency, and (with --llm) agreement with the llm and the latency saved per session.
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from agent.router_classifier import ROUTER_CONFIDENCE, predict, train
+
+# hand labelled, none of these are in SEED_EXAMPLES
+BENCHMARK_PROMPTS = [
+    ("simple react todo list", "build"),
+    ("todo app in react with local storage", "build"),
+    ("make a snake game in python", "build"),
+    ("create an express server with a /health route", "build"),
+    ("build a url shortener with flask", "build"),
+    ("I need a markdown previewer", "build"),
+    ("generate a pomodoro timer web app", "build"),
+    ("a script that downloads all images from a webpage", "build"),
+    ("create a react quiz app with a score board", "build"),
+    ("build an error logging dashboard", "build"),
+    ("set up a node backend with jwt auth", "build"),
+    ("make a tic tac toe game in react", "build"),
+    ("ImportError: cannot import name 'app' from partially initialized module", "debug"),
+    ("my useState update is not reflected right away, fix it", "debug"),
+    ("vite build fails: Could not resolve './App'", "debug"),
+    ("pytest says fixture 'client' not found", "debug"),
+    ("the flask route returns 404 even though it exists", "debug"),
+    ("Uncaught ReferenceError: process is not defined", "debug"),
+    ("why is my for loop running forever", "debug"),
+    ("sqlite3.OperationalError: no such table: users", "debug"),
+    ("my express server crashes on startup with EADDRINUSE", "debug"),
+    ("react component doesn't re-render after the api call", "debug"),
+    ("the npm test command fails with exit code 1", "debug"),
+    ("AttributeError: 'NoneType' object has no attribute 'json'", "debug"),
+    ("what is dependency injection", "learn"),
+    ("explain the event loop in node", "learn"),
+    ("how do python decorators work", "learn"),
+    ("what's the difference between let and const", "learn"),
+    ("when should I use redux", "learn"),
+    ("what is a jwt and how is it verified", "learn"),
+    ("explain list comprehensions with examples", "learn"),
+    ("how does flask handle sessions", "learn"),
+    ("what are generators in python", "learn"),
+    ("which is better for a beginner, vue or react", "learn"),
+    ("how do css grid and flexbox differ", "learn"),
+    ("teach me how git rebase works", "learn"),
+]
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def run_local():
+    train()
+    rows = []
+    for prompt, label in BENCHMARK_PROMPTS:
+        start = time.perf_counter()
+        route, confidence = predict(prompt)
+        rows.append({"prompt": prompt, "label": label, "route": route, "confidence": confidence,
+                     "ms": (time.perf_counter() - start) * 1000})
+    return rows
+
+def run_llm():
+    from dotenv import load_dotenv
+    load_dotenv()
+    from langchain_groq import ChatGroq
+    from agent.prompts import router_prompt
+    from agent.states import QueryRoute
+
+    router = ChatGroq(model="llama-3.3-70b-versatile").with_structured_output(QueryRoute)
+    rows = []
+    for prompt, label in BENCHMARK_PROMPTS:
+        start = time.perf_counter()
+        try:
+            route = router.invoke(router_prompt(prompt)).route
+        except Exception as e:
+            print(f"   llm router failed on '{prompt}': {e}")
+            route = "build"  # same default route_query uses
+        rows.append({"prompt": prompt, "label": label, "route": route, "ms": (time.perf_counter() - start) * 1000})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="also benchmark the groq router")
+    args = parser.parse_args()
+
+    local = run_local()
+    confident = [r for r in local if r["confidence"] >= ROUTER_CONFIDENCE]
+    latencies = [r["ms"] for r in local]
+
+    print(f"\nLocal classifier ({len(local)} prompts, confidence threshold {ROUTER_CONFIDENCE})")
+    print(f"  accuracy (all prompts):       {sum(r['route'] == r['label'] for r in local) / len(local):.1%}")
+    print(f"  answered locally:             {len(confident) / len(local):.1%}")
+    if confident:
+        print(f"  accuracy when answered:       {sum(r['route'] == r['label'] for r in confident) / len(confident):.1%}")
+    print(f"  latency p50 / p95:            {statistics.median(latencies):.2f}ms / {_percentile(latencies, 95):.2f}ms")
+
+    for r in local:
+        if r["route"] != r["label"]:
+            print(f"  miss: '{r['prompt']}' -> {r['route']} ({r['confidence']:.2f}), expected {r['label']}")
+
+    if not args.llm:
+        return
+
+    llm = run_llm()
+    llm_latencies = [r["ms"] for r in llm]
+    agreement = [l["route"] == c["route"] for l, c in zip(llm, local) if c["confidence"] >= ROUTER_CONFIDENCE]
+    saved = statistics.mean(llm_latencies) * len(confident) / len(local)
+
+    print(f"\nLLM router")
+    print(f"  accuracy:                     {sum(r['route'] == r['label'] for r in llm) / len(llm):.1%}")
+    print(f"  latency p50 / p95:            {statistics.median(llm_latencies):.0f}ms / {_percentile(llm_latencies, 95):.0f}ms")
+    if agreement:
+        print(f"  agreement with local answers: {sum(agreement) / len(agreement):.1%}")
+    print(f"  avg router latency saved:     {saved:.0f}ms per session")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+import pickle
+import threading
+from langgraph.checkpoint.memory import InMemorySaver
+
+# durable checkpoints for the graph. every session (= langgraph thread_id) gets an append-only log at
+# output/<session_id>/checkpoints/checkpoints.pkl, so a crashed run can pick up again from the last finished node
+# instead of paying for the planner, architect and every coder call a second time.
+# the in-memory saver does the actual langgraph bookkeeping, this class only mirrors its writes to disk and replays them
+
+CHECKPOINT_FILE = "checkpoints.pkl"
+
+class FileCheckpointSaver(InMemorySaver):
+    """InMemorySaver that appends every checkpoint, channel blob and pending write to a per-session file."""
+
+    def __init__(self, base_dir: str):
+        super().__init__()
+        self.base_dir = base_dir
+        self._file_lock = threading.RLock()
+        self._files = {}       # thread_id -> open append handle
+        self._loaded = set()   # thread_ids that are already replayed into memory
+
+    def _path(self, thread_id: str) -> str:
+        return os.path.join(self.base_dir, thread_id, "checkpoints", CHECKPOINT_FILE)
+
+    def _ensure_loaded(self, thread_id: str):
+        with self._file_lock:
+            if thread_id in self._loaded:
+                return
+            self._loaded.add(thread_id)
+            path = self._path(thread_id)
+            if not os.path.exists(path):
+                return
+
+            with open(path, "rb") as f:
+                while True:
+                    try:
+                        kind, key, value = pickle.load(f)
+                    except EOFError:
+                        break
+                    except Exception:
+                        # the process died halfway through a record. everything before it is still good
+                        break
+                    if kind == "blob":
+                        self.blobs[key] = value
+                    elif kind == "checkpoint":
+                        ns, checkpoint_id = key
+                        self.storage[thread_id][ns][checkpoint_id] = value
+                    elif kind == "writes":
+                        self.writes[key] = dict(value)
+
+    def _append(self, thread_id: str, records: list):
+        with self._file_lock:
+            f = self._files.get(thread_id)
+            if f is None:
+                path = self._path(thread_id)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                f = self._files[thread_id] = open(path, "ab")
+            for record in records:
+                pickle.dump(record, f)
+            f.flush()
+
+    def get_tuple(self, config):
+        self._ensure_loaded(config["configurable"]["thread_id"])
+        return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        if config:
+            self._ensure_loaded(config["configurable"]["thread_id"])
+        return super().list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        self._ensure_loaded(thread_id)
+        with self._file_lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            records = [("blob", (thread_id, checkpoint_ns, k, v), self.blobs[(thread_id, checkpoint_ns, k, v)])
+                       for k, v in new_versions.items()]
+            records.append((
+                "checkpoint",
+                (checkpoint_ns, checkpoint["id"]),
+                self.storage[thread_id][checkpoint_ns][checkpoint["id"]],
+            ))
+            self._append(thread_id, records)
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        self._ensure_loaded(thread_id)
+        with self._file_lock:
+            super().put_writes(config, writes, task_id, task_path)
+            outer_key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+            # the whole (small) write set of this checkpoint. replaying keeps the last one
+            self._append(thread_id, [("writes", outer_key, dict(self.writes[outer_key]))])
+
+    def delete_thread(self, thread_id: str):
+        with self._file_lock:
+            self.release(thread_id)
+            super().delete_thread(thread_id)
+            path = self._path(thread_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def release(self, thread_id: str):
+        """Drops a finished session from memory. Its file stays on disk, so it can still be resumed later."""
+        with self._file_lock:
+            f = self._files.pop(thread_id, None)
+            if f is not None:
+                f.close()
+            self._loaded.discard(thread_id)
+            self.storage.pop(thread_id, None)
+            for k in [k for k in self.writes if k[0] == thread_id]:
+                del self.writes[k]
+            for k in [k for k in self.blobs if k[0] == thread_id]:
+                del self.blobs[k]
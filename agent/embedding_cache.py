@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import xxhash
+from langchain_core.embeddings import Embeddings
+from termcolor import cprint
+
+from agent import metrics
+
+# content hash -> vector cache for the code memory. the coder rewrites files all the time (every repair loop, every
+# session scaffolding the same vite.config.js), most chunks come back unchanged and were embedded before.
+# vectors are keyed by xxh3 of model + chunk text and live in sqlite next to graph.py, shared by every session.
+# least recently used entries are dropped once the cache grows past its size cap
+
+CACHE_ENABLED = os.getenv("LOCKIN_EMBED_CACHE", "1") == "1"
+CACHE_PATH = os.getenv("LOCKIN_EMBED_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache.sqlite"))
+CACHE_MAX_BYTES = int(float(os.getenv("LOCKIN_EMBED_CACHE_MAX_MB", "128")) * 1024 * 1024)
+SQL_BATCH = 500  # keys per IN (...) query, sqlite caps the number of parameters
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def content_hash(text: str) -> str:
+    return xxhash.xxh3_64_hexdigest(text.encode("utf-8"))
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    conn = sqlite3.connect(CACHE_PATH, timeout=10)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS vectors (
+                        key TEXT PRIMARY KEY,
+                        vector BLOB,
+                        size INTEGER,
+                        last_used REAL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors(last_used)")
+                conn.commit()
+                _initialized = True
+    return conn
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def lookup(keys: list) -> dict:
+    """key -> vector for the keys that are cached."""
+    found, now = {}, time.time()
+    try:
+        with _db() as conn:
+            for start in range(0, len(keys), SQL_BATCH):
+                batch = keys[start:start + SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                for key, blob in conn.execute(f"SELECT key, vector FROM vectors WHERE key IN ({marks})", batch):
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                conn.execute(f"UPDATE vectors SET last_used = ? WHERE key IN ({marks})", [now, *batch])
+    except Exception as e:
+        # a broken cache must never break indexing
+        cprint(f"   [Embedding Cache] Lookup failed: {e}", "yellow")
+    return found
+
+def store(entries: dict):
+    now = time.time()
+    try:
+        with _db() as conn:
+            rows = []
+            for key, vector in entries.items():
+                blob = np.asarray(vector, dtype=np.float32).tobytes()
+                rows.append((key, blob, len(blob), now))
+            conn.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?)", rows)
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM vectors").fetchone()[0]
+            if total > CACHE_MAX_BYTES:
+                for old_key, size in conn.execute("SELECT key, size FROM vectors ORDER BY last_used").fetchall():
+                    if total <= CACHE_MAX_BYTES:
+                        break
+                    conn.execute("DELETE FROM vectors WHERE key = ?", (old_key,))
+                    total -= size
+    except Exception as e:
+        cprint(f"   [Embedding Cache] Store failed: {e}", "yellow")
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings object, documents whose text was embedded before come out of the cache."""
+
+    def __init__(self, embeddings, model_id: str):
+        self.embeddings = embeddings
+        self.model_id = model_id
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not CACHE_ENABLED or not texts:
+            return self.embeddings.embed_documents(texts)
+        keys = [content_hash(f"{self.model_id}\0{text}") for text in texts]
+        vectors = lookup(list(set(keys)))
+        missing = list({key: text for key, text in zip(keys, texts) if key not in vectors}.items())
+        metrics.embedding_cache_lookups.inc(len(texts) - len(missing), "hit")
+        metrics.embedding_cache_lookups.inc(len(missing), "miss")
+        if missing:
+            fresh = dict(zip([key for key, _ in missing], self.embeddings.embed_documents([text for _, text in missing])))
+            store(fresh)
+            vectors.update(fresh)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        # queries are one-off debugger questions, not worth a row
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,105 @@
+import os
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from termcolor import cprint
+
+# embedding backends for the docs store, the per session code memory and the plan library.
+# "onnx" runs all-MiniLM-L6-v2 in process on the cpu (onnxruntime + tokenizers), no network round trip per query
+# and no hf 504s. "endpoint" is the old HuggingFaceEndpointEmbeddings path.
+# both produce the same mean pooled, normalized sentence-transformers vectors, so an existing chroma_db keeps working.
+# benchmark: python -m agent.benchmark_embeddings
+
+EMBEDDING_BACKEND = os.getenv("LOCKIN_EMBEDDINGS", "onnx")  # onnx | endpoint
+EMBED_BATCH_SIZE = int(os.getenv("LOCKIN_EMBED_BATCH_SIZE", "32"))
+# onnxruntime threads per inference. embeddings run next to the coder threads, so not every core by default
+EMBED_THREADS = int(os.getenv("LOCKIN_EMBED_THREADS", str(min(4, os.cpu_count() or 1))))
+# folder with model.onnx + tokenizer.json, for machines that can't reach the hub. empty = download once into the hf cache
+ONNX_MODEL_DIR = os.getenv("LOCKIN_ONNX_MODEL_DIR", "")
+MAX_SEQ_LENGTH = 256  # what sentence-transformers truncates all-MiniLM-L6-v2 to
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers model exported to onnx, batched on the cpu. Loaded on first use."""
+
+    def __init__(self, model_id: str, batch_size: int = EMBED_BATCH_SIZE, threads: int = EMBED_THREADS,
+                 model_dir: str = ONNX_MODEL_DIR):
+        self.model_id = model_id
+        self.batch_size = batch_size
+        self.threads = threads
+        self.model_dir = model_dir
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _files(self) -> tuple[str, str]:
+        if self.model_dir:
+            return os.path.join(self.model_dir, "model.onnx"), os.path.join(self.model_dir, "tokenizer.json")
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(self.model_id, "onnx/model.onnx"), hf_hub_download(self.model_id, "tokenizer.json")
+
+    def _load(self):
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            model_path, tokenizer_path = self._files()
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+            tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+            self._tokenizer = tokenizer
+            self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            cprint(f"   [Embeddings] Loaded {self.model_id} (onnx, {self.threads} threads)", "grey")
+
+    def _embed_batch(self, texts: list) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        names = [i.name for i in self._session.get_inputs()]
+        hidden = self._session.run(None, {name: feeds[name] for name in names})[0]
+
+        # mean pooling over the real tokens, then l2 normalize (the model's sentence-transformers head)
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        self._load()
+        # similar lengths in one batch, less padding to run through the model
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def get_embeddings(model_id: str, backend: str = None):
+    """Shared embeddings object per (backend, model), the onnx session is loaded once per process."""
+    backend = backend or EMBEDDING_BACKEND
+    with _instances_lock:
+        key = (backend, model_id)
+        if key not in _instances:
+            if backend == "endpoint":
+                from langchain_huggingface import HuggingFaceEndpointEmbeddings
+                _instances[key] = HuggingFaceEndpointEmbeddings(repo_id=model_id)
+            elif backend == "onnx":
+                _instances[key] = OnnxEmbeddings(model_id)
+            else:
+                raise ValueError(f"Unknown embeddings backend '{backend}' (LOCKIN_EMBEDDINGS: onnx | endpoint)")
+        return _instances[key]
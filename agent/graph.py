@@ -3,30 +3,82 @@ load_dotenv()
 
 from langchain_groq import ChatGroq
 from langgraph.graph import StateGraph, END
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
+from langchain_core.runnables import RunnableLambda
 from langchain_community.vectorstores import Chroma
 from pydantic import BaseModel, Field
 import json
 import os
 import re
+import shlex
 import uuid
 import time
 import requests
+import httpx
 from termcolor import cprint
 from tavily import TavilyClient
-from e2b_code_interpreter import Sandbox
+from e2b_code_interpreter import Sandbox, AsyncSandbox
 from typing import List, Literal, Dict, Any 
 
 from agent.prompts import *
 from agent.states import * 
 from agent.memory import CodeMemory 
 from agent.sandbox_registry import get_sandbox_for_session, register_sandbox
-
-from concurrent.futures import ThreadPoolExecutor
+from agent.task_graph import build_task_waves
+from agent.test_impact import select_tests, package_dir, failed_tests_from_logs
+from agent.sandbox_warmup import start_sandbox_warmup, await_warm_sandbox, aawait_warm_sandbox, release_warm_sandbox
+from agent.checkpointer import FileCheckpointSaver
+from agent import metrics
+from agent.llm_cache import cached_call, acached_call
+from agent.plan_library import PlanLibrary
+from agent.router_classifier import classify as classify_route, log_route
+from agent.prompt_budget import budget_for, fit_coder_sections, fit_debugger_sections
+from agent.model_cascade import ModelCascade
+from agent.llm_gateway import LLMGateway, is_timeout
+from agent.patching import PatchError, patch_file
+from agent.log_classifier import classify as classify_logs
+from agent.log_compaction import compact as compact_logs, store_full_logs
+from agent.embeddings import get_embeddings
+from agent.hybrid_search import HybridRetriever
+from agent.lazy import Lazy
+from agent.research_cache import cached_research
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Small pool is enough; HF API is the bottleneck anyway
 embedding_executor = ThreadPoolExecutor(max_workers=2)
 
+# coder fan-out. independent files of the same dependency wave get written at the same time.
+# set LOCKIN_PARALLEL_CODER=0 to go back to one file per graph step
+PARALLEL_CODER = os.getenv("LOCKIN_PARALLEL_CODER", "1") == "1"
+CODER_MAX_WORKERS = int(os.getenv("LOCKIN_CODER_WORKERS", "4"))
+coder_executor = ThreadPoolExecutor(max_workers=CODER_MAX_WORKERS)
+
+# qa fan-out. test suites only need their source file, so they are all independent of each other
+QA_MAX_WORKERS = int(os.getenv("LOCKIN_QA_WORKERS", "4"))
+# request timeout of one llm attempt, handed to the groq client so a timed out request is really closed.
+# the gateway doesn't retry qa timeouts, so one suite spends at most (QA_MAX_RETRIES + 1) * QA_TASK_TIMEOUT on
+# requests (time waiting in the gateway's queue and 429 backoff not included)
+QA_TASK_TIMEOUT = int(os.getenv("LOCKIN_QA_TIMEOUT", "120"))
+QA_MAX_RETRIES = int(os.getenv("LOCKIN_QA_RETRIES", "1"))
+qa_executor = ThreadPoolExecutor(max_workers=QA_MAX_WORKERS)
+
+# streaming coder. files are generated from the llm token stream and pushed to the ui as file_delta events while they
+# are written, instead of one file_created after the whole generation. LOCKIN_STREAM_CODER=0 goes back to invoke()
+STREAM_CODER = os.getenv("LOCKIN_STREAM_CODER", "1") == "1"
+STREAM_FLUSH_SECONDS = float(os.getenv("LOCKIN_STREAM_FLUSH_SECONDS", "0.2"))  # deltas are batched, not one event per token
+
+# patch mode. fix mode asks for search/replace hunks instead of the whole file again and only falls back to a full
+# rewrite when a hunk doesn't apply. small files are cheaper to just rewrite
+PATCH_MODE = os.getenv("LOCKIN_PATCH_MODE", "1") == "1"
+PATCH_MIN_LINES = int(os.getenv("LOCKIN_PATCH_MIN_LINES", "40"))
+
+# research prefetch. session_id -> {(topic, use_tavily): Future}
+research_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LOCKIN_RESEARCH_WORKERS", "4")))
+_research_futures: Dict[str, Dict[tuple, Future]] = {}
+_research_lock = threading.Lock()
+
 
 # different llms:
 # llm = ChatGroq(model="openai/gpt-oss-120b")
@@ -34,9 +86,22 @@ embedding_executor = ThreadPoolExecutor(max_workers=2)
 # llm = ChatGroq(model="llama-3.1-8b-instant")
 # test_llm = ChatGroq(model="mixtral-8x7b-32768")
 
-llm = ChatGroq(model="llama-3.3-70b-versatile")
-code_llm = ChatGroq(model="openai/gpt-oss-120b")
-test_llm = ChatGroq(model="mixtral-8x7b-32768")
+# every groq call of every session in this process goes through one rate limit aware gateway (agent/llm_gateway.py).
+# the groq client's own retries are off, the gateway retries 429s with jittered backoff instead
+gateway = LLMGateway()
+
+def _chat_model(model: str):
+    # usage_handler books prompt/completion tokens on whichever graph node made the call (see agent/metrics.py)
+    return gateway.wrap(ChatGroq(model=model, max_retries=0, callbacks=[metrics.usage_handler]))
+
+# built on first use (or by warm_up), see agent/lazy.py
+llm = Lazy("llm", lambda: _chat_model("llama-3.3-70b-versatile"))
+code_llm = Lazy("code_llm", lambda: _chat_model("openai/gpt-oss-120b"))
+test_llm = Lazy("test_llm", lambda: _chat_model("mixtral-8x7b-32768"))
+
+# structured calls (router, planner, architect, evaluator, debugger) go through per node model tiers,
+# small model first where that is enough. see agent/model_cascade.py
+cascade = ModelCascade(_chat_model)
 
 
 # imp!!!!! this is an absolute path. It dynamically finds exactly where graph.py lives on your hard drive and forces the output folder to be created right next to it, 
@@ -49,37 +114,66 @@ DB_PATH = os.path.join(SCRIPT_DIR, "chroma_db")
 
 HF_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
-# Global callback for streaming file events
-_file_event_callback = None
+# callbacks for streaming file events, per session_id. several runs share the process (the api's job workers),
+# every event carries its session_id and only goes to that session's stream. the None key gets every event (cli / scripts)
+_file_event_callbacks = {}
+_file_event_lock = threading.Lock()
 
-def set_file_callback(callback):
-    """Set a callback function to receive file creation events"""
-    global _file_event_callback
-    _file_event_callback = callback
+def set_file_callback(callback, session_id: str = None):
+    """Set (or with callback=None, remove) the function that receives a session's file events"""
+    with _file_event_lock:
+        if callback is None:
+            _file_event_callbacks.pop(session_id, None)
+        else:
+            _file_event_callbacks[session_id] = callback
 
-def emit_file_event(event_type: str, data: dict):
+def emit_file_event(event_type: str, data: dict, quiet: bool = False):
     """Emit a file event if callback is registered"""
-    global _file_event_callback
-    cprint(f" [EMIT EVENT] Type: {event_type}, File: {data.get('filename', 'N/A')}", "magenta")
-    if _file_event_callback:
+    # quiet is for the high frequency file_delta events, logging every one of them would drown the console
+    if not quiet:
+        cprint(f" [EMIT EVENT] Type: {event_type}, File: {data.get('filename', 'N/A')}", "magenta")
+    with _file_event_lock:
+        callback = _file_event_callbacks.get(data.get("session_id")) or _file_event_callbacks.get(None)
+    if callback:
         try:
-            _file_event_callback(event_type, data)
-            cprint(f" [EMIT SUCCESS] Event sent to callback", "green")
+            callback(event_type, data)
+            if not quiet:
+                cprint(f" [EMIT SUCCESS] Event sent to callback", "green")
         except Exception as e:
             cprint(f"Error in file event callback: {e}", "red")
-    else:
+    elif not quiet:
         cprint(f" [EMIT WARNING] No callback registered!", "yellow")
 
-#load vector db
-cprint(f" Loading vector database from {DB_PATH}...", "yellow")
-embeddings = HuggingFaceEndpointEmbeddings(repo_id=HF_EMBEDDING_MODEL)
-db = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
-retriever = db.as_retriever(search_kwargs={"k": 3})
-cprint(" Vector database loaded successfully.", "green")
-
-# initialize tavily
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-cprint(" Tavily client initialized.", "green")
+# in process onnx by default, LOCKIN_EMBEDDINGS=endpoint for the hf inference api (agent/embeddings.py).
+# the onnx model itself is loaded on the first embedding
+embeddings = get_embeddings(HF_EMBEDDING_MODEL)
+
+def _load_db():
+    cprint(f" Loading vector database from {DB_PATH}...", "yellow")
+    return Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+
+# stores and clients are built on first use, warm_up() builds them up front
+db = Lazy("vector db", _load_db)
+# bm25 + vector hits fused by reciprocal rank (agent/hybrid_search.py)
+retriever = Lazy("retriever", lambda: HybridRetriever(db.get(), DB_PATH, k=int(os.getenv("LOCKIN_DOCS_K", "3"))))
+# prompts of passing builds + their plans, see agent/plan_library.py
+plan_library = Lazy("plan library", lambda: PlanLibrary(embeddings, os.path.join(SCRIPT_DIR, "plan_library")))
+tavily_client = Lazy("tavily", lambda: TavilyClient(api_key=os.getenv("TAVILY_API_KEY")))
+
+def warm_up():
+    """Builds the llm clients, the stores and the embedding model now instead of in the first request.
+    Called from the api's lifespan, failures are logged and left for the first real use to report."""
+    start = time.perf_counter()
+    for lazy in (llm, code_llm, test_llm, db, retriever, plan_library, tavily_client):
+        try:
+            lazy.get()
+        except Exception as e:
+            cprint(f"   [Warm Up] {lazy._name} failed: {e}", "yellow")
+    try:
+        embeddings.embed_query("warm up")
+    except Exception as e:
+        cprint(f"   [Warm Up] embeddings failed: {e}", "yellow")
+    cprint(f" Agent warmed up in {time.perf_counter() - start:.2f}s", "green")
 
 # mapping tech_stack keys to official documentation domains
 TECH_STACK_DOCS = {
@@ -106,14 +200,17 @@ TECH_STACK_DOCS = {
 }
 
 # agents + helper
-def route_query(state: GraphState) -> dict:
+# every llm/network bound agent has a sync version (run_graph) and an async twin (arun_graph).
+# the twins share their setup/teardown helpers and only differ in how they wait on I/O
+def _enter_router(state: GraphState) -> str:
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Entering Router...", "cyan", attrs=["bold"])
     
     users_prompt = state["user_prompt"]
     cprint(f" Routing query: {users_prompt[:100]}...", "yellow")
-    response = llm.with_structured_output(QueryRoute).invoke(router_prompt(users_prompt))
-    
+    return users_prompt
+
+def _route_result(response) -> dict:
     if response is None:
         cprint("Router failed, defaulting to 'build'", "red")
         return {"route": "build"}
@@ -121,24 +218,77 @@ def route_query(state: GraphState) -> dict:
     cprint(f" Decision: Route -> {response.route}", "green")
     return {"route": response.route}
 
-def planner_agent(state: GraphState) -> dict:
+def _cached_structured(node: str, schema, prompt, validate=None):
+    # router / planner / architect answers only depend on the prompt, so they go through the response cache
+    return cached_call(node, cascade.chain_name(node), schema, prompt,
+                       lambda: cascade.invoke_structured(node, schema, prompt, validate))
+
+async def _acached_structured(node: str, schema, prompt, validate=None):
+    return await acached_call(node, cascade.chain_name(node), schema, prompt,
+                              lambda: cascade.ainvoke_structured(node, schema, prompt, validate))
+
+# validation checks for the cascade. None accepts the answer, a reason escalates to the next model tier
+def _check_plan(plan: Plan) -> str | None:
+    if not plan.steps:
+        return "plan has no steps"
+    return None
+
+def _check_task_plan(task_plan: TaskPlan) -> str | None:
+    if not task_plan.implementation_steps:
+        return "no files to build"
+    if any(not step.file_name.strip() for step in task_plan.implementation_steps):
+        return "file task without a file name"
+    return None
+
+def _check_debug_plan(fix_plan: DebugPlan) -> str | None:
+    if not fix_plan.implementation_steps:
+        return "no files to patch"
+    if any(not step.file_name.strip() for step in fix_plan.implementation_steps):
+        return "fix task without a file name"
+    return None
+
+def route_query(state: GraphState) -> dict:
+    users_prompt = _enter_router(state)
+    # local classifier first, the llm only sees the prompts it is unsure about
+    local_route = classify_route(users_prompt)
+    if local_route is not None:
+        return _route_result(QueryRoute(route=local_route))
+
+    response = _cached_structured("router", QueryRoute, router_prompt(users_prompt))
+    if response is not None:
+        log_route(users_prompt, response.route, "llm")
+    return _route_result(response)
+
+async def aroute_query(state: GraphState) -> dict:
+    users_prompt = _enter_router(state)
+    # the first call trains the local model, keep it off the event loop
+    local_route = await asyncio.to_thread(classify_route, users_prompt)
+    if local_route is not None:
+        return _route_result(QueryRoute(route=local_route))
+
+    response = await _acached_structured("router", QueryRoute, router_prompt(users_prompt))
+    if response is not None:
+        await asyncio.to_thread(log_route, users_prompt, response.route, "llm")
+    return _route_result(response)
+
+def _enter_planner(state: GraphState) -> str:
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Entering Planner Workflow...", "cyan", attrs=["bold"])
     
-    session_id = state["session_id"]
-    users_prompt = state["user_prompt"]
-    
     # Emit planning start event
     emit_file_event("status", {
-        "session_id": session_id,
+        "session_id": state["session_id"],
         "message": "Planning project structure...",
         "stage": "planning"
     })
-    
-    response = llm.with_structured_output(Plan).invoke(planner_prompt(users_prompt))
+    return state["user_prompt"]
+
+def _finish_planner(state: GraphState, response, reuse_id: str = None) -> dict:
     if response is None:
         raise ValueError("Planner did not return a valid response.")
     
+    session_id = state["session_id"]
+
     # Emit plan created event
     emit_file_event("plan_created", {
         "session_id": session_id,
@@ -147,7 +297,6 @@ def planner_agent(state: GraphState) -> dict:
     })
     
     try:
-        session_id = state["session_id"]
         # each user(session for now) gets their own folder
         user_dir = os.path.join(OUTPUT_DIR, session_id, "plan") 
         os.makedirs(user_dir,exist_ok=True)
@@ -158,22 +307,47 @@ def planner_agent(state: GraphState) -> dict:
         cprint(f" Selected Tech Stack: {response.tech_stack}", "cyan")
     except Exception as e:
         cprint(f"Error saving plan output: {e}", "red")
+
+    # start booting the matching e2b template now instead of after coding + qa
+    start_sandbox_warmup(session_id, response.tech_stack)
         
-    return {"plan": response}
+    return {"plan": response, "plan_reuse": reuse_id}
+
+def planner_agent(state: GraphState) -> dict:
+    users_prompt = _enter_planner(state)
+    # a near duplicate of a prompt that already built successfully skips the planner + architect calls
+    # .get(): see the note in agent/lazy.py about attribute chains in node functions
+    reused = plan_library.get().find(users_prompt)
+    if reused is not None:
+        return _finish_planner(state, reused["plan"], reused["entry_id"])
+
+    response = _cached_structured("planner", Plan, planner_prompt(users_prompt), _check_plan)
+    return _finish_planner(state, response)
+
+async def aplanner_agent(state: GraphState) -> dict:
+    users_prompt = _enter_planner(state)
+    # the embedding lookup is a blocking http call
+    reused = await asyncio.to_thread(plan_library.get().find, users_prompt)
+    if reused is not None:
+        return _finish_planner(state, reused["plan"], reused["entry_id"])
+
+    response = await _acached_structured("planner", Plan, planner_prompt(users_prompt), _check_plan)
+    return _finish_planner(state, response)
 
 def normalize_deps(deps: list[str]) -> set[str]:
     # to convert all dependencies into lower case and to remove any extra space before or after them
     return {d.lower().strip() for d in deps}
 
-def architect_agent(state: GraphState) -> dict:
+def _enter_architect(state: GraphState) -> Plan:
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Entering Architect Workflow...", "cyan", attrs=["bold"])
     
     plan: Plan = state["plan"]
     
     cprint(" [1/2] Generating Task Plan & Dependencies...", "yellow")
-    task_response = llm.with_structured_output(TaskPlan).invoke(architect_prompt(plan))
-    
+    return plan
+
+def _architect_queue(task_response) -> tuple[list, str]:
     if task_response is None:
         raise ValueError("Architect (Builder) failed.")
     
@@ -188,8 +362,11 @@ def architect_agent(state: GraphState) -> dict:
     cprint(" [2/2] Generating QA Strategy...", "yellow")
     # converting the queuesteps in strings
     files_context = "\n".join([f"- {f['file_name']}: {f['task_description']}" for f in queue_steps])
-    qa_response = llm.with_structured_output(QAPlan).invoke(qa_architect_prompt(plan, files_context))
-    
+    return queue_steps, files_context
+
+def _finish_architect(state: GraphState, task_response, queue_steps: list, qa_response) -> dict:
+    plan: Plan = state["plan"]
+
     if qa_response is None:
         cprint(" QA Architect failed, proceeding with empty tests.", "red")
         qa_tasks = []
@@ -213,6 +390,14 @@ def architect_agent(state: GraphState) -> dict:
     except Exception as e:
         cprint(f"Error saving architect output: {e}", "red")
 
+    # kick off the coder's research now so tavily/chroma latency overlaps with everything before the first file
+    prefetch_research(
+        state["session_id"],
+        queue_steps,
+        state.get("search_method", False),
+        tech_stack=plan.tech_stack
+    )
+
     return {
         "task_queue": queue_steps,    # for coder
         "dependencies": normalize_deps(task_response.dependencies),
@@ -222,12 +407,51 @@ def architect_agent(state: GraphState) -> dict:
         "error_report": ""
     }   
 
+def _reused_architecture(state: GraphState) -> dict | None:
+    # the planner reused a stored plan, so the file tasks and qa plan that went with it are reused as well
+    reused = plan_library.load_architecture(state.get("plan_reuse"))
+    if reused is None:
+        return None
+    task_response, qa_response = reused
+    cprint(" Reusing the stored file manifest and QA strategy.", "green")
+    queue_steps, _ = _architect_queue(task_response)
+    return _finish_architect(state, task_response, queue_steps, qa_response)
+
+def architect_agent(state: GraphState) -> dict:
+    plan = _enter_architect(state)
+    reused = _reused_architecture(state)
+    if reused is not None:
+        return reused
+
+    task_response = _cached_structured("architect", TaskPlan, architect_prompt(plan), _check_task_plan)
+    queue_steps, files_context = _architect_queue(task_response)
+    qa_response = _cached_structured("qa_architect", QAPlan, qa_architect_prompt(plan, files_context))
+    return _finish_architect(state, task_response, queue_steps, qa_response)
+
+async def aarchitect_agent(state: GraphState) -> dict:
+    plan = _enter_architect(state)
+    reused = _reused_architecture(state)
+    if reused is not None:
+        return reused
+
+    task_response = await _acached_structured("architect", TaskPlan, architect_prompt(plan), _check_task_plan)
+    queue_steps, files_context = _architect_queue(task_response)
+    qa_response = await _acached_structured("qa_architect", QAPlan, qa_architect_prompt(plan, files_context))
+    return _finish_architect(state, task_response, queue_steps, qa_response)
+
 # below 2 functions are coder helpers: research and embed async 
-def perform_jit_research(topic: str, use_tavily: bool,approved_domains: list = None) -> str:
+def perform_jit_research(topic: str, use_tavily: bool, tech_stack: str = "unknown") -> str:
     """Performs Just-In-Time research using the selected method."""
     if not topic:
         return "No specific topic provided."
 
+    with metrics.timed("retrieval", topic):
+        # other sessions asked for the same topic before, see agent/research_cache.py
+        return cached_research(topic, tech_stack, use_tavily, lambda: _lookup_docs(topic, use_tavily, tech_stack))
+
+def _lookup_docs(topic: str, use_tavily: bool, tech_stack: str = "unknown") -> tuple[str, str | None]:
+    # (docs, source that answered). source is None when nothing could be looked up, those don't get cached
+    approved_domains = TECH_STACK_DOCS.get(tech_stack, [])
     if use_tavily:
         cprint(f"   [Tavily] Researching: {topic}...", "blue")
         # if approved_domains:
@@ -238,18 +462,86 @@ def perform_jit_research(topic: str, use_tavily: bool,approved_domains: list = N
             context = []
             for res in results.get("results", []):
                 context.append(f"Source: {res['url']}\nContent: {res['content']}")
-            return "\n\n".join(context)
+            return "\n\n".join(context), "tavily"
         except Exception as e:
             cprint(f"   [Tavily] Failed: {e}. Falling back to VectorDB.", "red")
 
     #default/fallback is vectordb incase we use up all tavily credits(been there done that)
     cprint(f"   [VectorDB] Retrieving docs for: {topic}...", "yellow")
     try:
-        results = retriever.invoke(topic)
-        return "\n".join([d.page_content for d in results])
+        # only the docs of this tech stack, an unknown stack searches everything
+        results = retriever.invoke(topic, domains=approved_domains)
+        return "\n".join([d.page_content for d in results]), "vectordb"
     except Exception as e:
         cprint(f"   [VectorDB] Failed: {e}", "red")
-        return "No documentation found."
+        return "No documentation found.", None
+
+def _research_key(topic: str, use_tavily: bool) -> tuple:
+    return (" ".join(topic.lower().split()), bool(use_tavily))
+
+def prefetch_research(session_id: str, tasks: list, use_tavily: bool, tech_stack: str = "unknown"):
+    """Starts a background lookup for every distinct related_docs_topic in the task queue."""
+    submitted = 0
+    with _research_lock:
+        futures = _research_futures.setdefault(session_id, {})
+        for task in tasks:
+            topic = task.get("related_docs_topic")
+            if not topic:
+                continue
+            key = _research_key(topic, use_tavily)
+            if key in futures:
+                continue
+            futures[key] = metrics.submit(research_executor, perform_jit_research, topic, use_tavily, tech_stack)
+            submitted += 1
+    if submitted:
+        cprint(f"   [Prefetch] Researching {submitted} topics in the background...", "blue")
+
+def get_research(session_id: str, topic: str, use_tavily: bool, tech_stack: str = "unknown") -> str:
+    """Returns the prefetched docs for a topic, only blocking if the lookup is still in flight."""
+    future = None
+    if topic:
+        with _research_lock:
+            future = _research_futures.get(session_id, {}).get(_research_key(topic, use_tavily))
+
+    if future is None:
+        return perform_jit_research(topic, use_tavily, tech_stack=tech_stack)
+
+    if not future.done():
+        cprint(f"   [Prefetch] Waiting on in-flight research for: {topic}...", "blue")
+    try:
+        return future.result()
+    except Exception as e:
+        cprint(f"   [Prefetch] Lookup failed ({e}). Researching again...", "red")
+        return perform_jit_research(topic, use_tavily, tech_stack=tech_stack)
+
+async def aget_research(session_id: str, topic: str, use_tavily: bool, tech_stack: str = "unknown") -> str:
+    """Async get_research. Lookups still run on the bounded research pool, the event loop only awaits them."""
+    future = None
+    if topic:
+        with _research_lock:
+            future = _research_futures.get(session_id, {}).get(_research_key(topic, use_tavily))
+
+    if future is None:
+        future = metrics.submit(research_executor, perform_jit_research, topic, use_tavily, tech_stack)
+    elif not future.done():
+        cprint(f"   [Prefetch] Waiting on in-flight research for: {topic}...", "blue")
+    try:
+        # shield so a cancelled run doesn't cancel a prefetch other files are still waiting on
+        return await asyncio.shield(asyncio.wrap_future(future))
+    except Exception as e:
+        cprint(f"   [Prefetch] Lookup failed ({e}). Researching again...", "red")
+        return await asyncio.wrap_future(metrics.submit(research_executor, perform_jit_research, topic, use_tavily, tech_stack))
+
+def clear_research_prefetch(session_id: str):
+    with _research_lock:
+        _research_futures.pop(session_id, None)
+
+def strip_markdown_fences(content: str) -> str:
+    # markdown cleanup for idk what
+    if content.startswith("```"):
+        content = re.sub(r"^```[a-zA-Z]*\n", "", content)
+        content = re.sub(r"\n```$", "", content)
+    return content
 
 def embed_file_async(session_id: str, filename: str, code_content: str):
     try:
@@ -260,20 +552,18 @@ def embed_file_async(session_id: str, filename: str, code_content: str):
         # try catch so as to never crash the graph from a background thread
         cprint(f"   Async embedding failed for {filename}: {e}", "red")
 
-def coder_agent(state: GraphState) -> dict:
-    cprint(f"\n{'='*50}", "magenta")
-    
-    queue = state.get("task_queue", [])
-    index = state.get("current_task_index", 0)
-    
-    if index >= len(queue):
-        cprint(" All tasks in queue completed.", "green")
-        return {"current_task_index": index} 
+def _research_request(state: GraphState, current_step: dict) -> tuple:
+    # (session_id, topic, search_method, tech_stack) for get_research / aget_research
+    plan = state.get("plan")
+    tech_stack = plan.tech_stack if plan else "unknown"
+    #retrieve from vector db or tavily
+    search_method = state.get("search_method", False)
+    return state["session_id"], current_step['related_docs_topic'], search_method, tech_stack
 
-    current_step = queue[index]
+def _prepare_file_task(state: GraphState, current_step: dict, doc_context: str) -> dict:
+    """Works out build vs fix mode for one FileTask and builds its coder prompt."""
     filename = current_step['file_name']
     task_desc = current_step['task_description']
-    topic = current_step['related_docs_topic']
     
     session_id = state["session_id"]
     user_code_dir = os.path.join(OUTPUT_DIR, session_id, "code") 
@@ -281,13 +571,6 @@ def coder_agent(state: GraphState) -> dict:
 
     plan = state.get("plan")
     tech_stack = plan.tech_stack if plan else "unknown"
-    official_domains = TECH_STACK_DOCS.get(tech_stack, [])
-
-    cprint(f" Processing File ({index+1}/{len(queue)}): {filename}", "cyan", attrs=["bold"])
-
-    #retrieve from vector db or tavily
-    search_method = state.get("search_method", False)
-    doc_context = perform_jit_research(topic, search_method,approved_domains=official_domains)
 
     # detect: is this a fix mode or build mode?
     error_report = state.get("error_report")
@@ -321,9 +604,16 @@ def coder_agent(state: GraphState) -> dict:
     mode = "fix" if (error_report and file_exists) else "build"
     
     if mode == "fix":
-        cprint("   [Mode] Repairing existing code based on error...", "yellow", attrs=["blink"])
+        cprint(f"   [Mode] Repairing existing code based on error ({filename})...", "yellow", attrs=["blink"])
     else:
-        cprint("   [Mode] Generating new code...", "green")
+        cprint(f"   [Mode] Generating new code ({filename})...", "green")
+
+    # a reused plan was written for an earlier, similar prompt. the coder gets this run's prompt as well so
+    # requirements the old plan doesn't mention still make it in. fresh plans were made from this prompt already
+    user_request = state.get("user_prompt", "") if state.get("plan_reuse") else ""
+
+    # docs and the error report are cut down to the model's token budget, existing_code never is
+    doc_context, error_report = fit_coder_sections(llm.model_name, mode, task_desc, doc_context, existing_code, error_report, user_request)
 
     prompt = construct_coder_prompt(
         filename=filename,
@@ -332,113 +622,453 @@ def coder_agent(state: GraphState) -> dict:
         mode=mode,
         existing_code=existing_code,
         error_report=error_report,
-        tech_stack=tech_stack
+        tech_stack=tech_stack,
+        user_request=user_request
     )
 
-    try:
-        response = llm.invoke(prompt)
-        code_content = response.content.strip()
-        
-        # markdown cleanup for idk what
-        if code_content.startswith("```"):
-            code_content = re.sub(r"^```[a-zA-Z]*\n", "", code_content)
-            code_content = re.sub(r"\n```$", "", code_content)
-
-        # finally write the file to disk
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(code_content)
-        
-        # Emit file creation event for streaming
-        emit_file_event("file_created", {
-            "session_id": session_id,
-            "filename": filename,
-            "content": code_content,
-            "mode": mode,
-            "progress": f"{index + 1}/{len(queue)}"
-        })
-
-        # to make sure that code is embedded even when hf gives 504 gateway error. 
-        # embedding_executor our object from class ThreadPoolExecutor uses a function which takes our function(embed_file_async) as a parameter
-        embedding_executor.submit(
-            embed_file_async,
-            session_id,
-            filename,
-            code_content
+    # big files in fix mode get repaired with hunks first, the full rewrite prompt above stays as the fallback
+    patch_prompt = None
+    if mode == "fix" and PATCH_MODE and existing_code.count("\n") + 1 >= PATCH_MIN_LINES:
+        patch_prompt = construct_coder_prompt(
+            filename=filename,
+            task_desc=task_desc,
+            doc_context=doc_context,
+            mode="patch",
+            existing_code=existing_code,
+            error_report=error_report,
+            tech_stack=tech_stack,
+            user_request=user_request
         )
 
+    return {"filename": filename, "file_path": file_path, "mode": mode, "prompt": prompt,
+            "patch_prompt": patch_prompt, "existing_code": existing_code}
+
+def _partial_path(file_path: str) -> str:
+    # hidden sibling of the target, same folder so os.replace is a rename and never a copy
+    return os.path.join(os.path.dirname(file_path), f".{os.path.basename(file_path)}.partial")
+
+def _atomic_write(file_path: str, content: str):
+    # readers (sandbox upload, debugger search, the ui) either see the old file or the new one, never half of it
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = _partial_path(file_path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, file_path)
+
+class FileStream:
+    """Collects a streamed generation, mirrors it into the .partial file and emits batched file_delta events."""
+
+    def __init__(self, state: GraphState, job: dict, index: int, total: int):
+        self.session_id = state["session_id"]
+        self.job = job
+        self.progress = f"{index + 1}/{total}"
+        self.parts = []
+        self.pending = ""
+        self.sent = 0          # chars already emitted, lets the ui detect a dropped delta
+        self.head_checked = False
+        self.fenced = False    # opened with ```lang, the closing ``` is kept out of the deltas too
+        self.last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(job["file_path"]), exist_ok=True)
+        self.partial = open(_partial_path(job["file_path"]), "w", encoding="utf-8")
+
+    def add(self, text: str):
+        if not text:
+            return
+        self.parts.append(text)
+        self.partial.write(text)
+        self.pending += text
+        if not self.head_checked:
+            # the opening ```lang line is stripped from the final file, keep it out of the deltas as well
+            if "\n" not in self.pending and len(self.pending) < 20:
+                return
+            self.head_checked = True
+            if self.pending.lstrip().startswith("```"):
+                self.fenced = True
+                self.pending = self.pending.lstrip().split("\n", 1)[1] if "\n" in self.pending else ""
+        if time.monotonic() - self.last_flush >= STREAM_FLUSH_SECONDS:
+            self.flush()
+
+    def _fence_start(self) -> int:
+        # where the trailing lines that could still become the closing ``` begin ("\n", "\n`", "\n```\n"...)
+        cut, i = len(self.pending), self.pending.rfind("\n")
+        while i != -1 and "```".startswith(self.pending[i:].strip()):
+            cut, i = i, self.pending.rfind("\n", 0, i)
+        return cut
+
+    def flush(self, final: bool = False):
+        self.last_flush = time.monotonic()
+        if self.fenced and final:
+            self.pending = re.sub(r"\n?```\s*$", "", self.pending)
+        # mid stream a possible closing fence waits for the next flush, the final one drops it
+        cut = self._fence_start() if self.fenced and not final else len(self.pending)
+        if not cut:
+            return
+        emit_file_event("file_delta", {
+            "session_id": self.session_id,
+            "filename": self.job["filename"],
+            "delta": self.pending[:cut],
+            "offset": self.sent,
+            "mode": self.job["mode"],
+            "progress": self.progress,
+        }, quiet=True)
+        self.sent += cut
+        self.pending = self.pending[cut:]
+
+    def close(self) -> str:
+        self.partial.close()
+        return "".join(self.parts)
+
+    def discard(self):
+        # failed generation, the old file (fix mode) stays untouched
+        self.partial.close()
+        try:
+            os.remove(_partial_path(self.job["file_path"]))
+        except OSError:
+            pass
+
+def stream_file(state: GraphState, job: dict, index: int, total: int) -> str:
+    """Generates one file from the llm token stream. Returns the raw response text."""
+    stream = FileStream(state, job, index, total)
+    try:
+        for chunk in llm.stream(job["prompt"]):
+            stream.add(chunk.content)
+        stream.flush(final=True)
+        return stream.close()
+    except BaseException:
+        stream.discard()
+        raise
+
+async def astream_file(state: GraphState, job: dict, index: int, total: int) -> str:
+    stream = FileStream(state, job, index, total)
+    try:
+        async for chunk in llm.astream(job["prompt"]):
+            stream.add(chunk.content)
+        stream.flush(final=True)
+        return stream.close()
+    except BaseException:
+        # includes cancellation of the run, no stray .partial files in the code folder
+        stream.discard()
+        raise
+
+def _apply_patch(job: dict, answer: str) -> str | None:
+    # patched file content, or None when the coder has to fall back to a full rewrite
+    try:
+        patched = patch_file(job["filename"], job["existing_code"], answer)
+    except PatchError as e:
+        cprint(f"   [Patch] {job['filename']}: {e}. Falling back to a full rewrite...", "yellow")
+        metrics.record_patch(False)
+        return None
+    cprint(f"   [Patch] Applied to {job['filename']}", "green")
+    metrics.record_patch(True)
+    return patched
+
+def patch_file_task(job: dict) -> str | None:
+    if not job.get("patch_prompt"):
+        return None
+    return _apply_patch(job, llm.invoke(job["patch_prompt"]).content)
+
+async def apatch_file_task(job: dict) -> str | None:
+    if not job.get("patch_prompt"):
+        return None
+    return _apply_patch(job, (await llm.ainvoke(job["patch_prompt"])).content)
+
+def _write_generated_file(state: GraphState, job: dict, content: str, index: int, total: int) -> str:
+    return _save_file(state, job, strip_markdown_fences(content.strip()), index, total)
+
+def _save_file(state: GraphState, job: dict, code_content: str, index: int, total: int) -> str:
+    session_id = state["session_id"]
+    filename = job["filename"]
+    file_path = job["file_path"]
+
+    # finally write the file to disk
+    _atomic_write(file_path, code_content)
+    
+    # Emit file creation event for streaming
+    emit_file_event("file_created", {
+        "session_id": session_id,
+        "filename": filename,
+        "content": code_content,
+        "mode": job["mode"],
+        "progress": f"{index + 1}/{total}"
+    })
+
+    # to make sure that code is embedded even when hf gives 504 gateway error. 
+    # embedding_executor our object from class ThreadPoolExecutor uses a function which takes our function(embed_file_async) as a parameter
+    embedding_executor.submit(
+        embed_file_async,
+        session_id,
+        filename,
+        code_content
+    )
+    return filename
+
+def generate_file(state: GraphState, current_step: dict, index: int, total: int) -> str:
+    """Researches, generates and writes a single FileTask. Returns the relative filename that was written."""
+    cprint(f" Processing File ({index+1}/{total}): {current_step['file_name']}", "cyan", attrs=["bold"])
+    session_id, topic, search_method, tech_stack = _research_request(state, current_step)
+    doc_context = get_research(session_id, topic, search_method, tech_stack=tech_stack)
+    job = _prepare_file_task(state, current_step, doc_context)
+
+    try:
+        patched = patch_file_task(job)
+        if patched is not None:
+            return _save_file(state, job, patched, index, total)
+        content = stream_file(state, job, index, total) if STREAM_CODER else llm.invoke(job["prompt"]).content
+        return _write_generated_file(state, job, content, index, total)
     except Exception as e:
         cprint(f"   Generation failed: {e}", "red")
         raise e
 
+async def agenerate_file(state: GraphState, current_step: dict, index: int, total: int) -> str:
+    cprint(f" Processing File ({index+1}/{total}): {current_step['file_name']}", "cyan", attrs=["bold"])
+    session_id, topic, search_method, tech_stack = _research_request(state, current_step)
+    doc_context = await aget_research(session_id, topic, search_method, tech_stack=tech_stack)
+    job = _prepare_file_task(state, current_step, doc_context)
+
+    try:
+        patched = await apatch_file_task(job)
+        if patched is not None:
+            return _save_file(state, job, patched, index, total)
+        content = await astream_file(state, job, index, total) if STREAM_CODER else (await llm.ainvoke(job["prompt"])).content
+        return _write_generated_file(state, job, content, index, total)
+    except Exception as e:
+        cprint(f"   Generation failed: {e}", "red")
+        raise e
+
+def _merge_waves(queue: list, written: dict) -> dict:
+    return {
+        "current_task_index": len(queue),
+        # merged in queue order, not completion order, so completed_files is the same on every run
+        "completed_files": [written[i] for i in sorted(written)],
+    }
+
+def run_coder_waves(state: GraphState, queue: list, start: int) -> dict:
+    """Writes every remaining task in the queue, one dependency wave at a time, on the bounded coder pool."""
+    waves = build_task_waves(queue, start)
+    cprint(f" Parallel build: {len(queue) - start} files in {len(waves)} waves (max {CODER_MAX_WORKERS} workers)", "cyan", attrs=["bold"])
+
+    written = {}
+    for wave_number, wave in enumerate(waves, start=1):
+        cprint(f"   [Wave {wave_number}/{len(waves)}] {[queue[i]['file_name'] for i in wave]}", "blue")
+        futures = {i: metrics.submit(coder_executor, generate_file, state, queue[i], i, len(queue)) for i in wave}
+
+        # wait for the whole wave before raising so no thread is still writing files when the graph errors out
+        errors = []
+        for i in wave:
+            try:
+                written[i] = futures[i].result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    return _merge_waves(queue, written)
+
+async def arun_coder_waves(state: GraphState, queue: list, start: int) -> dict:
+    waves = build_task_waves(queue, start)
+    cprint(f" Parallel build: {len(queue) - start} files in {len(waves)} waves (max {CODER_MAX_WORKERS} at once)", "cyan", attrs=["bold"])
+    semaphore = asyncio.Semaphore(CODER_MAX_WORKERS)
+
+    async def bounded(i: int) -> str:
+        async with semaphore:
+            return await agenerate_file(state, queue[i], i, len(queue))
+
+    written = {}
+    for wave_number, wave in enumerate(waves, start=1):
+        cprint(f"   [Wave {wave_number}/{len(waves)}] {[queue[i]['file_name'] for i in wave]}", "blue")
+        results = await asyncio.gather(*(bounded(i) for i in wave), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+        written.update(zip(wave, results))
+
+    return _merge_waves(queue, written)
+
+def _enter_coder(state: GraphState) -> tuple[list, int]:
+    cprint(f"\n{'='*50}", "magenta")
+    
+    queue = state.get("task_queue", [])
+    index = state.get("current_task_index", 0)
+    
+    if index >= len(queue):
+        cprint(" All tasks in queue completed.", "green")
+    return queue, index
+
+def _coder_step_result(index: int, filename: str) -> dict:
     return {
         "current_task_index": index + 1,   #this is so that the coder knows whether it needs to loop back or move on (i could just add a for loop instead and remove this state variable entirely but im done with this shit)
         "completed_files": [filename],
         # "error_report": "" 
     }
 
-def qa_agent(state: GraphState) -> dict:
+def coder_agent(state: GraphState) -> dict:
+    queue, index = _enter_coder(state)
+    if index >= len(queue):
+        return {"current_task_index": index} 
+
+    if PARALLEL_CODER and len(queue) - index > 1:
+        return run_coder_waves(state, queue, index)
+
+    return _coder_step_result(index, generate_file(state, queue[index], index, len(queue)))
+
+async def acoder_agent(state: GraphState) -> dict:
+    queue, index = _enter_coder(state)
+    if index >= len(queue):
+        return {"current_task_index": index} 
+
+    if PARALLEL_CODER and len(queue) - index > 1:
+        return await arun_coder_waves(state, queue, index)
+
+    return _coder_step_result(index, await agenerate_file(state, queue[index], index, len(queue)))
+
+def _qa_prompt(task: dict, position: int, total: int, user_code_dir: str, tech_stack: str) -> str | None:
+    test_filename = task['test_file_name']
+    target_filename = task['target_file']
+    scenarios = task['test_scenarios']
+
+    cprint(f"   [{position}/{total}] Creating {test_filename} for {target_filename}...", "blue")
+    
+    # read the freshly generated source code
+    source_path = os.path.join(user_code_dir, target_filename)
+    if os.path.exists(source_path):
+        with open(source_path, "r") as f:
+            source_code = f.read()
+    else:
+        cprint(f"   Source file {target_filename} not found! Skipping...", "red")
+        return None
+        
+    return construct_qa_prompt(target_filename, source_code, scenarios, tech_stack)
+
+def _write_test_suite(task: dict, user_code_dir: str, content: str):
+    test_filename = task['test_file_name']
+    test_code = strip_markdown_fences(content.strip())
+    
+    test_path = os.path.join(user_code_dir, test_filename)
+    os.makedirs(os.path.dirname(test_path), exist_ok=True)
+    with open(test_path, "w") as f:
+        f.write(test_code)
+    
+    cprint(f"   Saved {test_filename}", "green")
+
+def generate_test_suite(task: dict, position: int, total: int, user_code_dir: str, tech_stack: str) -> dict:
+    """Writes one QATask to disk. Every attempt gets QA_TASK_TIMEOUT seconds and failed attempts are retried."""
+    started = time.perf_counter()
+    report = {"test_file": task['test_file_name'], "target_file": task['target_file'], "status": "skipped", "attempts": 0}
+
+    qa_prompt = _qa_prompt(task, position, total, user_code_dir, tech_stack)
+    if qa_prompt is not None:
+        report["status"] = "failed"
+        for attempt in range(1, QA_MAX_RETRIES + 2):
+            report["attempts"] = attempt
+            try:
+                # the timeout goes to the request itself, a retry never runs next to an abandoned call.
+                # nothing is written to disk until a response actually comes back
+                response = llm.invoke(qa_prompt, timeout=QA_TASK_TIMEOUT)
+                _write_test_suite(task, user_code_dir, response.content)
+                report["status"] = "saved"
+                break
+            except Exception as e:
+                if is_timeout(e):
+                    cprint(f"   Test generation for {task['target_file']} timed out after {QA_TASK_TIMEOUT}s (attempt {attempt}/{QA_MAX_RETRIES + 1})", "red")
+                else:
+                    cprint(f"   Failed to generate test for {task['target_file']} (attempt {attempt}/{QA_MAX_RETRIES + 1}): {e}", "red")
+
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+async def agenerate_test_suite(task: dict, position: int, total: int, user_code_dir: str, tech_stack: str) -> dict:
+    started = time.perf_counter()
+    report = {"test_file": task['test_file_name'], "target_file": task['target_file'], "status": "skipped", "attempts": 0}
+
+    qa_prompt = _qa_prompt(task, position, total, user_code_dir, tech_stack)
+    if qa_prompt is not None:
+        report["status"] = "failed"
+        for attempt in range(1, QA_MAX_RETRIES + 2):
+            report["attempts"] = attempt
+            try:
+                response = await llm.ainvoke(qa_prompt, timeout=QA_TASK_TIMEOUT)
+                _write_test_suite(task, user_code_dir, response.content)
+                report["status"] = "saved"
+                break
+            except Exception as e:
+                if is_timeout(e):
+                    cprint(f"   Test generation for {task['target_file']} timed out after {QA_TASK_TIMEOUT}s (attempt {attempt}/{QA_MAX_RETRIES + 1})", "red")
+                else:
+                    cprint(f"   Failed to generate test for {task['target_file']} (attempt {attempt}/{QA_MAX_RETRIES + 1}): {e}", "red")
+
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+def _enter_qa(state: GraphState) -> tuple | None:
     # note: this agent should only run once. 
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Entering QA Agent (Test Generation)...", "cyan", attrs=["bold"])
     
     qa_plan = state.get("qa_plan", [])
-    session_id = state["session_id"]
     plan = state.get("plan")
     tech_stack = plan.tech_stack if plan else "unknown"
-    user_code_dir = os.path.join(OUTPUT_DIR, session_id, "code")
+    user_code_dir = os.path.join(OUTPUT_DIR, state["session_id"], "code")
     
     if not qa_plan:
         cprint(" No QA tasks defined. Skipping test generation.", "yellow")
-        return {}
+        return None
 
-    cprint(f" Generating {len(qa_plan)} test suites...", "green")
+    cprint(f" Generating {len(qa_plan)} test suites (max {QA_MAX_WORKERS} at once)...", "green")
+    return qa_plan, user_code_dir, tech_stack
 
-    for i, task in enumerate(qa_plan):
-        test_filename = task['test_file_name']
-        target_filename = task['target_file']
-        scenarios = task['test_scenarios']
-        
-        cprint(f"   [{i+1}/{len(qa_plan)}] Creating {test_filename} for {target_filename}...", "blue")
-        
-        # read the freshly generated source code
-        source_path = os.path.join(user_code_dir, target_filename)
-        if os.path.exists(source_path):
-            with open(source_path, "r") as f:
-                source_code = f.read()
-        else:
-            cprint(f"   Source file {target_filename} not found! Skipping...", "red")
-            continue
-            
-        qa_prompt = construct_qa_prompt(target_filename, source_code, scenarios, tech_stack)
+def _finish_qa(state: GraphState, reports: list, wall_time: float) -> dict:
+    serial_time = sum(r["seconds"] for r in reports)
+    cprint(" QA suite timings:", "cyan")
+    for r in reports:
+        cprint(f"   {r['test_file']:<45} {r['status']:<8} {r['seconds']:>7.2f}s  attempts={r['attempts']}", "cyan")
+    cprint(f" QA wall time {wall_time:.2f}s vs {serial_time:.2f}s serial ({serial_time / max(wall_time, 0.01):.1f}x)", "green")
 
-        try:
-            response = llm.invoke(qa_prompt)
-            test_code = response.content.strip()
-            
-            # Cleanup Markdown
-            if test_code.startswith("```"):
-                test_code = re.sub(r"^```[a-zA-Z]*\n", "", test_code)
-                test_code = re.sub(r"\n```$", "", test_code)
-            
-            test_path = os.path.join(user_code_dir, test_filename)
-            os.makedirs(os.path.dirname(test_path), exist_ok=True)
-            with open(test_path, "w") as f:
-                f.write(test_code)
-            
-            cprint(f"   Saved {test_filename}", "green")
-            
-        except Exception as e:
-            cprint(f"   Failed to generate test for {target_filename}: {e}", "red")
+    try:
+        user_dir = os.path.join(OUTPUT_DIR, state["session_id"], "plan")
+        os.makedirs(user_dir, exist_ok=True)
+        with open(os.path.join(user_dir, "qa_timings.json"), "w") as f:
+            json.dump({"wall_seconds": round(wall_time, 2), "suites": reports}, f, indent=4)
+    except Exception as e:
+        cprint(f"Error saving QA timings: {e}", "red")
 
     return {"status": "qa_complete"} # state doesn't need to change much, files are on disk
 
-def dependency_validator_agent(state: GraphState) -> dict:
+def qa_agent(state: GraphState) -> dict:
+    entered = _enter_qa(state)
+    if entered is None:
+        return {}
+    qa_plan, user_code_dir, tech_stack = entered
+
+    started = time.perf_counter()
+    futures = [
+        metrics.submit(qa_executor, generate_test_suite, task, i + 1, len(qa_plan), user_code_dir, tech_stack)
+        for i, task in enumerate(qa_plan)
+    ]
+    # collected in plan order so the report lines up with architect_qa.json
+    reports = [future.result() for future in futures]
+    return _finish_qa(state, reports, time.perf_counter() - started)
+
+async def aqa_agent(state: GraphState) -> dict:
+    entered = _enter_qa(state)
+    if entered is None:
+        return {}
+    qa_plan, user_code_dir, tech_stack = entered
+    semaphore = asyncio.Semaphore(QA_MAX_WORKERS)
 
+    async def bounded(i: int, task: dict) -> dict:
+        async with semaphore:
+            return await agenerate_test_suite(task, i + 1, len(qa_plan), user_code_dir, tech_stack)
+
+    started = time.perf_counter()
+    reports = await asyncio.gather(*(bounded(i, task) for i, task in enumerate(qa_plan)))
+    return _finish_qa(state, list(reports), time.perf_counter() - started)
+
+def _collect_package_checks(state: GraphState) -> tuple[list, list]:
     # check requirements.txt and package.json to see if the packages actually exist or not
     # cus if they dont then no point in making executor install them and then crashing 
     # if they exist then cool go to executer and install deps. if they dont, skip exec and go to eval straight to debug and fix req.txt or package.json
     # basically sends api requests to pypi or npmjs
+    # returns (checks, failed_packages). every check is (registry name, url, package name)
 
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Entering Dependency Validator (API Sanity Check)...", "cyan", attrs=["bold"])
@@ -446,7 +1076,7 @@ def dependency_validator_agent(state: GraphState) -> dict:
     session_id = state["session_id"]
     user_code_dir = os.path.join(OUTPUT_DIR, session_id, "code")
     
-    files = state.get("completed_files", [])
+    checks = []
     failed_packages = []
 
     # Find all package files no matter what folder they are in
@@ -471,13 +1101,7 @@ def dependency_validator_agent(state: GraphState) -> dict:
             match = re.match(r'^([a-zA-Z0-9_\-]+)', line)
             if match:
                 pkg_name = match.group(1)
-                try:
-                    res = requests.get(f"https://pypi.org/pypi/{pkg_name}/json", timeout=10)
-                    if res.status_code != 200:
-                        cprint(f"   [!] HALLUCINATION DETECTED: {pkg_name} does not exist on PyPI.", "red")
-                        failed_packages.append(pkg_name)
-                except requests.exceptions.RequestException as e:
-                    cprint(f"   [!] Network timeout validating {pkg_name}. Skipping check.", "yellow")
+                checks.append(("PyPI", f"https://pypi.org/pypi/{pkg_name}/json", pkg_name))
 
     # node package.json check
     for pkg_json_path in pkg_paths:
@@ -488,16 +1112,19 @@ def dependency_validator_agent(state: GraphState) -> dict:
                 deps = {**pkg_data.get("dependencies", {}), **pkg_data.get("devDependencies", {})}
                 
                 for pkg_name in deps.keys():
-                    try:
-                        res = requests.get(f"https://registry.npmjs.org/{pkg_name}", timeout=10)
-                        if res.status_code != 200:
-                            cprint(f"   [!] HALLUCINATION DETECTED: {pkg_name} does not exist on npm.", "red")
-                            failed_packages.append(pkg_name)
-                    except requests.exceptions.RequestException as e:
-                        cprint(f"   [!] Network timeout validating {pkg_name}. Skipping check.", "yellow")
+                    checks.append(("npm", f"https://registry.npmjs.org/{pkg_name}", pkg_name))
             except json.JSONDecodeError:
                 failed_packages.append(f"{pkg_json_path} (Invalid JSON Syntax)")
 
+    return checks, failed_packages
+
+def _package_missing(registry: str, pkg_name: str, status_code: int) -> bool:
+    if status_code != 200:
+        cprint(f"   [!] HALLUCINATION DETECTED: {pkg_name} does not exist on {registry}.", "red")
+        return True
+    return False
+
+def _validation_result(failed_packages: list) -> dict:
     # routing logic
     if failed_packages:
         error_msg = f"Dependency Validation Failed. The following packages DO NOT EXIST in the official registries: {', '.join(failed_packages)}. You hallucinated the package name. Find the correct, real package name."
@@ -510,11 +1137,47 @@ def dependency_validator_agent(state: GraphState) -> dict:
             logs=error_msg,
             environment_ok=False 
         )
-        return {"execution_result": execution}
+        # goes straight to the evaluator, past the log compactor. the message above is the whole log, and the
+        # previous iteration's full_logs_path must not be handed on with it
+        return {"execution_result": execution, "full_logs_path": None}
     
     cprint("   All dependencies exist. Proceeding to execution.", "green")
     return {"execution_result": None}  #IMPORTANT. DO NOT CHANGE THIS OR INFINITE LOOP GO BRRRRRR
 
+def dependency_validator_agent(state: GraphState) -> dict:
+    checks, failed_packages = _collect_package_checks(state)
+
+    for registry, url, pkg_name in checks:
+        try:
+            res = requests.get(url, timeout=10)
+            if _package_missing(registry, pkg_name, res.status_code):
+                failed_packages.append(pkg_name)
+        except requests.exceptions.RequestException as e:
+            cprint(f"   [!] Network timeout validating {pkg_name}. Skipping check.", "yellow")
+
+    return _validation_result(failed_packages)
+
+async def adependency_validator_agent(state: GraphState) -> dict:
+    checks, failed_packages = _collect_package_checks(state)
+    # all registry lookups go out at once instead of one by one
+    semaphore = asyncio.Semaphore(10)
+
+    async def check(client: httpx.AsyncClient, registry: str, url: str, pkg_name: str) -> bool:
+        async with semaphore:
+            try:
+                res = await client.get(url)
+                return _package_missing(registry, pkg_name, res.status_code)
+            except httpx.HTTPError as e:
+                cprint(f"   [!] Network timeout validating {pkg_name}. Skipping check.", "yellow")
+                return False
+
+    async with httpx.AsyncClient(timeout=10) as client:
+        missing = await asyncio.gather(*(check(client, *c) for c in checks))
+
+    # keep the same order the sync validator reports them in
+    failed_packages += [pkg_name for (_, _, pkg_name), is_missing in zip(checks, missing) if is_missing]
+    return _validation_result(failed_packages)
+
 
 def runtime_selector(state: GraphState) -> dict:
     # select e2b templates. (e2b templates were created in setup_e2b_templates.py file. do not touch it(its one time config anyways))
@@ -534,12 +1197,146 @@ def runtime_selector(state: GraphState) -> dict:
 
     return {"runtime_template": template}
 
+# do not change the sandbox commands please. they are precarious and were crafted carefully after 100 app crashes
+def _install_commands(template_string: str) -> list:
+    # (message, command, timeout)
+    commands = []
+    if "python" in template_string:
+        # Install pytest globally first, then find any requirements.txt anywhere in the app and install it from within its own directory
+        commands.append(("   Installing Python dependencies and pytest...", "pip install pytest --break-system-packages", 60))
+        commands.append((None, "cd /home/user/app && find . -name 'requirements.txt' -execdir pip install -r {} --break-system-packages \\;", 120))
+    if "node" in template_string:
+        # execdir and legacy peer flags are imp!!!
+        commands.append(("   Installing Node dependencies...", "cd /home/user/app && find . -name 'package.json' -not -path '*/node_modules/*' -execdir npm install --legacy-peer-deps \\;", 120))
+    return commands
+
+def _test_commands(template_string: str) -> list:
+    # (message, color, log header, command, timeout). again do not change the test commands
+    npm_test = "cd /home/user/app && find . -name 'package.json' -not -path '*/node_modules/*' -execdir npm test \\;"
+    if template_string == "python-base":
+        return [("   Running Python tests...", "yellow", "", "cd /home/user/app && python -m pytest -q", 30)]
+    if template_string == "node-base":
+        return [("   Running Node tests...", "yellow", "", npm_test, 60)]
+    if template_string == "node-python-base":
+        return [
+            ("   Running Frontend Tests...", "blue", "=== FRONTEND LOGS ===\n", npm_test, 60),
+            ("   Running Backend Tests...", "blue", "\n=== BACKEND LOGS ===\n", "cd /home/user/app && PYTHONPATH=. python3 -m pytest -q", 60),
+        ]
+    return []
+
+def _impacted_test_commands(state: GraphState, template_string: str, code_dir: str) -> list:
+    # repair iterations only: the tests that touch the files the debugger just patched + whatever failed last time.
+    # same tuple shape as _test_commands. the full suite still runs afterwards as the confirmation pass
+    if not state.get("iteration_count"):
+        return []
+
+    # the coder appends the path it actually wrote for every task of this iteration, after the resolution of a
+    # log-relative name like src/App.jsx to frontend/src/App.jsx. the raw task file_name would miss those tests
+    queue = state.get("task_queue", [])
+    completed = state.get("completed_files", [])
+    patched = completed[-len(queue):] if queue and len(completed) >= len(queue) else [task.get("file_name") for task in queue]
+    selection = select_tests(code_dir, state.get("qa_plan", []), patched, state.get("failed_tests", []))
+    if not selection:
+        return []
+    cprint(f"   [Impact] Patched {patched} -> running {selection['python'] + selection['node']} first", "blue")
+
+    commands = []
+    if selection["python"] and "python" in template_string:
+        python = "PYTHONPATH=. python3" if template_string == "node-python-base" else "python"
+        tests = " ".join(shlex.quote(t) for t in selection["python"])
+        timeout = 30 if template_string == "python-base" else 60
+        commands.append(("   Running impacted Python tests...", "yellow", "=== IMPACTED PYTHON TESTS ===\n",
+                         f"cd /home/user/app && {python} -m pytest -q {tests}", timeout))
+    if selection["node"] and "node" in template_string:
+        by_package = {}
+        for test in selection["node"]:
+            package = package_dir(code_dir, test)
+            by_package.setdefault(package, []).append(os.path.relpath(test, package) if package else test)
+        for package, package_tests in by_package.items():
+            tests = " ".join(shlex.quote(t) for t in package_tests)
+            commands.append(("   Running impacted Node tests...", "yellow", f"=== IMPACTED NODE TESTS ({package or '.'}) ===\n",
+                             f"cd /home/user/app/{package} && npm test -- {tests}", 60))
+    return commands
+
+def _sandbox_uploads(code_dir: str):
+    # sync files. do this everytime cus during debug loop the coder might change files so e2b vm gotta have the updated versions in it
+    for root, _, files in os.walk(code_dir):
+        for file in files:
+            local = os.path.join(root, file)
+            yield local, f"/home/user/app/{os.path.relpath(local, code_dir)}"
+
+def _install_failed_result(state: GraphState, sandbox_id: str, e: Exception) -> dict:
+    # if pip or npm explodes,i.e, installing of dependencies wasnt successful, catch it and send it eval and debugger so that coder can fix req.txt and package.json
+    cprint(f"   Dependency Install Failed: {e}", "red")
+    
+    execution = ExecutionResult(
+        tests_ran=False,
+        tests_passed=False,
+        exit_code=1,
+        logs=f"Failed to install dependencies. Check your requirements.txt or package.json for invalid packages. Error: {str(e)}",
+        environment_ok=False  # flag that the environment is broken!
+    )
+    # leave the executor, no point in going to the next bit
+    return {
+        "execution_result": execution,
+        "sandbox_id": sandbox_id,
+        "iteration_count": state.get("iteration_count", 0) + 1
+    }
+
+def _crashed_execution(template_string: str, combined_logs: str, e: Exception) -> ExecutionResult:
+    # E2B throws an exception immediately if a test fails (Exit Code > 0).
+    # In the hybrid setup, if the Frontend fails, it will catch here and skip the Backend tests. 
+    # This is a good "fail-fast" mechanism so the Debugger can fix one thing at a time!
+    error_logs = getattr(e, 'stdout', '') + getattr(e, 'stderr', str(e))
+    exit_code = getattr(e, 'exit_code', 2)
+    
+    cprint(f"   Tests Failed or Crashed (Exit Code {exit_code})", "red")
+    
+    # If it's hybrid, append whatever logs we managed to collect before the crash
+    final_logs = (combined_logs + "\n=== CRASH LOGS ===\n" + error_logs) if template_string == "node-python-base" else error_logs
+    
+    return ExecutionResult(
+        tests_ran=True,
+        tests_passed=False,
+        exit_code=exit_code,
+        logs=final_logs,
+        environment_ok=True 
+    )
+
+def _lock_file_path(template_string: str) -> str:
+    # find where the lockfile was generated (root or frontend/)
+    return "frontend/package-lock.json" if template_string == "node-python-base" else "package-lock.json"
+
+def _save_package_lock(session_id: str, code_dir: str, lock_path: str, lock_content_bytes):
+    # read from e2b (returns bytes, decode to string)
+    lock_content = lock_content_bytes.decode("utf-8") if isinstance(lock_content_bytes, bytes) else lock_content_bytes
+    
+    #save to disk
+    local_lock_path = os.path.join(code_dir, lock_path)
+    with open(local_lock_path, "w", encoding="utf-8") as f:
+        f.write(lock_content)
+    cprint(f"   Saved {lock_path} for WebContainer optimization.", "green")
+    
+    # Emit file_created event for package-lock.json
+    cprint(f" [CHECKPOINT 1] About to emit package-lock.json event...", "cyan")
+    cprint(f" [CHECKPOINT 2] Content length: {len(lock_content)} chars", "cyan")
+    emit_file_event("file_created", {
+        "session_id": session_id,
+        "filename": lock_path,
+        "content": lock_content,
+        "mode": "generated",
+        "progress": "npm dependencies"
+    })
+    cprint(f" [CHECKPOINT 3] Emit call completed for package-lock.json", "cyan")
+
 def executor_agent(state: GraphState) -> dict:
     cprint(" Entering Executor...", "cyan", attrs=["bold"])
 
     session_id = state.get("session_id")
     # Extract the string value of template from the dictionary
     template_string = runtime_selector(state).get("runtime_template")
+    # if the planner started a speculative sandbox, wait for it. a ready one is already in the registry
+    await_warm_sandbox(session_id, template_string)
     saved_sandbox_id = state.get("sandbox_id") or get_sandbox_for_session(session_id)
 
     sandbox = None
@@ -560,82 +1357,35 @@ def executor_agent(state: GraphState) -> dict:
         register_sandbox(session_id, sandbox.sandbox_id)
         cprint(f"   New Sandbox Created and Registered. ID: {sandbox.sandbox_id}", "green")
 
-    # sync files. do this everytime cus during debug loop the coder might change files so e2b vm gotta have the updated versions in it
     code_dir = os.path.join(OUTPUT_DIR, session_id, "code")
-    for root, _, files in os.walk(code_dir):
-        for file in files:
-            local = os.path.join(root, file)
-            remote = f"/home/user/app/{os.path.relpath(local, code_dir)}"
-            sandbox.files.write(remote, open(local, "rb"))
+    for local, remote in _sandbox_uploads(code_dir):
+        sandbox.files.write(remote, open(local, "rb"))
 
     # install deps
-    # do not change the sandbox commands please. they are precarious and were crafted carefully after 100 app crashes
     try:
-        if "python" in template_string:
-            cprint("   Installing Python dependencies and pytest...", "yellow")
-            # Install pytest globally first
-            sandbox.commands.run(
-                "pip install pytest --break-system-packages", 
-                timeout=60
-            )
-            # Find any requirements.txt anywhere in the app and install it from within its own directory
-            sandbox.commands.run(
-                "cd /home/user/app && find . -name 'requirements.txt' -execdir pip install -r {} --break-system-packages \\;", 
-                timeout=120
-            )       
+        for message, command, timeout in _install_commands(template_string):
+            if message:
+                cprint(message, "yellow")
+            with metrics.timed("install", command):
+                sandbox.commands.run(command, timeout=timeout)
+        if "python" in template_string or "node" in template_string:
             cprint("   Finished Install", "cyan")
-            
-        if "node" in template_string:
-            cprint("   Installing Node dependencies...", "yellow")
-            # execdir and legacy peer flags are imp!!!
-            sandbox.commands.run(
-                "cd /home/user/app && find . -name 'package.json' -not -path '*/node_modules/*' -execdir npm install --legacy-peer-deps \\;", 
-                timeout=120
-            )
-            cprint("   Finished Install", "cyan")
-
     except Exception as e:
-        # if pip or npm explodes,i.e, installing of dependencies wasnt successful, catch it and send it eval and debugger so that coder can fix req.txt and package.json
-        cprint(f"   Dependency Install Failed: {e}", "red")
-        
-        execution = ExecutionResult(
-            tests_ran=False,
-            tests_passed=False,
-            exit_code=1,
-            logs=f"Failed to install dependencies. Check your requirements.txt or package.json for invalid packages. Error: {str(e)}",
-            environment_ok=False  # flag that the environment is broken!
-        )
-        # leave the executor, no point in going to the next bit
-        return {
-            "execution_result": execution,
-            "sandbox_id": sandbox.sandbox_id,
-            "iteration_count": state.get("iteration_count", 0) + 1
-        }
+        return _install_failed_result(state, sandbox.sandbox_id, e)
 
     # assuming deps were installed successfully
     cprint("   Running tests...", "magenta")
     
+    combined_logs = ""
     try:
-        combined_logs = ""
-        # again do not change the test commands
-        if template_string == "python-base":
-            cprint("   Running Python tests...", "yellow")
-            result = sandbox.commands.run("cd /home/user/app && python -m pytest -q", timeout=30)
-            combined_logs = result.stdout + result.stderr
-            
-        elif template_string == "node-base":
-            cprint("   Running Node tests...", "yellow")
-            result = sandbox.commands.run("cd /home/user/app && find . -name 'package.json' -not -path '*/node_modules/*' -execdir npm test \\;", timeout=60)
-            combined_logs = result.stdout + result.stderr
-            
-        elif template_string == "node-python-base":
-            cprint("   Running Frontend Tests...", "blue")
-            res_node = sandbox.commands.run("cd /home/user/app && find . -name 'package.json' -not -path '*/node_modules/*' -execdir npm test \\;", timeout=60)
-            combined_logs += "=== FRONTEND LOGS ===\n" + res_node.stdout + res_node.stderr
-            
-            cprint("   Running Backend Tests...", "blue")
-            res_py = sandbox.commands.run("cd /home/user/app && PYTHONPATH=. python3 -m pytest -q", timeout=60)
-            combined_logs += "\n=== BACKEND LOGS ===\n" + res_py.stdout + res_py.stderr
+        for commands in (_impacted_test_commands(state, template_string, code_dir), _test_commands(template_string)):
+            # impacted tests fail fast. once they pass, the full suite is the confirmation pass and its logs are the ones that count
+            combined_logs = ""
+            for message, color, header, command, timeout in commands:
+                cprint(message, color)
+                with metrics.timed("test", command):
+                    result = sandbox.commands.run(command, timeout=timeout)
+                combined_logs += header + result.stdout + result.stderr
             
         execution = ExecutionResult(
             tests_ran=True,
@@ -646,64 +1396,119 @@ def executor_agent(state: GraphState) -> dict:
         )
 
     except Exception as e:
-        # E2B throws an exception immediately if a test fails (Exit Code > 0).
-        # In the hybrid setup, if the Frontend fails, it will catch here and skip the Backend tests. 
-        # This is a good "fail-fast" mechanism so the Debugger can fix one thing at a time!
-        error_logs = getattr(e, 'stdout', '') + getattr(e, 'stderr', str(e))
-        exit_code = getattr(e, 'exit_code', 2)
-        
-        cprint(f"   Tests Failed or Crashed (Exit Code {exit_code})", "red")
-        
-        # If it's hybrid, append whatever logs we managed to collect before the crash
-        final_logs = (combined_logs + "\n=== CRASH LOGS ===\n" + error_logs) if template_string == "node-python-base" else error_logs
-        
+        execution = _crashed_execution(template_string, combined_logs, e)
+
+    # extract package-lock.json for webcontainer
+    if "node" in template_string:
+        cprint("   Extracting package-lock.json from Sandbox...", "cyan")
+        try:
+            lock_path = _lock_file_path(template_string)
+            _save_package_lock(session_id, code_dir, lock_path, sandbox.files.read(f"/home/user/app/{lock_path}"))
+        except Exception as e:
+            cprint(f"   Could not extract package-lock.json: {e}", "yellow")
+
+    return {
+        "execution_result": execution,
+        "sandbox_id": sandbox.sandbox_id,
+        "iteration_count": state.get("iteration_count", 0) + 1,
+        "failed_tests": [] if execution.tests_passed else failed_tests_from_logs(execution.logs)
+    }
+
+async def aexecutor_agent(state: GraphState) -> dict:
+    cprint(" Entering Executor...", "cyan", attrs=["bold"])
+
+    session_id = state.get("session_id")
+    template_string = runtime_selector(state).get("runtime_template")
+    await aawait_warm_sandbox(session_id, template_string)
+    saved_sandbox_id = state.get("sandbox_id") or get_sandbox_for_session(session_id)
+
+    sandbox = None
+    if saved_sandbox_id:
+        try:
+            sandbox = await AsyncSandbox.connect(saved_sandbox_id)
+            cprint(f"   Reconnected to Sandbox: {saved_sandbox_id}", "green")
+        except Exception as e:
+            cprint(f"   Could not connect (might have timed out). Creating new one. Error: {e}", "red")            
+            sandbox = None
+
+    if not sandbox:
+        cprint("   Spinning up NEW Cloud Sandbox...", "blue")
+        sandbox = await AsyncSandbox.create(template=template_string)
+        register_sandbox(session_id, sandbox.sandbox_id)
+        cprint(f"   New Sandbox Created and Registered. ID: {sandbox.sandbox_id}", "green")
+
+    code_dir = os.path.join(OUTPUT_DIR, session_id, "code")
+    for local, remote in _sandbox_uploads(code_dir):
+        with open(local, "rb") as f:
+            await sandbox.files.write(remote, f.read())
+
+    try:
+        for message, command, timeout in _install_commands(template_string):
+            if message:
+                cprint(message, "yellow")
+            with metrics.timed("install", command):
+                await sandbox.commands.run(command, timeout=timeout)
+        if "python" in template_string or "node" in template_string:
+            cprint("   Finished Install", "cyan")
+    except Exception as e:
+        return _install_failed_result(state, sandbox.sandbox_id, e)
+
+    cprint("   Running tests...", "magenta")
+    
+    combined_logs = ""
+    try:
+        for commands in (_impacted_test_commands(state, template_string, code_dir), _test_commands(template_string)):
+            # impacted tests fail fast. once they pass, the full suite is the confirmation pass and its logs are the ones that count
+            combined_logs = ""
+            for message, color, header, command, timeout in commands:
+                cprint(message, color)
+                with metrics.timed("test", command):
+                    result = await sandbox.commands.run(command, timeout=timeout)
+                combined_logs += header + result.stdout + result.stderr
+            
         execution = ExecutionResult(
             tests_ran=True,
-            tests_passed=False,
-            exit_code=exit_code,
-            logs=final_logs,
-            environment_ok=True 
+            tests_passed=True,
+            exit_code=0,
+            logs=combined_logs,
+            environment_ok=True
         )
 
-    # extract package-lock.json for webcontainer
+    except Exception as e:
+        execution = _crashed_execution(template_string, combined_logs, e)
+
     if "node" in template_string:
         cprint("   Extracting package-lock.json from Sandbox...", "cyan")
         try:
-            # find where the lockfile was generated (root or frontend/)
-            lock_path = "frontend/package-lock.json" if template_string == "node-python-base" else "package-lock.json"
-            remote_path = f"/home/user/app/{lock_path}"
-            
-            # read from e2b (returns bytes, decode to string)
-            lock_content_bytes = sandbox.files.read(remote_path)
-            lock_content = lock_content_bytes.decode("utf-8") if isinstance(lock_content_bytes, bytes) else lock_content_bytes
-            
-            #save to disk
-            local_lock_path = os.path.join(code_dir, lock_path)
-            with open(local_lock_path, "w", encoding="utf-8") as f:
-                f.write(lock_content)
-            cprint(f"   Saved {lock_path} for WebContainer optimization.", "green")
-            
-            # Emit file_created event for package-lock.json
-            cprint(f" [CHECKPOINT 1] About to emit package-lock.json event...", "cyan")
-            cprint(f" [CHECKPOINT 2] Content length: {len(lock_content)} chars", "cyan")
-            emit_file_event("file_created", {
-                "session_id": session_id,
-                "filename": lock_path,
-                "content": lock_content,
-                "mode": "generated",
-                "progress": "npm dependencies"
-            })
-            cprint(f" [CHECKPOINT 3] Emit call completed for package-lock.json", "cyan")
+            lock_path = _lock_file_path(template_string)
+            _save_package_lock(session_id, code_dir, lock_path, await sandbox.files.read(f"/home/user/app/{lock_path}"))
         except Exception as e:
             cprint(f"   Could not extract package-lock.json: {e}", "yellow")
 
     return {
         "execution_result": execution,
         "sandbox_id": sandbox.sandbox_id,
-        "iteration_count": state.get("iteration_count", 0) + 1
+        "iteration_count": state.get("iteration_count", 0) + 1,
+        "failed_tests": [] if execution.tests_passed else failed_tests_from_logs(execution.logs)
     }
 
-def evaluator_agent(state: dict) -> dict:
+def log_compactor_agent(state: GraphState) -> dict:
+    # the evaluator and the debugger get the failures, not 30kb of npm install. full logs stay on disk
+    execution = state.get("execution_result")
+    if not execution or not execution.logs:
+        return {"full_logs_path": None}  # nothing stored this iteration, don't point at the last one's logs
+    logs = execution.logs
+    path = store_full_logs(OUTPUT_DIR, state["session_id"], state.get("iteration_count", 0), logs)
+    compacted = compact_logs(logs)
+    if len(compacted) < len(logs):
+        cprint(f"   [Log Compactor] {len(logs)} -> {len(compacted)} chars (full logs: {path})", "blue")
+    return {
+        "execution_result": execution.model_copy(update={"logs": compacted}),
+        "full_logs_path": path
+    }
+
+def _prepare_evaluation(state: GraphState) -> tuple[dict | None, str | None]:
+    # returns (result, None) when no llm is needed, otherwise (None, evaluator prompt)
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Entering Evaluator (LLM Analysis)...", "cyan", attrs=["bold"])
     
@@ -711,7 +1516,7 @@ def evaluator_agent(state: dict) -> dict:
     execution = state.get("execution_result")
     if not execution:
         cprint("   No execution result found in state. Defaulting to Fail.", "red")
-        return {"status": "fail", "error_report": "Missing execution payload.", "error_category": "infra"}
+        return {"status": "fail", "error_report": "Missing execution payload.", "error_category": "infra"}, None
 
     logs = execution.logs
     exit_code = execution.exit_code
@@ -720,29 +1525,50 @@ def evaluator_agent(state: dict) -> dict:
     # Fast-track success
     if execution.tests_passed and env_ok:
         cprint(f" Evaluation: PASS", "green", attrs=["bold"])
+        if state.get("plan") is not None and not state.get("plan_reuse"):
+            # known-good plan, keep it for similar prompts. embedding is an http call so it goes to the background
+            embedding_executor.submit(plan_library.remember, state["user_prompt"], os.path.join(OUTPUT_DIR, state["session_id"], "plan"))
         return {
             "status": "pass", 
             "error_report": "All tests passed successfully.",
             "error_category": ErrorCategory.NONE.value,
             "attempt_history": state.get("attempt_history", [])
-        }
+        }, None
+
+    # most logs say what broke in so many words, the rules handle those without an llm call (agent/log_classifier.py)
+    classified = classify_logs(execution)
+    if classified is not None:
+        cprint("   [Log Classifier] Recognised the failure, skipping the LLM.", "blue")
+        metrics.record_evaluation("rules", classified.category.value)
+        return _finish_evaluation(state, classified.status, classified.feedback, classified.category.value), None
 
-    eval_prompt = construct_evaluator_prompt(env_ok, exit_code, logs)
     # basically eval just takes executors state, and classifies the error into one of the 5 categories and
     # summarizes the logs
+    return None, construct_evaluator_prompt(env_ok, exit_code, logs)
+
+def _evaluation_check(state: GraphState):
+    # the evaluator only runs for failed executions, and a broken environment is always infra (see the prompt)
+    env_ok = state["execution_result"].environment_ok
+
+    def check(result: EvaluationResult) -> str | None:
+        if result.status != "fail":
+            return "tests failed but the answer says pass"
+        if not env_ok and result.category != ErrorCategory.INFRA:
+            return "environment failed but the category is not infra"
+        if not result.feedback.strip():
+            return "empty feedback"
+        return None
+    return check
+
+def _evaluation_fallback(state: GraphState, e: Exception) -> tuple[str, str, str]:
     # if eval fails then we just pass raw logs to the debugger and hardcode the category as runtime 
-    try:
-        response = llm.with_structured_output(EvaluationResult).invoke(eval_prompt)
-        status = response.status
-        feedback = response.feedback
-        category = response.category.value
-        
-    except Exception as e:
-        cprint(f"   Evaluator LLM failed: {e}. Defaulting to Runtime Fail.", "red")
-        status = "fail"
-        feedback = f"Evaluator crashed. Raw logs: {logs[-500:]}"
-        category = "runtime"
+    cprint(f"   Evaluator LLM failed: {e}. Defaulting to Runtime Fail.", "red")
+    # logs are compacted already, failures first, so the head is the useful part
+    logs = state["execution_result"].logs
+    full_logs = f" (full logs: {state['full_logs_path']})" if state.get("full_logs_path") else ""
+    return "fail", f"Evaluator crashed. Logs{full_logs}: {logs[:2000]}", "runtime"
 
+def _finish_evaluation(state: GraphState, status: str, feedback: str, category: str) -> dict:
     cprint(f" Evaluation: FAIL [{category.upper()}]", "red", attrs=["bold"])
     cprint(f" Reason: {feedback}", "red")
         
@@ -753,6 +1579,36 @@ def evaluator_agent(state: dict) -> dict:
         "attempt_history": state.get("attempt_history", [])
     }
 
+def evaluator_agent(state: dict) -> dict:
+    result, eval_prompt = _prepare_evaluation(state)
+    if result is not None:
+        return result
+
+    try:
+        response = cascade.invoke_structured("evaluator", EvaluationResult, eval_prompt, _evaluation_check(state))
+        status, feedback, category = response.status, response.feedback, response.category.value
+        metrics.record_evaluation("llm", category)
+    except Exception as e:
+        status, feedback, category = _evaluation_fallback(state, e)
+        metrics.record_evaluation("fallback", category)
+
+    return _finish_evaluation(state, status, feedback, category)
+
+async def aevaluator_agent(state: dict) -> dict:
+    result, eval_prompt = _prepare_evaluation(state)
+    if result is not None:
+        return result
+
+    try:
+        response = await cascade.ainvoke_structured("evaluator", EvaluationResult, eval_prompt, _evaluation_check(state))
+        status, feedback, category = response.status, response.feedback, response.category.value
+        metrics.record_evaluation("llm", category)
+    except Exception as e:
+        status, feedback, category = _evaluation_fallback(state, e)
+        metrics.record_evaluation("fallback", category)
+
+    return _finish_evaluation(state, status, feedback, category)
+
 # do not change this function, it works exceptionally well
 def search_codebase_filesystem(session_id: str, error_report: str, max_files: int = 5) -> str:
     # takes error string and pattern matches it with code(every line of every file in every folder)
@@ -812,16 +1668,14 @@ def search_codebase_filesystem(session_id: str, error_report: str, max_files: in
 
     return "No relevant code found via filesystem."
 
-def debugger_agent(state: dict) -> dict:
+def _prepare_debugger(state: dict) -> str:
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Entering Debugger...", "cyan", attrs=["bold"])
     
     session_id = state.get("session_id")
     current_error = state.get("error_report")
     error_category = state.get("error_category", "runtime")
-    iteration = state.get("iteration_count", 1)
     past_attempts = state.get("attempt_history", [])
-    plan = state.get("plan")
     
     #past history + attempts
     formatted_history = ""
@@ -834,6 +1688,11 @@ def debugger_agent(state: dict) -> dict:
     cprint("   Gathering codebase context...", "yellow")
     relevant_context = search_codebase_filesystem(session_id, current_error)
     cprint(f"   Retrieved code context: {relevant_context[:75]}", "yellow")
+    # trimming happens on the result, search_codebase_filesystem itself stays as it is.
+    # the prompt goes to the debugger's cascade tiers, not llm. it is built once for all of them, so it has to fit the
+    # tier with the smallest budget
+    budget_model = min(cascade.tiers_for("debugger"), key=budget_for)
+    current_error, relevant_context = fit_debugger_sections(budget_model, current_error, formatted_history, relevant_context)
 
     # dynamic instructions based on category(classified by eval)
     category_instructions = ""
@@ -848,15 +1707,20 @@ def debugger_agent(state: dict) -> dict:
     elif error_category == "runtime":
         category_instructions = "This is a RUNTIME error. The code compiled but crashed during execution (e.g., TypeError, AttributeError, KeyError). Trace the variables and object types to prevent the crash."
 
-    prompt = construct_debugger_prompt(
+    return construct_debugger_prompt(
         error_category=error_category,
         category_instructions=category_instructions,
         current_error=current_error,
         formatted_history=formatted_history,
         relevant_context=relevant_context,
     )
-    
-    fix_plan = llm.with_structured_output(DebugPlan).invoke(prompt)
+
+def _finish_debugger(state: dict, fix_plan) -> dict:
+    session_id = state.get("session_id")
+    current_error = state.get("error_report")
+    error_category = state.get("error_category", "runtime")
+    iteration = state.get("iteration_count", 1)
+    plan = state.get("plan")
 
     try:
         user_debug_dir = os.path.join(OUTPUT_DIR, session_id, "debug")
@@ -876,14 +1740,32 @@ def debugger_agent(state: dict) -> dict:
         "plan_summary": str([step.task_description for step in fix_plan.implementation_steps])
     }
 
+    fix_steps = [step.model_dump() for step in fix_plan.implementation_steps]
+    prefetch_research(
+        session_id,
+        fix_steps,
+        state.get("search_method", False),
+        tech_stack=plan.tech_stack if plan else "unknown"
+    )
+
     return {
-        "task_queue": [step.model_dump() for step in fix_plan.implementation_steps],
+        "task_queue": fix_steps,
         "current_task_index": 0, #coder set it to the number of tasks/files it wrote while looping. debugger sets it to 0 so that coder knows it has to start writing files again from task queue
         "error_report": current_error,
         "error_category": error_category,
         "attempt_history": [new_attempt]
     }
 
+def debugger_agent(state: dict) -> dict:
+    prompt = _prepare_debugger(state)
+    fix_plan = cascade.invoke_structured("debugger", DebugPlan, prompt, _check_debug_plan)
+    return _finish_debugger(state, fix_plan)
+
+async def adebugger_agent(state: dict) -> dict:
+    prompt = _prepare_debugger(state)
+    fix_plan = await cascade.ainvoke_structured("debugger", DebugPlan, prompt, _check_debug_plan)
+    return _finish_debugger(state, fix_plan)
+
 def learner_agent(state: GraphState) -> dict:
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Entering Learner Agent (Placeholder)...", "cyan", attrs=["bold"])
@@ -893,16 +1775,22 @@ def learner_agent(state: GraphState) -> dict:
 graph = StateGraph(GraphState)
 
 # all nodes 
-graph.add_node("router", route_query)
-graph.add_node("planner", planner_agent)
-graph.add_node("architect", architect_agent)
-graph.add_node("coder", coder_agent) 
-graph.add_node("qa_agent", qa_agent)
-graph.add_node("dependency_validator",dependency_validator_agent)
-graph.add_node("executor", executor_agent)
-graph.add_node("evaluator", evaluator_agent)
-graph.add_node("debugger", debugger_agent)
-graph.add_node("learner", learner_agent)
+# every node carries its sync + async implementation. agent.invoke() runs the sync one, agent.ainvoke() the async twin
+def _node(name: str, func, afunc=None) -> RunnableLambda:
+    # every node run is timed and gets its own metrics record
+    return RunnableLambda(metrics.timed_node(name, func), afunc=metrics.atimed_node(name, afunc) if afunc else None)
+
+graph.add_node("router", _node("router", route_query, aroute_query))
+graph.add_node("planner", _node("planner", planner_agent, aplanner_agent))
+graph.add_node("architect", _node("architect", architect_agent, aarchitect_agent))
+graph.add_node("coder", _node("coder", coder_agent, acoder_agent))
+graph.add_node("qa_agent", _node("qa_agent", qa_agent, aqa_agent))
+graph.add_node("dependency_validator", _node("dependency_validator", dependency_validator_agent, adependency_validator_agent))
+graph.add_node("executor", _node("executor", executor_agent, aexecutor_agent))
+graph.add_node("log_compactor", _node("log_compactor", log_compactor_agent))
+graph.add_node("evaluator", _node("evaluator", evaluator_agent, aevaluator_agent))
+graph.add_node("debugger", _node("debugger", debugger_agent, adebugger_agent))
+graph.add_node("learner", _node("learner", learner_agent))
 
 
 # entry point is router
@@ -989,7 +1877,8 @@ graph.add_conditional_edges(
         "evaluator": "evaluator"
     }
 )
-graph.add_edge("executor", "evaluator")
+graph.add_edge("executor", "log_compactor")
+graph.add_edge("log_compactor", "evaluator")
 
 graph.add_conditional_edges(
     "evaluator", 
@@ -1003,20 +1892,16 @@ graph.add_conditional_edges(
 graph.add_edge("debugger", "coder") # close the loop!!!!!    
 graph.add_edge("learner", END)
 
-agent = graph.compile()
+# every finished node is checkpointed under output/<session_id>/checkpoints, see resume_graph
+checkpointer = FileCheckpointSaver(OUTPUT_DIR)
+agent = graph.compile(checkpointer=checkpointer)
 
-def run_graph(user_prompt: str, search_method: bool = False) -> dict:
-    """
-    Run the agent graph with the given user prompt and search method.
-    
-    Args:
-        user_prompt: The user's project request
-        search_method: False (default) for vectordb, True for tavily live search
-    
-    Returns:
-        dict: The final state of the agent workflow
-    """
-    session_id = str(uuid.uuid4())
+def _graph_config(session_id: str) -> dict:
+    # the session id doubles as langgraph's thread id, so a session can be found again from its output folder
+    return {"recursion_limit": 100, "configurable": {"thread_id": session_id}}
+
+def _start_session(user_prompt: str, search_method: bool, session_id: str = None) -> GraphState:
+    session_id = session_id or str(uuid.uuid4())
     cprint(f"\n{'='*50}", "magenta")
     cprint(f" Starting new session: {session_id}", "cyan", attrs=["bold"])
     cprint(f" User prompt: {user_prompt}", "yellow")
@@ -1028,31 +1913,145 @@ def run_graph(user_prompt: str, search_method: bool = False) -> dict:
         "prompt": user_prompt
     })
     
-    initial_state: GraphState = {
+    #try not to comment any of the ones below or else the app /will/ crash
+    return {
         "session_id": session_id,
         "user_prompt": user_prompt,
         "route": None,
         "plan": None, 
+        "plan_reuse": None,
         "task_queue": [],
         "dependencies": [],    
         "qa_plan": [],
         "completed_files": [],
         "current_task_index": 0, 
         "search_method": search_method,
-        "iteration_count": 0,
+        "iteration_count": 0, #count for exec-eval-debug loop
         "error_report": "",
         "status": "fail",
+        "failed_tests": [],
+        "full_logs_path": None,
         "sandbox_id": get_sandbox_for_session(session_id),
         "attempt_history": []
     }
+
+def run_graph(user_prompt: str, search_method: bool = False, session_id: str = None) -> dict:
+    """
+    Run the agent graph with the given user prompt and search method.
+    
+    Args:
+        user_prompt: The user's project request
+        search_method: False (default) for vectordb, True for tavily live search
+        session_id: optional id to run under, for callers that need to know it before the run starts (job queue)
+    
+    Returns:
+        dict: The final state of the agent workflow
+    """
+    initial_state = _start_session(user_prompt, search_method, session_id)
+    session_id = initial_state["session_id"]
+    
+    try:
+        result = agent.invoke(initial_state, config=_graph_config(session_id))
+    except Exception:
+        cprint(f" Run failed. Progress is checkpointed, resume it with resume_graph('{session_id}')", "red")
+        raise
+    finally:
+        release_warm_sandbox(session_id)
+        clear_research_prefetch(session_id)
+        checkpointer.release(session_id)
+        metrics.write_session_metrics(session_id, OUTPUT_DIR)
+    
+    cprint(f"\n{'='*50}", "magenta")
+    cprint(" Agent workflow finished.", "green", attrs=["bold"])
+    
+    return result
+
+async def arun_graph(user_prompt: str, search_method: bool = False, session_id: str = None) -> dict:
+    """
+    Async run_graph. Runs the async twin of every node so a run only holds the event loop while it waits on
+    Groq, registries or E2B, instead of pinning a worker thread for the whole build.
+    """
+    initial_state = _start_session(user_prompt, search_method, session_id)
+    session_id = initial_state["session_id"]
     
-    result = agent.invoke(initial_state, config={"recursion_limit": 100})
+    try:
+        result = await agent.ainvoke(initial_state, config=_graph_config(session_id))
+    except Exception:
+        cprint(f" Run failed. Progress is checkpointed, resume it with resume_graph('{session_id}')", "red")
+        raise
+    finally:
+        # kill() is a blocking http call
+        await asyncio.to_thread(release_warm_sandbox, session_id)
+        clear_research_prefetch(session_id)
+        checkpointer.release(session_id)
+        metrics.write_session_metrics(session_id, OUTPUT_DIR)
     
     cprint(f"\n{'='*50}", "magenta")
     cprint(" Agent workflow finished.", "green", attrs=["bold"])
     
     return result
 
+def _resume_session(session_id: str):
+    config = _graph_config(session_id)
+    snapshot = agent.get_state(config)
+    if not snapshot.values:
+        raise ValueError(f"No checkpoint found for session {session_id}")
+
+    cprint(f"\n{'='*50}", "magenta")
+    if not snapshot.next:
+        cprint(f" Session {session_id} already finished. Nothing to resume.", "yellow")
+        return config, None
+
+    cprint(f" Resuming session {session_id} at: {', '.join(snapshot.next)}", "cyan", attrs=["bold"])
+    emit_file_event("session_resume", {
+        "session_id": session_id,
+        "next": list(snapshot.next)
+    })
+    return config, snapshot
+
+def resume_graph(session_id: str) -> dict:
+    """
+    Continues a crashed or interrupted run from its last completed node.
+    Nodes that already finished (planner, architect, coder steps...) are not run again.
+    """
+    try:
+        config, snapshot = _resume_session(session_id)
+        if snapshot is None:
+            return agent.get_state(config).values
+
+        # None as input tells langgraph to pick up from the saved checkpoint instead of starting over
+        result = agent.invoke(None, config=config)
+    finally:
+        release_warm_sandbox(session_id)
+        clear_research_prefetch(session_id)
+        checkpointer.release(session_id)
+        metrics.write_session_metrics(session_id, OUTPUT_DIR)
+
+    cprint(f"\n{'='*50}", "magenta")
+    cprint(" Agent workflow finished.", "green", attrs=["bold"])
+
+    return result
+
+async def aresume_graph(session_id: str) -> dict:
+    """Async resume_graph, runs the async twin of every remaining node."""
+    try:
+        config, snapshot = _resume_session(session_id)
+        if snapshot is None:
+            return agent.get_state(config).values
+
+        result = await agent.ainvoke(None, config=config)
+    finally:
+        # kill() is a blocking http call
+        await asyncio.to_thread(release_warm_sandbox, session_id)
+        clear_research_prefetch(session_id)
+        checkpointer.release(session_id)
+        metrics.write_session_metrics(session_id, OUTPUT_DIR)
+
+    cprint(f"\n{'='*50}", "magenta")
+    cprint(" Agent workflow finished.", "green", attrs=["bold"])
+
+    return result
+
 if __name__ == "__main__":
         
     cprint("\nWelcome to Lock-In", "yellow", attrs=["bold"])
@@ -1061,29 +2060,7 @@ if __name__ == "__main__":
     search_method_input = input("Choose search method: 0 for 'default' (vector DB) or 1 for 'advance' (Live Search): ").strip()
     search_method = (search_method_input == "1")  # True for advance, False for default
 
-    session_id = str(uuid.uuid4())
-    cprint(f" Session ID generated: {session_id}", "cyan")
-
-
-    #try not to comment any of the ones below or else the app /will/ crash
-    initial_state: GraphState = {
-        "session_id":session_id,
-        "user_prompt": user_prompt,
-        "route": None,
-        "plan": None, 
-        "task_queue":[],
-        "dependencies": [],    
-        "qa_plan": [],
-        "completed_files": [],
-        "current_task_index": 0, 
-        "search_method": search_method,
-        "iteration_count": 0, #count for exec-eval-debug loop
-        "error_report": "",
-        "status" : "fail",
-        "sandbox_id": get_sandbox_for_session(session_id),
-        "attempt_history":[]
-    }
-    result = agent.invoke(initial_state,config={"recursion_limit": 100})
+    result = run_graph(user_prompt, search_method)
 
     cprint(f"\n{'='*50}", "magenta")
     cprint("\n Agent workflow finished. Final state:", "green", attrs=["bold"])
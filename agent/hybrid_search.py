@@ -0,0 +1,125 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import xxhash
+from langchain_core.documents import Document
+from termcolor import cprint
+
+# lexical + vector retrieval for the docs store. minilm similarity alone misses exact api names ("useActionState",
+# "Flask SQLAlchemy"), bm25 finds them. setup_vectordb.py builds the bm25 index over the same chunks it puts in chroma
+# and saves it next to it (chroma_db/bm25_index.json). a query takes the top candidates of both and merges them with
+# reciprocal rank fusion, a chunk ranked well by both beats one only a single side likes.
+# chunks carry the library / domain they were scraped from, a query can be scoped to the domains of its tech stack
+# (TECH_STACK_DOCS in graph.py) so a python_script task never gets react docs and searches fewer candidates
+
+INDEX_FILE = "bm25_index.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60          # the usual constant from the rrf paper, damps the weight of the very first ranks
+CANDIDATES = 10     # per side, before fusion
+
+TOKEN = re.compile(r"[a-z0-9_]+")
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it", "of", "on",
+             "or", "that", "the", "this", "to", "with", "you", "your"}
+
+def tokenize(text: str) -> list:
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+def _doc_key(doc: Document) -> str:
+    # chroma ids are random, chunks are matched across the two sides by their text
+    return xxhash.xxh3_64_hexdigest(doc.page_content.encode("utf-8"))
+
+class BM25Index:
+    def __init__(self, docs: list, postings: dict, doc_len: list):
+        self.docs = docs          # [{"text": ..., "metadata": {...}}]
+        self.postings = postings  # term -> [[doc index, term frequency], ...]
+        self.doc_len = doc_len
+        self.avgdl = sum(doc_len) / len(doc_len) if doc_len else 0.0
+        self._by_domain = {}
+        for i, doc in enumerate(docs):
+            self._by_domain.setdefault(doc["metadata"].get("domain"), set()).add(i)
+
+    @property
+    def scoped(self) -> bool:
+        # stores built before chunks were tagged have no domains to filter on
+        return any(domain is not None for domain in self._by_domain)
+
+    def docs_in(self, domains: list) -> set:
+        return set().union(*(self._by_domain.get(d, set()) for d in domains))
+
+    @classmethod
+    def build(cls, documents: list) -> "BM25Index":
+        docs, postings, doc_len = [], {}, []
+        for i, doc in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            docs.append({"text": doc.page_content, "metadata": doc.metadata})
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append([i, tf])
+        return cls(docs, postings, doc_len)
+
+    def save(self, db_path: str):
+        with open(os.path.join(db_path, INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({"docs": self.docs, "postings": self.postings, "doc_len": self.doc_len}, f)
+
+    @classmethod
+    def load(cls, db_path: str) -> "BM25Index | None":
+        path = os.path.join(db_path, INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["docs"], data["postings"], data["doc_len"])
+
+    def search(self, query: str, k: int = CANDIDATES, allowed: set = None) -> list:
+        # allowed: doc indices to consider, None for all of them
+        scores = {}
+        n = len(self.docs)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for i, tf in posting:
+                if allowed is not None and i not in allowed:
+                    continue
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[i] / self.avgdl)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [Document(page_content=self.docs[i]["text"], metadata=self.docs[i]["metadata"]) for i in best]
+
+def reciprocal_rank_fusion(rankings: list, k: int) -> list:
+    """Top `k` documents of several ranked lists, scored by sum(1 / (RRF_K + rank))."""
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+class HybridRetriever:
+    """Same invoke(query) -> documents interface as the chroma retriever it replaces."""
+
+    def __init__(self, db, db_path: str, k: int = 3):
+        self.db = db
+        self.k = k
+        self.index = BM25Index.load(db_path)
+        if self.index is None:
+            cprint(f"   [Hybrid Search] No {INDEX_FILE} in {db_path}, vector search only. Rerun setup_vectordb.py to build it.", "yellow")
+
+    def invoke(self, query: str, domains: list = None) -> list:
+        """Top k chunks for the query, only from `domains` when given (and the store is tagged)."""
+        if self.index is None:
+            return self.db.similarity_search(query, k=self.k)
+        if domains and self.index.scoped:
+            allowed = self.index.docs_in(domains)
+            if not allowed:
+                return []  # none of this stack's docs are in the local store
+            vector_hits = self.db.similarity_search(query, k=CANDIDATES, filter={"domain": {"$in": list(domains)}})
+            return reciprocal_rank_fusion([vector_hits, self.index.search(query, CANDIDATES, allowed)], self.k)
+        vector_hits = self.db.similarity_search(query, k=CANDIDATES)
+        return reciprocal_rank_fusion([vector_hits, self.index.search(query, CANDIDATES)], self.k)
@@ -0,0 +1,40 @@
+import threading
+import time
+from termcolor import cprint
+
+# lazy module level singletons. graph.py used to build its groq clients, the chroma stores, the bm25 index and the
+# tavily client at import, so importing it (the api at boot, every script and test) paid for all of them and fell over
+# without GROQ_API_KEY. a Lazy builds its object on first use, warm_up() in graph.py builds them all up front
+#
+# graph nodes must not use `lazy.attr` directly in their own body, call lazy.get().attr there: when the graph is built,
+# langchain's RunnableLambda scans a node's source for name.attr chains and getattr()s them, which builds the object
+# at import (helpers called by a node are not scanned)
+
+class Lazy:
+    """Proxy that builds `factory()` on first attribute access (or get()), once, thread safe."""
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not None
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    start = time.perf_counter()
+                    self._value = self._factory()
+                    cprint(f"   [Init] {self._name} ready in {time.perf_counter() - start:.2f}s", "grey")
+        return self._value
+
+    def __getattr__(self, attr):
+        # only called for attributes the proxy itself doesn't have
+        return getattr(self.get(), attr)
+
+    def __repr__(self) -> str:
+        return f"Lazy({self._name}, {'loaded' if self.loaded else 'not loaded'})"
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from termcolor import cprint
+
+from agent import metrics
+
+# content addressed cache for the deterministic structured-output calls (router, planner, architect, qa architect).
+# same model + same prompt + same output schema = same answer, so retries and demo re-runs skip groq entirely.
+# entries live in sqlite next to graph.py, expire after a ttl and the least recently used ones are dropped
+# once the cache grows past its size cap
+
+CACHE_ENABLED = os.getenv("LOCKIN_LLM_CACHE", "1") == "1"
+CACHE_PATH = os.getenv("LOCKIN_LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite"))
+CACHE_TTL = int(os.getenv("LOCKIN_LLM_CACHE_TTL", str(7 * 24 * 3600)))           # seconds
+CACHE_MAX_BYTES = int(float(os.getenv("LOCKIN_LLM_CACHE_MAX_MB", "64")) * 1024 * 1024)
+# opt out per node, e.g. LOCKIN_LLM_CACHE_SKIP=planner,architect to always get a fresh plan
+CACHE_SKIP = {n.strip() for n in os.getenv("LOCKIN_LLM_CACHE_SKIP", "").split(",") if n.strip()}
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def _connect() -> sqlite3.Connection:
+    # one short lived connection per call, the cache is touched a handful of times per run from many threads
+    global _initialized
+    conn = sqlite3.connect(CACHE_PATH, timeout=10)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        node TEXT,
+                        model TEXT,
+                        schema TEXT,
+                        value TEXT,
+                        size INTEGER,
+                        created_at REAL,
+                        last_used REAL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+                conn.commit()
+                _initialized = True
+    return conn
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn:  # commits on success
+            yield conn
+    finally:
+        conn.close()
+
+def cache_key(model: str, schema, prompt) -> str:
+    payload = json.dumps({
+        "model": model,
+        "schema": schema.__name__,
+        "schema_fields": schema.model_json_schema(),
+        "prompt": prompt if isinstance(prompt, str) else str(prompt),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def enabled_for(node: str) -> bool:
+    return CACHE_ENABLED and node not in CACHE_SKIP
+
+def lookup(node: str, key: str, schema):
+    now = time.time()
+    try:
+        with _db() as conn:
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= CACHE_TTL:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                metrics.llm_cache_lookups.inc(1, node, "hit")
+                return schema.model_validate_json(row[0])
+            if row:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+    except Exception as e:
+        # a broken cache must never break a run
+        cprint(f"   [LLM Cache] Lookup failed: {e}", "yellow")
+    metrics.llm_cache_lookups.inc(1, node, "miss")
+    return None
+
+def store(node: str, key: str, model: str, schema, response):
+    if response is None:
+        return
+    value = response.model_dump_json()
+    now = time.time()
+    try:
+        with _db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, node, model, schema.__name__, value, len(value), now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - CACHE_TTL,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > CACHE_MAX_BYTES:
+                # least recently used first, until we are back under the cap
+                for old_key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                    if total <= CACHE_MAX_BYTES:
+                        break
+                    conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= size
+                    metrics.llm_cache_evictions.inc(1)
+    except Exception as e:
+        cprint(f"   [LLM Cache] Store failed: {e}", "yellow")
+
+def cached_call(node: str, model: str, schema, prompt, call):
+    """Returns the cached structured response for this prompt or runs `call()` and caches what it returns."""
+    if not enabled_for(node):
+        return call()
+    key = cache_key(model, schema, prompt)
+    response = lookup(node, key, schema)
+    if response is not None:
+        cprint(f"   [LLM Cache] Hit for {node}", "blue")
+        return response
+    response = call()
+    store(node, key, model, schema, response)
+    return response
+
+async def acached_call(node: str, model: str, schema, prompt, acall):
+    """Async cached_call. `acall` is a coroutine function, sqlite work stays off the event loop."""
+    if not enabled_for(node):
+        return await acall()
+    key = cache_key(model, schema, prompt)
+    response = await asyncio.to_thread(lookup, node, key, schema)
+    if response is not None:
+        cprint(f"   [LLM Cache] Hit for {node}", "blue")
+        return response
+    response = await acall()
+    await asyncio.to_thread(store, node, key, model, schema, response)
+    return response
@@ -0,0 +1,296 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from termcolor import cprint
+
+from agent import metrics
+from agent.prompt_budget import count_tokens
+
+# one gateway in front of groq for every session in the process. each model gets two token buckets
+# (requests/min and tokens/min), calls wait their turn in a priority queue instead of all firing at once and
+# collecting 429s, and whatever still comes back as 429 / 5xx is retried with jittered exponential backoff.
+# the chat models in graph.py are wrapped with gateway.wrap(), so nodes keep calling invoke / ainvoke / stream as before
+
+# requests/min, tokens/min per model. groq's free tier limits, raise them with LOCKIN_LLM_LIMITS on a paid plan:
+# LOCKIN_LLM_LIMITS="llama-3.3-70b-versatile=1000:300000;llama-3.1-8b-instant=1000:250000"
+MODEL_LIMITS = {
+    "llama-3.3-70b-versatile": (30, 12000),
+    "llama-3.1-8b-instant": (30, 6000),
+    "openai/gpt-oss-120b": (30, 8000),
+    "mixtral-8x7b-32768": (30, 5000),
+}
+DEFAULT_LIMITS = (30, 6000)
+
+MAX_RETRIES = int(os.getenv("LOCKIN_LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("LOCKIN_LLM_BACKOFF_BASE", "1.0"))  # seconds, doubled per retry
+BACKOFF_CAP = float(os.getenv("LOCKIN_LLM_BACKOFF_CAP", "30"))
+COMPLETION_ESTIMATE = 1024  # tokens booked for the answer up front, settled against the real usage when the response has it
+POLL_SECONDS = 0.25         # longest a waiting call sleeps before checking the buckets again
+
+# who goes first when a model is saturated. the streaming coder is what the user is watching,
+# qa suites are generated in the background and can wait
+PRIORITIES = {"interactive": 2, "normal": 1, "background": 0}
+NODE_PRIORITIES = {
+    "router": "interactive",
+    "coder": "interactive",
+    "qa_agent": "background",
+}
+# nodes that pass their own per request timeout and retry on it themselves (QA_MAX_RETRIES in graph.py).
+# the gateway retrying those timeouts as well would multiply their bound
+CALLER_TIMEOUT_NODES = {"qa_agent"}
+
+def is_timeout(e: Exception) -> bool:
+    # groq's APITimeoutError, raised when a request ran past its timeout
+    return type(e).__name__ == "APITimeoutError"
+
+def _parse_limits(spec: str) -> dict:
+    limits = {}
+    for entry in spec.split(";"):
+        model, _, values = entry.partition("=")
+        rpm, _, tpm = values.partition(":")
+        if model.strip() and rpm.strip() and tpm.strip():
+            limits[model.strip()] = (int(rpm), int(tpm))
+    return limits
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now). Callers hold the limiter lock."""
+        self._refill()
+        amount = min(amount, self.capacity)  # a request bigger than the whole bucket waits for a full one
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def settle(self, booked: float, used: float):
+        # gives back what an estimate overbooked (or charges what it underbooked)
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + min(booked, self.capacity) - used)
+
+class ModelLimiter:
+    """Requests/min + tokens/min buckets of one model, handed out in priority order."""
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.lock = threading.Lock()
+        self.waiting = []  # heap of (-priority, seq)
+        self.seq = itertools.count()
+
+    def _enqueue(self, priority: int) -> tuple:
+        ticket = (-priority, next(self.seq))
+        with self.lock:
+            heapq.heappush(self.waiting, ticket)
+        return ticket
+
+    def _try(self, ticket: tuple, tokens: int) -> float:
+        # 0 when the ticket got its permits, otherwise how long to sleep before asking again
+        with self.lock:
+            if self.waiting[0] != ticket:
+                return POLL_SECONDS
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait > 0:
+                return min(wait, POLL_SECONDS)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            heapq.heappop(self.waiting)
+            return 0.0
+
+    def settle(self, booked: int, used: int | None):
+        if used is None:
+            return
+        with self.lock:
+            self.tokens.settle(booked, used)
+
+    def _abandon(self, ticket: tuple):
+        # cancelled / interrupted while waiting, don't block the queue behind a ticket nobody holds
+        with self.lock:
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+
+    def acquire(self, tokens: int, priority: int):
+        ticket = self._enqueue(priority)
+        try:
+            while (wait := self._try(ticket, tokens)) > 0:
+                time.sleep(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    async def aacquire(self, tokens: int, priority: int):
+        ticket = self._enqueue(priority)
+        try:
+            while (wait := self._try(ticket, tokens)) > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+def _usage(message) -> int | None:
+    # real prompt + completion tokens of an AIMessage (or the last stream chunk), None for parsed structured output
+    metadata = getattr(message, "usage_metadata", None)
+    return metadata.get("total_tokens") if metadata else None
+
+def _retry_after(e: Exception) -> float | None:
+    # seconds to wait for a retryable error, None when retrying won't help
+    status = getattr(e, "status_code", None)
+    if status is None and type(e).__name__ in ("APIConnectionError", "APITimeoutError"):
+        status = 503
+    if status not in (429, 500, 502, 503, 504):
+        return None
+    response = getattr(e, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(header) if header else 0.0
+    except ValueError:
+        return 0.0
+
+class LLMGateway:
+    def __init__(self, limits: dict = None):
+        self.limits = dict(MODEL_LIMITS)
+        self.limits.update(limits if limits is not None else _parse_limits(os.getenv("LOCKIN_LLM_LIMITS", "")))
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model: str) -> ModelLimiter:
+        with self._lock:
+            if model not in self._limiters:
+                rpm, tpm = self.limits.get(model, DEFAULT_LIMITS)
+                self._limiters[model] = ModelLimiter(model, rpm, tpm)
+            return self._limiters[model]
+
+    def wrap(self, chat_model):
+        """The chat model with every call going through the gateway."""
+        return GatewayModel(self, chat_model)
+
+    def _admission(self, model: str, prompt) -> tuple:
+        # (limiter, tokens, priority, priority name) for one call from the running node
+        name = NODE_PRIORITIES.get(metrics.current_node(), "normal")
+        tokens = count_tokens(prompt if isinstance(prompt, str) else str(prompt)) + COMPLETION_ESTIMATE
+        return self.limiter(model), tokens, PRIORITIES[name], name
+
+    def _backoff(self, model: str, attempt: int, e: Exception) -> float | None:
+        retry_after = _retry_after(e)
+        if retry_after is None or attempt >= MAX_RETRIES:
+            return None
+        if is_timeout(e) and metrics.current_node() in CALLER_TIMEOUT_NODES:
+            return None
+        # full jitter, so sessions that hit the limit together don't all come back together
+        delay = max(retry_after, random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+        metrics.llm_retries.inc(1, model, str(getattr(e, "status_code", "connection")))
+        cprint(f"   [LLM Gateway] {model}: {type(e).__name__}, retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s", "yellow")
+        return delay
+
+    def call(self, model: str, prompt, fn):
+        limiter, tokens, priority, name = self._admission(model, prompt)
+        for attempt in itertools.count():
+            start = time.perf_counter()
+            limiter.acquire(tokens, priority)
+            metrics.record_llm_queue(model, name, time.perf_counter() - start)
+            try:
+                result = fn()
+                limiter.settle(tokens, _usage(result))
+                return result
+            except Exception as e:
+                delay = self._backoff(model, attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def acall(self, model: str, prompt, afn):
+        limiter, tokens, priority, name = self._admission(model, prompt)
+        for attempt in itertools.count():
+            start = time.perf_counter()
+            await limiter.aacquire(tokens, priority)
+            metrics.record_llm_queue(model, name, time.perf_counter() - start)
+            try:
+                result = await afn()
+                limiter.settle(tokens, _usage(result))
+                return result
+            except Exception as e:
+                delay = self._backoff(model, attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def stream(self, model: str, prompt, fn):
+        # retried only until the first chunk arrived, after that the caller already has half a file
+        limiter, tokens, priority, name = self._admission(model, prompt)
+        for attempt in itertools.count():
+            start = time.perf_counter()
+            limiter.acquire(tokens, priority)
+            metrics.record_llm_queue(model, name, time.perf_counter() - start)
+            started, used = False, None
+            try:
+                for chunk in fn():
+                    started = True
+                    used = _usage(chunk) or used
+                    yield chunk
+                limiter.settle(tokens, used)
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(model, attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def astream(self, model: str, prompt, afn):
+        limiter, tokens, priority, name = self._admission(model, prompt)
+        for attempt in itertools.count():
+            start = time.perf_counter()
+            await limiter.aacquire(tokens, priority)
+            metrics.record_llm_queue(model, name, time.perf_counter() - start)
+            started, used = False, None
+            try:
+                async for chunk in afn():
+                    started = True
+                    used = _usage(chunk) or used
+                    yield chunk
+                limiter.settle(tokens, used)
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(model, attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+class GatewayModel:
+    """Drop-in for a ChatGroq instance (invoke / ainvoke / stream / astream / with_structured_output)."""
+
+    def __init__(self, gateway: LLMGateway, chat_model, runnable=None):
+        self.gateway = gateway
+        self.chat_model = chat_model
+        self.runnable = runnable if runnable is not None else chat_model
+        self.model_name = chat_model.model_name
+
+    def with_structured_output(self, schema, **kwargs):
+        return GatewayModel(self.gateway, self.chat_model, self.chat_model.with_structured_output(schema, **kwargs))
+
+    def invoke(self, prompt, *args, **kwargs):
+        return self.gateway.call(self.model_name, prompt, lambda: self.runnable.invoke(prompt, *args, **kwargs))
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        return await self.gateway.acall(self.model_name, prompt, lambda: self.runnable.ainvoke(prompt, *args, **kwargs))
+
+    def stream(self, prompt, *args, **kwargs):
+        return self.gateway.stream(self.model_name, prompt, lambda: self.runnable.stream(prompt, *args, **kwargs))
+
+    def astream(self, prompt, *args, **kwargs):
+        return self.gateway.astream(self.model_name, prompt, lambda: self.runnable.astream(prompt, *args, **kwargs))
@@ -0,0 +1,116 @@
+import os
+import re
+
+from agent.states import ErrorCategory, EvaluationResult, ExecutionResult
+
+# rule based first pass of the evaluator. most failures say what they are in so many words (ModuleNotFoundError,
+# "FAILED test_x.py::test_y - AssertionError", npm ERESOLVE, a sandbox timeout, the dependency validator's spoofed
+# infra result), so those are classified here without an llm call. only logs none of the rules recognise go to the llm.
+# when several layers fail at once the lowest one wins (infra > syntax > timeout > runtime > logical),
+# it has to be fixed first anyway and the debugger works on one category at a time
+
+CLASSIFIER_ENABLED = os.getenv("LOCKIN_LOG_CLASSIFIER", "1") == "1"
+MAX_EVIDENCE = 5  # lines quoted in the feedback
+
+PRECEDENCE = [ErrorCategory.INFRA, ErrorCategory.SYNTAX, ErrorCategory.TIMEOUT, ErrorCategory.RUNTIME, ErrorCategory.LOGICAL]
+
+SYNTAX_ERRORS = {"SyntaxError", "IndentationError", "TabError", "ModuleNotFoundError", "ImportError"}
+LOGICAL_ERRORS = {"AssertionError", "AssertError"}
+
+# (category, pattern) matched against every log line
+LINE_RULES = [
+    (ErrorCategory.INFRA, re.compile(r"npm ERR! code (ERESOLVE|E404|ETARGET|ENOTFOUND)|ERESOLVE unable to resolve|"
+                                     r"No matching distribution found for|Could not find a version that satisfies|"
+                                     r"is not in this registry|Dependency Validation Failed|Failed to install dependencies")),
+    (ErrorCategory.TIMEOUT, re.compile(r"context deadline exceeded|TimeoutException|[Cc]ommand timed out|"
+                                       r"Test timed out in \d+ms|Timeout of \d+ms exceeded|deadline_exceeded")),
+    (ErrorCategory.SYNTAX, re.compile(r"Failed to resolve import|Cannot find module|ERR_MODULE_NOT_FOUND|Transform failed|"
+                                      r"Unexpected token(?!.*\bJSON\b)|Failed to parse source|error while importing test module|"
+                                      r"ERROR collecting")),
+]
+
+# pytest -q summary: "FAILED tests/test_api.py::test_x - TypeError: ..." / "ERROR test_api.py - ModuleNotFoundError: ..."
+PYTEST_SUMMARY = re.compile(r"^(FAILED|ERROR)\s+(\S+)(?:\s+-\s+(\w+(?:\.\w+)*)(?::|$))?", re.MULTILINE)
+# end of a pytest traceback: "test_app.py:5: AssertionError"
+TRACEBACK_END = re.compile(r"^([\w./\-]+\.py):(\d+): ((?:\w+\.)*\w+(?:Error|Exception))$")
+# JSON.parse in node / the browser throws SyntaxError, but that is bad data at runtime, not a syntax error in the code
+JSON_PARSE = re.compile(r"\bin JSON\b|JSON\.parse|is not valid JSON|Unexpected end of JSON")
+# a raised exception on its own line: python tracebacks ("TypeError: x"), pytest ("E   TypeError: x"), vitest / node
+EXCEPTION_LINE = re.compile(r"^(?:E\s+|\s*(?:×|✗|→|❯)?\s*)?(?:Uncaught\s+)?(?:\w+\.)*(\w+(?:Error|Exception))\b:?")
+# where it happened, for the feedback
+PY_FRAME = re.compile(r'File "(?:/home/user/app/)?([^"]+)", line (\d+)|^([\w./\-]+\.py):(\d+): (?:in |(?:\w+\.)*\w+(?:Error|Exception)$)', re.MULTILINE)
+JS_FRAME = re.compile(r"((?:src|tests?|frontend|backend)/[\w./\-]+\.[jt]sx?):(\d+)")
+
+def _category_of(exception: str, line: str = "") -> ErrorCategory:
+    name = exception.rsplit(".", 1)[-1]
+    if name == "SyntaxError" and JSON_PARSE.search(line):
+        return ErrorCategory.RUNTIME
+    if name in SYNTAX_ERRORS:
+        return ErrorCategory.SYNTAX
+    if name in LOGICAL_ERRORS:
+        return ErrorCategory.LOGICAL
+    if name in ("TimeoutError", "TimeoutException"):
+        return ErrorCategory.TIMEOUT
+    return ErrorCategory.RUNTIME
+
+def _location(logs: str) -> str | None:
+    # last project frame is usually where the bug is, the ones before it are the test calling into it
+    frames = [f"{path or short}:{line or short_line}" for path, line, short, short_line in PY_FRAME.findall(logs)
+              if "site-packages" not in (path or short) and not (path or short).startswith("/usr")]
+    frames += [f"{path}:{line}" for path, line in JS_FRAME.findall(logs) if "node_modules" not in path]
+    return frames[-1] if frames else None
+
+def _evidence(logs: str) -> dict:
+    # category -> lines that show it, in log order
+    found = {}
+
+    def add(category, line):
+        lines = found.setdefault(category, [])
+        line = line.strip(" _=\t")[:300]
+        if line and line not in lines:
+            lines.append(line)
+
+    for outcome, test, exception in PYTEST_SUMMARY.findall(logs):
+        line = next((l for l in logs.splitlines() if l.startswith(f"{outcome} {test}")), f"{outcome} {test}")
+        if re.search(rf"{re.escape(test)}\s+-\s+assert\b", line):
+            add(ErrorCategory.LOGICAL, line)  # plain assert, pytest prints the rewritten expression instead of the error name
+        elif exception:
+            add(_category_of(exception, line), line)
+        elif outcome == "ERROR":
+            add(ErrorCategory.SYNTAX, line)  # collection error without a reason is almost always an import
+
+    for line in logs.splitlines():
+        for category, pattern in LINE_RULES:
+            if pattern.search(line):
+                add(category, line)
+        match = TRACEBACK_END.match(line.strip())
+        if match:
+            add(_category_of(match.group(3), line), line)
+            continue
+        match = EXCEPTION_LINE.match(line)
+        if match and match.group(1) not in ("Error", "Exception"):
+            add(_category_of(match.group(1), line), line)
+    return found
+
+def classify(execution: ExecutionResult) -> EvaluationResult | None:
+    """EvaluationResult for logs the rules recognise, None when the llm has to look at them."""
+    if not CLASSIFIER_ENABLED or execution is None or execution.tests_passed:
+        return None
+    logs = execution.logs or ""
+    evidence = _evidence(logs)
+
+    if not execution.environment_ok:
+        # pip / npm failed or the dependency validator spoofed this result, always infra (see the evaluator prompt)
+        category = ErrorCategory.INFRA
+        lines = evidence.get(ErrorCategory.INFRA) or [logs.strip().splitlines()[-1][:300] if logs.strip() else "Environment setup failed."]
+    else:
+        category = next((c for c in PRECEDENCE if c in evidence), None)
+        if category is None:
+            return None
+        lines = evidence[category]
+
+    feedback = f"{category.value.upper()} failure: " + " | ".join(lines[:MAX_EVIDENCE])
+    location = _location(logs)
+    if location and category != ErrorCategory.INFRA:
+        feedback += f" (at {location})"
+    return EvaluationResult(status="fail", category=category, feedback=feedback)
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+
+# log compaction between the executor and the evaluator. raw sandbox logs are mostly npm / pip install noise,
+# progress bars, passing tests and the same traceback once per failing test. the evaluator and the debugger only
+# need the failures, so the logs are cleaned and cut into blocks, repeated tracebacks are collapsed, and the blocks
+# are kept by importance (summary lines, the first error with its context, the other failures, the rest) until the
+# byte budget is used up. the full logs are written to output/<session_id>/logs first, nothing is lost
+
+LOG_BUDGET_BYTES = int(os.getenv("LOCKIN_LOG_BUDGET_BYTES", "6000"))
+
+ANSI = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07]*\x07")
+NOISE = re.compile(
+    r"^\s*(npm (WARN|notice)|added \d+ packages|removed \d+ packages|changed \d+ packages|up to date, audited|"
+    r"\d+ packages are looking for funding|run `npm fund`|found 0 vulnerabilities|"
+    r"Collecting |Downloading |Using cached |Requirement already satisfied|Installing collected packages|"
+    r"Successfully installed|Building wheel|Created wheel|Stored in directory|Obtaining |Preparing metadata|"
+    r"\[notice\]|WARNING: Running pip as)"
+    r"|^\s*[━─█▏▎▍▌▋▊▉|#=\-\s]*\d+(\.\d+)?\s*%"  # progress bars
+    r"|^\s*[⠁-⣿]"                               # spinners
+    r"|^\s*(✓|√)\s"                              # passing vitest tests
+    r"|\sPASSED(\s|$)",                          # passing pytest -v tests
+)
+# lines that start a new block: pytest section / test headers, vitest FAIL headers, the executor's own headers
+BLOCK_START = re.compile(r"^(_{3,} .+ _{3,}|={3,}.*={3,}|={3,} [A-Z].*|\s?FAIL\s|⎯{3,}|Traceback \(most recent call last\))")
+ERROR = re.compile(r"Traceback|Error\b|Exception\b|FAILED|^\s?FAIL\s|npm ERR!|^E\s{2,}|AssertionError|timed out|deadline exceeded")
+SUMMARY = re.compile(r"^(FAILED|ERROR)\s|^\s*(Test Files|Tests)\s+\d+|^\s*=+ .*(failed|error|passed).* =+$|\d+ failed|short test summary")
+# addresses, line numbers, durations and test parameters change between otherwise identical tracebacks
+VOLATILE = re.compile(r"0x[0-9a-f]+|\d+")
+SUMMARY_LINES = 20  # a summary block with hundreds of FAILED lines keeps its first ones
+
+def clean(logs: str) -> list:
+    """Log lines without ansi codes, carriage return redraws and install / progress noise."""
+    lines = []
+    for line in ANSI.sub("", logs or "").split("\n"):
+        if "\r" in line:
+            # progress redraws, only the last state of the line is what a terminal would show
+            line = line.rstrip("\r").split("\r")[-1]
+        if NOISE.search(line):
+            continue
+        lines.append(line.rstrip())
+    # collapse runs of blank lines
+    return [l for i, l in enumerate(lines) if l or (i and lines[i - 1])]
+
+def blocks(lines: list) -> list:
+    # one block per test / section header. blank lines stay inside, pytest puts them between a test and its traceback
+    result, current = [], []
+    for line in lines:
+        if BLOCK_START.match(line) and current:
+            result.append(current)
+            current = []
+        current.append(line)
+    if current:
+        result.append(current)
+    return [block for block in result if any(block)]
+
+def _fingerprint(block: list) -> str:
+    # same failure, different test: drop the header line and anything volatile
+    body = block[1:] if len(block) > 1 and BLOCK_START.match(block[0]) else block
+    return hashlib.sha1(VOLATILE.sub("", "\n".join(body)).encode("utf-8")).hexdigest()
+
+def compact(logs: str, budget: int = LOG_BUDGET_BYTES) -> str:
+    """Failures first, noise last, within `budget` bytes. Logs already under budget only get cleaned."""
+    cleaned = "\n".join(clean(logs))
+    if len(cleaned.encode("utf-8")) <= budget:
+        return cleaned
+
+    # collapse repeated tracebacks, the first one stays and says how often it happened
+    unique, seen = [], {}
+    for block in blocks(cleaned.split("\n")):
+        key = _fingerprint(block) if any(ERROR.search(l) for l in block) else None
+        if key and key in seen:
+            seen[key][1] += 1
+            continue
+        entry = [block, 0]
+        if key:
+            seen[key] = entry
+        unique.append(entry)
+    texts = []
+    for block, repeats in unique:
+        text = "\n".join(block)
+        if repeats:
+            text += f"\n[same failure repeated {repeats} more time{'s' if repeats > 1 else ''}]"
+        texts.append(text)
+
+    for i, text in enumerate(texts):
+        lines = text.split("\n")
+        if SUMMARY.search(text) and len(lines) > SUMMARY_LINES:
+            texts[i] = "\n".join(lines[:SUMMARY_LINES] + [f"[+{len(lines) - SUMMARY_LINES} more lines]"])
+
+    def rank(i: int) -> tuple:
+        text = texts[i]
+        if SUMMARY.search(text) and not text.startswith(("___", "Traceback")):
+            return (0, i)
+        if ERROR.search(text):
+            return (1, i)  # in log order, so the first error (and what caused the rest) comes first
+        return (2, -i)     # plain context, the end of a log is more useful than the start
+
+    kept, used = set(), 0
+    budget -= 40 * 4  # room for the "[... omitted ...]" markers
+    for i in sorted(range(len(texts)), key=rank):
+        size = len(texts[i].encode("utf-8")) + 1
+        if used + size <= budget:
+            kept.add(i)
+            used += size
+        elif rank(i)[0] < 2 and not any(rank(k)[0] == 1 for k in kept) and budget - used > 200:
+            # the first error alone is over budget, keep its head (the exception) and tail (where it was raised)
+            room = budget - used - 60
+            head, tail = texts[i][:room // 2], texts[i][-(room // 2):]
+            texts[i] = f"{head}\n[... {len(texts[i]) - 2 * (room // 2)} chars omitted ...]\n{tail}"
+            kept.add(i)
+            used += len(texts[i].encode("utf-8")) + 1
+
+    out, skipped = [], 0
+    for i, text in enumerate(texts):
+        if i in kept:
+            if skipped:
+                out.append(f"[... {skipped} block{'s' if skipped > 1 else ''} omitted ...]")
+                skipped = 0
+            out.append(text)
+        else:
+            skipped += 1
+    if skipped:
+        out.append(f"[... {skipped} block{'s' if skipped > 1 else ''} omitted ...]")
+    return "\n".join(out)
+
+def store_full_logs(output_dir: str, session_id: str, iteration: int, logs: str) -> str:
+    """Writes the untouched logs to output/<session_id>/logs/execution_iter_<n>.log and returns the path."""
+    log_dir = os.path.join(output_dir, session_id, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, f"execution_iter_{iteration}.log")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(logs or "")
+    return path
@@ -1,16 +1,20 @@
 import os
 from typing import List
 from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
 from termcolor import cprint
 
+from agent.embedding_cache import CachedEmbeddings, content_hash
+from agent.embeddings import get_embeddings
+
 # every instance, is instantiated with base db path, embedding object and a chroma instance specific to that user
 # only update_file func in use right now
 class CodeMemory:
     def __init__(self, base_db_path: str, embedding_model: str):
         self.base_db_path = base_db_path
-        self.embeddings = HuggingFaceEndpointEmbeddings(repo_id=embedding_model)
+        # shared per process, a CodeMemory is created for every indexed file.
+        # chunks embedded before (any session) come out of the embedding cache
+        self.embeddings = CachedEmbeddings(get_embeddings(embedding_model), embedding_model)
 
     def _get_db(self, session_id: str):
         """Get a Chroma instance specific to this user session."""
@@ -24,18 +28,13 @@ class CodeMemory:
     def update_file(self, session_id: str, file_path: str, code_content: str):
         """
         Updates the vector DB for a SINGLE file.
-        1. Deletes old chunks for this specific file.
-        2. Embeds the new content.
+        1. Splits the new content and hashes every chunk.
+        2. Deletes the old chunks that are not in the new version, unchanged ones keep their vectors.
+        3. Embeds only the new / changed chunks.
         """
         db = self._get_db(session_id)
         relative_path = file_path
 
-        #delete old chunks (v1) of that file (scenario: if coder rewrites the file then to avoid overlap we delete first version)
-        try:
-            db.delete(where={"session_id": session_id, "source": relative_path})
-        except Exception as e:
-            pass
-
         # dynamic splitter  (used for language specific chunking)
         ext = os.path.splitext(relative_path)[1].lower()
         if ext in ['.js', '.jsx', '.ts', '.tsx']:
@@ -58,9 +57,31 @@ class CodeMemory:
             [code_content], 
             metadatas=[{"source": relative_path, "session_id": session_id}]   #adds a metadata to every chunk(imp!!!)
         )
+
+        # chunk id = file + content hash (+ how often that content already showed up in the file), so an unchanged
+        # chunk gets the same id on every rewrite
+        ids, seen = [], {}
+        for chunk in chunks:
+            digest = content_hash(chunk.page_content)
+            seen[digest] = seen.get(digest, 0) + 1
+            chunk.metadata["content_hash"] = digest
+            ids.append(f"{relative_path}:{digest}:{seen[digest]}")
+
+        try:
+            existing = set(db.get(where={"$and": [{"session_id": session_id}, {"source": relative_path}]}, include=["metadatas"])["ids"])
+        except Exception as e:
+            existing = set()
+
+        #delete old chunks (v1) of that file that are not in the new version (scenario: coder rewrites the file)
+        stale = [i for i in existing if i not in set(ids)]
+        if stale:
+            db.delete(ids=stale)
+
+        fresh = [(i, chunk) for i, chunk in zip(ids, chunks) if i not in existing]
+        if fresh:
+            db.add_documents([chunk for _, chunk in fresh], ids=[i for i, _ in fresh])
         if chunks:
-            db.add_documents(chunks)
-            cprint(f"   [Memory] Updated {relative_path}", "grey")
+            cprint(f"   [Memory] Updated {relative_path} ({len(fresh)} new chunks, {len(chunks) - len(fresh)} unchanged)", "grey")
             
 
     def query_codebase(self, session_id: str, query: str, k: int = 5) -> str:
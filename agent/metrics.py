@@ -0,0 +1,344 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from langchain_core.callbacks import BaseCallbackHandler
+
+# per node instrumentation. every graph node run gets a record (wall time, llm tokens + cost, retrieval time,
+# sandbox command time) that is written to output/<session_id>/metrics.json, and the same numbers feed
+# process wide histograms that the backend serves at /metrics in prometheus text format.
+# the running node lives in a contextvar, so anything called from inside a node (llm callbacks, research, sandbox calls)
+# lands on the right record without threading it through every function. work handed to a thread pool has to go through submit()
+
+# usd per 1M tokens (input, output). groq list prices, unknown models are counted as free
+MODEL_PRICES = {
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "openai/gpt-oss-120b": (0.15, 0.75),
+    "mixtral-8x7b-32768": (0.24, 0.24),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
+
+NODE_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+RETRIEVAL_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SANDBOX_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+LLM_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUEUE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_node = contextvars.ContextVar("lockin_current_node", default=None)
+_lock = threading.Lock()
+_sessions = {}  # session_id -> {"nodes": [...], "sandbox_commands": [...]}
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        with _lock:
+            series = self._series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._series.items()):
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            sep = "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, value: float, *label_values):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+node_seconds = Histogram("lockin_node_duration_seconds", "Wall time of one graph node run.", ("node",), NODE_BUCKETS)
+node_tokens = Histogram("lockin_node_llm_tokens", "LLM tokens (prompt + completion) used by one graph node run.", ("node",), TOKEN_BUCKETS)
+retrieval_seconds = Histogram("lockin_retrieval_duration_seconds", "Time spent in one docs lookup.", ("node",), RETRIEVAL_BUCKETS)
+sandbox_seconds = Histogram("lockin_sandbox_command_duration_seconds", "Time of one sandbox command.", ("node", "kind"), SANDBOX_BUCKETS)
+llm_tokens = Counter("lockin_llm_tokens_total", "LLM tokens by node and direction.", ("node", "type"))
+llm_cost = Counter("lockin_llm_cost_usd_total", "Estimated LLM spend in USD.", ("node",))
+node_errors = Counter("lockin_node_errors_total", "Graph node runs that raised.", ("node",))
+llm_cache_lookups = Counter("lockin_llm_cache_lookups_total", "LLM response cache lookups by node and result (hit / miss).", ("node", "result"))
+llm_cache_evictions = Counter("lockin_llm_cache_evictions_total", "LLM response cache entries dropped by the size cap.", ())
+llm_model_tokens = Counter("lockin_llm_model_tokens_total", "LLM tokens by model and direction.", ("model", "type"))
+llm_model_cost = Counter("lockin_llm_model_cost_usd_total", "Estimated LLM spend in USD by model.", ("model",))
+model_calls = Counter("lockin_model_cascade_calls_total", "Structured calls per cascade tier by outcome (ok / rejected / error).", ("node", "model", "outcome"))
+model_call_seconds = Histogram("lockin_model_cascade_call_seconds", "Latency of one structured call per cascade tier.", ("node", "model"), LLM_BUCKETS)
+llm_queue_seconds = Histogram("lockin_llm_queue_seconds", "Time an LLM call waited for rate limit capacity in the gateway.", ("model", "priority"), QUEUE_BUCKETS)
+llm_retries = Counter("lockin_llm_retries_total", "LLM calls retried by the gateway, by model and status code.", ("model", "status"))
+evaluator_decisions = Counter("lockin_evaluator_decisions_total", "Failed runs classified by the evaluator, by source (rules / llm / fallback) and category.", ("source", "category"))
+coder_patches = Counter("lockin_coder_patches_total", "Fix mode search/replace patches by outcome (applied / fallback).", ("outcome",))
+prompt_tokens_trimmed = Counter("lockin_prompt_tokens_trimmed_total", "Prompt tokens dropped by the prompt budget, by node and section.", ("node", "section"))
+embedding_cache_lookups = Counter("lockin_embedding_cache_lookups_total", "Chunk embedding cache lookups by result (hit / miss).", ("result",))
+research_cache_lookups = Counter("lockin_research_cache_lookups_total", "Docs research cache lookups by method and result (hit / miss / shared).", ("method", "result"))
+
+REGISTRY = [node_seconds, node_tokens, retrieval_seconds, sandbox_seconds, llm_tokens, llm_cost, node_errors,
+            llm_cache_lookups, llm_cache_evictions, prompt_tokens_trimmed, llm_model_tokens, llm_model_cost,
+            model_calls, model_call_seconds, llm_queue_seconds, llm_retries, coder_patches, evaluator_decisions,
+            embedding_cache_lookups, research_cache_lookups]
+
+def _node_name() -> str:
+    record = _current_node.get()
+    return record["node"] if record else "none"
+
+def current_node() -> str:
+    """Name of the graph node the caller runs in ("none" outside of a graph run)."""
+    return _node_name()
+
+def _add(record: dict, **values):
+    if record is None:
+        return
+    with _lock:
+        for key, value in values.items():
+            record[key] = record.get(key, 0) + value
+
+def _session(session_id: str) -> dict:
+    return _sessions.setdefault(session_id, {"nodes": [], "sandbox_commands": []})
+
+@contextmanager
+def node_scope(node: str, session_id: str):
+    record = {
+        "node": node,
+        "started_at": time.time(),
+        "seconds": 0.0,
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+        "retrieval_seconds": 0.0,
+        "sandbox_seconds": 0.0,
+        "llm_queue_seconds": 0.0,
+        "_session_id": session_id,
+    }
+    token = _current_node.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record["error"] = True
+        node_errors.inc(1, node)
+        raise
+    finally:
+        _current_node.reset(token)
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        node_seconds.observe(record["seconds"], node)
+        node_tokens.observe(record["prompt_tokens"] + record["completion_tokens"], node)
+        with _lock:
+            _session(session_id)["nodes"].append(record)
+
+def timed_node(node: str, func):
+    """Wraps a sync graph node so every run of it is measured."""
+    @wraps(func)
+    def wrapper(state):
+        with node_scope(node, state.get("session_id")):
+            return func(state)
+    return wrapper
+
+def atimed_node(node: str, afunc):
+    """Async timed_node."""
+    @wraps(afunc)
+    async def wrapper(state):
+        with node_scope(node, state.get("session_id")):
+            return await afunc(state)
+    return wrapper
+
+@contextmanager
+def timed(kind: str, label: str = ""):
+    """Times a retrieval ("retrieval") or sandbox call ("install" / "test") against the running node."""
+    record = _current_node.get()
+    node = _node_name()
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except Exception:
+        ok = False
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if kind == "retrieval":
+            retrieval_seconds.observe(seconds, node)
+            _add(record, retrieval_seconds=seconds)
+        else:
+            sandbox_seconds.observe(seconds, node, kind)
+            _add(record, sandbox_seconds=seconds)
+            if record is not None:
+                with _lock:
+                    _session(record["_session_id"])["sandbox_commands"].append({
+                        "node": node,
+                        "kind": kind,
+                        "command": label[:120],
+                        "seconds": round(seconds, 3),
+                        "ok": ok,
+                    })
+
+def record_llm_usage(model: str, prompt_tokens: int, completion_tokens: int):
+    record = _current_node.get()
+    node = _node_name()
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+    llm_tokens.inc(prompt_tokens, node, "prompt")
+    llm_tokens.inc(completion_tokens, node, "completion")
+    llm_cost.inc(cost, node)
+    llm_model_tokens.inc(prompt_tokens, model or "unknown", "prompt")
+    llm_model_tokens.inc(completion_tokens, model or "unknown", "completion")
+    llm_model_cost.inc(cost, model or "unknown")
+    _add(record, llm_calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost_usd=cost)
+
+def record_prompt_trim(section: str, tokens: int, kept: int):
+    """Books a prompt section the prompt budget cut down (see agent/prompt_budget.py) on the running node."""
+    record = _current_node.get()
+    prompt_tokens_trimmed.inc(tokens - kept, _node_name(), section)
+    _add(record, prompt_tokens_trimmed=tokens - kept)
+    if record is not None:
+        with _lock:
+            record.setdefault("prompt_trims", []).append({"section": section, "tokens": tokens, "kept": kept})
+
+def record_evaluation(source: str, category: str):
+    """Books who classified a failed run: the log classifier ("rules"), the llm, or the crash fallback."""
+    evaluator_decisions.inc(1, source, category)
+    record = _current_node.get()
+    if record is not None:
+        record["evaluation_source"] = source
+
+def record_patch(applied: bool):
+    """Books one fix mode patch attempt (applied, or fell back to a full rewrite) on the running node."""
+    coder_patches.inc(1, "applied" if applied else "fallback")
+    if applied:
+        _add(_current_node.get(), patches_applied=1)
+    else:
+        _add(_current_node.get(), patch_fallbacks=1)
+
+def record_llm_queue(model: str, priority: str, seconds: float):
+    """Books the time one llm call waited in the gateway (see agent/llm_gateway.py) on the running node."""
+    llm_queue_seconds.observe(seconds, model, priority)
+    _add(_current_node.get(), llm_queue_seconds=seconds)
+
+def record_model_call(node: str, model: str, outcome: str, seconds: float):
+    """Books one cascade tier attempt (see agent/model_cascade.py). outcome is ok, rejected or error."""
+    record = _current_node.get()
+    model_calls.inc(1, node, model, outcome)
+    model_call_seconds.observe(seconds, node, model)
+    if record is not None:
+        with _lock:
+            record.setdefault("model_calls", []).append({"call": node, "model": model, "outcome": outcome, "seconds": round(seconds, 3)})
+
+class LLMUsageHandler(BaseCallbackHandler):
+    """Pulls token usage out of every chat model response and books it on the running node."""
+    # run in the caller's context (and thread) even for ainvoke, otherwise the contextvar is lost
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs):
+        llm_output = response.llm_output or {}
+        usage = llm_output.get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0) or 0
+        completion_tokens = usage.get("completion_tokens", 0) or 0
+        model = llm_output.get("model_name", "")
+
+        if not usage:
+            # streamed responses only carry usage on the message itself
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    metadata = getattr(message, "usage_metadata", None) or {}
+                    prompt_tokens += metadata.get("input_tokens", 0)
+                    completion_tokens += metadata.get("output_tokens", 0)
+                    model = model or (getattr(message, "response_metadata", None) or {}).get("model_name", "")
+
+        record_llm_usage(model, prompt_tokens, completion_tokens)
+
+usage_handler = LLMUsageHandler()
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit() that keeps the running node, so pool work is booked on the node that started it."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def write_session_metrics(session_id: str, output_dir: str):
+    """Writes (or extends, after a resume) output/<session_id>/metrics.json and forgets the session."""
+    with _lock:
+        session = _sessions.pop(session_id, None)
+    if not session:
+        return
+
+    path = os.path.join(output_dir, session_id, "metrics.json")
+    data = {"session_id": session_id, "nodes": [], "sandbox_commands": []}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            pass
+
+    for record in session["nodes"]:
+        record = {k: v for k, v in record.items() if not k.startswith("_")}
+        record["retrieval_seconds"] = round(record["retrieval_seconds"], 3)
+        record["sandbox_seconds"] = round(record["sandbox_seconds"], 3)
+        record["llm_queue_seconds"] = round(record.get("llm_queue_seconds", 0.0), 3)
+        record["cost_usd"] = round(record["cost_usd"], 6)
+        data["nodes"].append(record)
+    data["sandbox_commands"].extend(session["sandbox_commands"])
+
+    totals = {}
+    for record in data["nodes"]:
+        total = totals.setdefault(record["node"], {"runs": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+                                                   "prompt_tokens_trimmed": 0})
+        total["runs"] += 1
+        total["seconds"] = round(total["seconds"] + record["seconds"], 3)
+        total["prompt_tokens"] += record["prompt_tokens"]
+        total["completion_tokens"] += record["completion_tokens"]
+        total["cost_usd"] = round(total["cost_usd"] + record["cost_usd"], 6)
+        total["prompt_tokens_trimmed"] += record.get("prompt_tokens_trimmed", 0)
+    data["totals"] = totals
+
+    # per cascade tier, to see how often the small models are enough and what escalation costs
+    tiers = {}
+    for record in data["nodes"]:
+        for call in record.get("model_calls", []):
+            tier = tiers.setdefault(f'{call["call"]}:{call["model"]}', {"calls": 0, "ok": 0, "rejected": 0, "error": 0, "seconds": 0.0})
+            tier["calls"] += 1
+            tier[call["outcome"]] += 1
+            tier["seconds"] = round(tier["seconds"] + call["seconds"], 3)
+    data["model_tiers"] = tiers
+
+    # how often the evaluator's rule based fast path was enough
+    sources = [record["evaluation_source"] for record in data["nodes"] if record.get("evaluation_source")]
+    data["evaluations"] = {source: sources.count(source) for source in sorted(set(sources))}
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from termcolor import cprint
+
+from agent import metrics
+
+# per node model tiers for the structured-output calls. cheap classification steps (router, evaluator) start on the
+# 8b model and only escalate to the 70b one when the small model's answer doesn't parse into the schema or the node's
+# validation check rejects it. every attempt is counted per node / model / outcome so the tiers can be tuned
+# from /metrics and metrics.json.
+# override with LOCKIN_MODEL_TIERS, e.g. "router=llama-3.1-8b-instant,llama-3.3-70b-versatile;debugger=openai/gpt-oss-120b"
+
+SMALL_MODEL = "llama-3.1-8b-instant"
+LARGE_MODEL = "llama-3.3-70b-versatile"
+
+DEFAULT_TIERS = {
+    "router": (SMALL_MODEL, LARGE_MODEL),
+    "evaluator": (SMALL_MODEL, LARGE_MODEL),
+}
+DEFAULT_CHAIN = (LARGE_MODEL,)  # planner, architect, qa_architect, debugger
+
+def _parse_tiers(spec: str) -> dict:
+    tiers = {}
+    for entry in spec.split(";"):
+        node, _, models = entry.partition("=")
+        models = tuple(m.strip() for m in models.split(",") if m.strip())
+        if node.strip() and models:
+            tiers[node.strip()] = models
+    return tiers
+
+class ModelCascade:
+    def __init__(self, factory, tiers: dict = None):
+        # factory(model_name) -> chat model. one instance per model, shared by every node that uses it
+        self.factory = factory
+        self.tiers = dict(DEFAULT_TIERS)
+        self.tiers.update(tiers if tiers is not None else _parse_tiers(os.getenv("LOCKIN_MODEL_TIERS", "")))
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def tiers_for(self, node: str) -> tuple:
+        return self.tiers.get(node, DEFAULT_CHAIN)
+
+    def chain_name(self, node: str) -> str:
+        """Stable name of a node's tier chain, part of the llm cache key."""
+        return ">".join(self.tiers_for(node))
+
+    def model(self, name: str):
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = self.factory(name)
+            return self._models[name]
+
+    def _check(self, node: str, model: str, response, validate, start: float, is_last: bool):
+        # returns the response when it is accepted, None to escalate
+        seconds = time.perf_counter() - start
+        reason = "empty response" if response is None else (validate(response) if validate else None)
+        if reason is None:
+            metrics.record_model_call(node, model, "ok", seconds)
+            return response
+        metrics.record_model_call(node, model, "rejected", seconds)
+        if is_last:
+            # nothing left to escalate to. a questionable answer is still better than failing the node
+            cprint(f"   [Cascade] {node}: {model} answer rejected ({reason}), keeping it (last tier)", "yellow")
+            return response
+        cprint(f"   [Cascade] {node}: {model} answer rejected ({reason}). Escalating...", "yellow")
+        return None
+
+    def _failed(self, node: str, model: str, e: Exception, start: float, is_last: bool):
+        metrics.record_model_call(node, model, "error", time.perf_counter() - start)
+        if is_last:
+            raise e
+        cprint(f"   [Cascade] {node}: {model} failed ({type(e).__name__}: {str(e)[:120]}). Escalating...", "yellow")
+
+    def invoke_structured(self, node: str, schema, prompt, validate=None):
+        """Structured call that walks the node's tiers until an answer parses and passes `validate`.
+
+        validate(response) returns None to accept or a short reason to escalate. Raises only when the last tier fails.
+        """
+        tiers = self.tiers_for(node)
+        for i, name in enumerate(tiers):
+            is_last = i == len(tiers) - 1
+            start = time.perf_counter()
+            try:
+                response = self.model(name).with_structured_output(schema).invoke(prompt)
+            except Exception as e:
+                self._failed(node, name, e, start, is_last)
+                continue
+            response = self._check(node, name, response, validate, start, is_last)
+            if response is not None or is_last:
+                return response
+
+    async def ainvoke_structured(self, node: str, schema, prompt, validate=None):
+        tiers = self.tiers_for(node)
+        for i, name in enumerate(tiers):
+            is_last = i == len(tiers) - 1
+            start = time.perf_counter()
+            try:
+                response = await self.model(name).with_structured_output(schema).ainvoke(prompt)
+            except Exception as e:
+                self._failed(node, name, e, start, is_last)
+                continue
+            response = self._check(node, name, response, validate, start, is_last)
+            if response is not None or is_last:
+                return response
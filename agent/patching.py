@@ -0,0 +1,92 @@
+import ast
+import json
+import re
+
+# search / replace patches for the coder's fix mode. instead of sending the whole file back, the llm answers with
+#
+#   <<<<<<< SEARCH
+#   lines copied from the current file
+#   =======
+#   what they should become
+#   >>>>>>> REPLACE
+#
+# hunks are applied in order, every SEARCH block has to match exactly one place in the file. anything that doesn't
+# apply or doesn't parse afterwards raises PatchError and the coder falls back to a full rewrite
+
+HUNK = re.compile(
+    r"^[ \t]*<{5,9} ?SEARCH[^\n]*\n(?P<search>.*?)^[ \t]*={5,9}[ \t]*\n(?P<replace>.*?)^[ \t]*>{5,9} ?REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+
+class PatchError(Exception):
+    pass
+
+def parse_hunks(text: str) -> list[tuple[str, str]]:
+    """(search, replace) pairs of an llm answer, in order. Empty when it contains no hunks."""
+    return [(m.group("search"), m.group("replace")) for m in HUNK.finditer(text or "")]
+
+def _find_lines(content: str, search: str) -> tuple[int, int] | None:
+    # fallback match that ignores trailing whitespace and indentation drift, the usual llm copy mistakes.
+    # returns the (start, end) character span of the only matching run of lines
+    lines = content.splitlines(keepends=True)
+    wanted = [l.strip() for l in search.splitlines()]
+    while wanted and not wanted[-1]:
+        wanted.pop()
+    if not wanted:
+        return None
+    found = []
+    for i in range(len(lines) - len(wanted) + 1):
+        if all(lines[i + j].strip() == wanted[j] for j in range(len(wanted))):
+            found.append(i)
+            if len(found) > 1:
+                return None
+    if not found:
+        return None
+    start = sum(len(l) for l in lines[:found[0]])
+    end = start + sum(len(l) for l in lines[found[0]:found[0] + len(wanted)])
+    return start, end
+
+def apply_hunks(content: str, hunks: list[tuple[str, str]]) -> str:
+    """Applies the hunks one after the other. Raises PatchError on a block that matches nowhere or more than once."""
+    for i, (search, replace) in enumerate(hunks, start=1):
+        if not search.strip():
+            # empty SEARCH = append, e.g. a missing function at the end of the file
+            content = content + ("" if content.endswith("\n") or not content else "\n") + replace
+            continue
+        count = content.count(search)
+        if count == 1:
+            content = content.replace(search, replace, 1)
+            continue
+        if count > 1:
+            raise PatchError(f"hunk {i}: SEARCH block matches {count} places")
+        span = _find_lines(content, search)
+        if span is None:
+            raise PatchError(f"hunk {i}: SEARCH block not found in the file")
+        if replace and not replace.endswith("\n") and content[span[1] - 1:span[1]] == "\n":
+            replace += "\n"
+        content = content[:span[0]] + replace + content[span[1]:]
+    return content
+
+def validate(filename: str, content: str):
+    """Cheap syntax check of a patched file. Raises PatchError for files we can parse here and that don't."""
+    if filename.endswith(".py"):
+        try:
+            ast.parse(content)
+        except SyntaxError as e:
+            raise PatchError(f"patched file does not parse: {e.msg} (line {e.lineno})")
+    elif filename.endswith(".json"):
+        try:
+            json.loads(content)
+        except ValueError as e:
+            raise PatchError(f"patched file is not valid json: {e}")
+    if "<<<<<<<" in content or ">>>>>>> REPLACE" in content:
+        raise PatchError("patch markers left in the file")
+
+def patch_file(filename: str, existing_code: str, answer: str) -> str:
+    """The patched file for an llm answer made of search / replace hunks."""
+    hunks = parse_hunks(answer)
+    if not hunks:
+        raise PatchError("answer contains no SEARCH/REPLACE hunks")
+    patched = apply_hunks(existing_code, hunks)
+    validate(filename, patched)
+    return patched
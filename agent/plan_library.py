@@ -0,0 +1,114 @@
+import json
+import os
+import uuid
+from langchain_community.vectorstores import Chroma
+from termcolor import cprint
+
+from agent.states import Plan, TaskPlan, QAPlan
+
+# plan reuse for near duplicate prompts ("todo app in react" / "simple react todo list").
+# every build that passes its tests leaves its prompt embedding in a chroma collection and its plan / architect output
+# in plan_library/<entry_id>.json. a new prompt that is close enough to a stored one skips the planner and architect llm calls.
+# only plans that produced a passing build get stored, so a reused plan is a known-good one.
+# the prompt embeddings live in plan_library/index, not in the docs chroma_db that setup_vectordb.py wipes on re-ingest
+
+REUSE_ENABLED = os.getenv("LOCKIN_PLAN_REUSE", "1") == "1"
+# cosine similarity of the prompts. a reused plan's file list comes from the stored prompt, extra requirements of the
+# new one reach the coder through the user request block that reused runs get (_prepare_file_task)
+REUSE_THRESHOLD = float(os.getenv("LOCKIN_PLAN_REUSE_THRESHOLD", "0.9"))
+DUPLICATE_THRESHOLD = 0.98  # basically the same prompt again, no need for a second entry
+
+class PlanLibrary:
+    def __init__(self, embeddings, library_dir: str):
+        self.library_dir = library_dir
+        os.makedirs(library_dir, exist_ok=True)
+        self.db = Chroma(
+            persist_directory=os.path.join(library_dir, "index"),
+            embedding_function=embeddings,
+            collection_name="plan_library",
+            collection_metadata={"hnsw:space": "cosine"},
+        )
+        self._reindex()
+
+    def _reindex(self):
+        # stored plans without an index entry (the index used to live in the docs chroma_db and got deleted with it)
+        try:
+            indexed = {m.get("entry_id") for m in self.db.get(include=["metadatas"])["metadatas"]}
+            texts, metadatas = [], []
+            for file_name in os.listdir(self.library_dir):
+                entry_id, ext = os.path.splitext(file_name)
+                if ext != ".json" or entry_id in indexed:
+                    continue
+                with open(self._entry_path(entry_id), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                texts.append(entry["user_prompt"])
+                metadatas.append({"entry_id": entry_id, "tech_stack": entry["plan"].get("tech_stack", "")})
+            if texts:
+                self.db.add_texts(texts, metadatas=metadatas)
+                cprint(f"   [Plan Library] Re-indexed {len(texts)} stored plans", "blue")
+        except Exception as e:
+            cprint(f"   [Plan Library] Re-index failed: {e}", "yellow")
+
+    def _best_match(self, user_prompt: str):
+        # (entry_id, similarity) of the closest stored prompt, None for an empty library
+        results = self.db.similarity_search_with_score(user_prompt, k=1)
+        if not results:
+            return None
+        doc, distance = results[0]
+        return doc.metadata.get("entry_id"), 1 - distance
+
+    def _entry_path(self, entry_id: str) -> str:
+        return os.path.join(self.library_dir, f"{entry_id}.json")
+
+    def find(self, user_prompt: str) -> dict | None:
+        """Returns {"entry_id", "similarity", "plan"} for a stored plan close enough to this prompt."""
+        if not REUSE_ENABLED:
+            return None
+        try:
+            match = self._best_match(user_prompt)
+            if match is None or match[1] < REUSE_THRESHOLD:
+                return None
+            entry_id, similarity = match
+            with open(self._entry_path(entry_id), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            cprint(f"   [Plan Library] Reusing plan for '{entry['user_prompt']}' (similarity {similarity:.2f})", "blue")
+            return {"entry_id": entry_id, "similarity": similarity, "plan": Plan.model_validate(entry["plan"])}
+        except Exception as e:
+            # the library is an optimization, never a reason for a run to fail
+            cprint(f"   [Plan Library] Lookup failed: {e}", "yellow")
+            return None
+
+    def load_architecture(self, entry_id: str | None) -> tuple | None:
+        """(TaskPlan, QAPlan | None) stored with a reused plan."""
+        if not entry_id:
+            return None
+        try:
+            with open(self._entry_path(entry_id), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            qa_plan = QAPlan.model_validate(entry["qa_plan"]) if entry.get("qa_plan") else None
+            return TaskPlan.model_validate(entry["task_plan"]), qa_plan
+        except Exception as e:
+            cprint(f"   [Plan Library] Could not load stored architecture: {e}", "yellow")
+            return None
+
+    def remember(self, user_prompt: str, plan_dir: str):
+        """Stores the plan_output.json / architect_build.json / architect_qa.json of a passing session."""
+        if not REUSE_ENABLED:
+            return
+        try:
+            match = self._best_match(user_prompt)
+            if match is not None and match[1] >= DUPLICATE_THRESHOLD:
+                return
+
+            entry = {"user_prompt": user_prompt}
+            for key, file_name in (("plan", "plan_output.json"), ("task_plan", "architect_build.json"), ("qa_plan", "architect_qa.json")):
+                with open(os.path.join(plan_dir, file_name), "r", encoding="utf-8") as f:
+                    entry[key] = json.load(f)
+
+            entry_id = str(uuid.uuid4())
+            with open(self._entry_path(entry_id), "w", encoding="utf-8") as f:
+                json.dump(entry, f, indent=4)
+            self.db.add_texts([user_prompt], metadatas=[{"entry_id": entry_id, "tech_stack": entry["plan"].get("tech_stack", "")}])
+            cprint(f"   [Plan Library] Stored plan for '{user_prompt}'", "green")
+        except Exception as e:
+            cprint(f"   [Plan Library] Could not store plan: {e}", "yellow")
@@ -0,0 +1,235 @@
+import os
+import re
+import threading
+from termcolor import cprint
+
+from agent import metrics
+
+# token budget for the coder and debugger prompts. construct_coder_prompt / construct_debugger_prompt just paste docs,
+# whole files and raw logs together, so one big file or a long vitest dump decides how slow (or how broken) the call is.
+# every variable section is counted with tiktoken and trimmed to its share of a per-model budget:
+#   docs   -> chunks ranked by overlap with the task, lowest ranked dropped first
+#   files  -> whole files while they fit, then excerpts around the lines the error mentions
+#   logs   -> head + tail, the middle of a log is the least useful part
+# existing_code in fix mode is never touched, the coder rewrites the whole file and would lose whatever we cut.
+# what got dropped is booked on the running node and ends up in metrics.json
+
+BUDGET_ENABLED = os.getenv("LOCKIN_PROMPT_BUDGET", "1") == "1"
+TOKENIZER = os.getenv("LOCKIN_TOKENIZER", "cl100k_base")  # llama / gpt-oss tokenizers are close enough to cl100k for budgeting
+
+# tokens for the variable sections of one prompt (the fixed rules text is on top of this).
+# well under the context windows on purpose, groq latency and the tpm limits grow with the prompt
+MODEL_BUDGETS = {
+    "llama-3.3-70b-versatile": 12000,
+    "openai/gpt-oss-120b": 16000,
+    "mixtral-8x7b-32768": 8000,
+    "llama-3.1-8b-instant": 6000,
+}
+DEFAULT_BUDGET = 8000
+BUDGET_OVERRIDE = os.getenv("LOCKIN_PROMPT_BUDGET_TOKENS")  # one budget for every model
+
+# share of the budget each section may use. whatever a section doesn't need is handed to the next one
+CODER_SHARES = {"error_report": 0.25, "doc_context": 1.0}
+DEBUGGER_SHARES = {"current_error": 0.35, "relevant_context": 1.0}
+MIN_SECTION_TOKENS = 500  # a huge existing file still leaves the coder this much of the error and the docs
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = False
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is not None or _encoding_failed:
+        return _encoding
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKENIZER)
+            except Exception as e:
+                # first use downloads the bpe file, offline boxes fall back to ~4 chars per token
+                cprint(f"   [Prompt Budget] tiktoken unavailable ({e}). Estimating tokens from length.", "yellow")
+                _encoding_failed = True
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _truncate(text: str, max_tokens: int) -> str:
+    # first max_tokens tokens of text
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+def _truncate_tail(text: str, max_tokens: int) -> str:
+    # last max_tokens tokens of text
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[-max_tokens * 4:]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[-max_tokens:])
+
+def budget_for(model: str) -> int:
+    if BUDGET_OVERRIDE:
+        return int(BUDGET_OVERRIDE)
+    return MODEL_BUDGETS.get(model, DEFAULT_BUDGET)
+
+def _record(section: str, tokens: int, kept: int):
+    if tokens > kept:
+        cprint(f"   [Prompt Budget] {section}: kept {kept}/{tokens} tokens", "yellow")
+        metrics.record_prompt_trim(section, tokens, kept)
+
+def trim_log(text: str, max_tokens: int, section: str = "logs") -> str:
+    """Head + tail of a log that is over max_tokens. Tracebacks and test summaries live at the ends."""
+    text = text or ""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    head_tokens = max_tokens // 3
+    head = _truncate(text, head_tokens)
+    tail = _truncate_tail(text, max_tokens - head_tokens)
+    trimmed = f"{head}\n... [{tokens - max_tokens} tokens of log omitted] ...\n{tail}"
+    _record(section, tokens, max_tokens)
+    return trimmed
+
+def _keywords(text: str) -> set:
+    return {w for w in re.findall(r"[a-zA-Z_][a-zA-Z0-9_]{2,}", (text or "").lower())}
+
+def _doc_chunks(doc_context: str) -> list:
+    # tavily results are "Source: ...\nContent: ..." blocks joined by blank lines, vectordb chunks are joined by \n
+    chunks = [c for c in re.split(r"\n\s*\n", doc_context) if c.strip()]
+    if len(chunks) == 1:
+        chunks = [c for c in doc_context.split("\n") if c.strip()]
+    return chunks
+
+def trim_docs(doc_context: str, query: str, max_tokens: int) -> str:
+    """Keeps the doc chunks that overlap most with the query until max_tokens, in their original order."""
+    doc_context = doc_context or ""
+    tokens = count_tokens(doc_context)
+    if tokens <= max_tokens:
+        return doc_context
+
+    query_words = _keywords(query)
+    chunks = _doc_chunks(doc_context)
+    ranked = sorted(
+        range(len(chunks)),
+        key=lambda i: (-len(query_words & _keywords(chunks[i])), i),
+    )
+    kept, used = set(), 0
+    for i in ranked:
+        size = count_tokens(chunks[i])
+        if used + size <= max_tokens:
+            kept.add(i)
+            used += size
+    if not kept and chunks:
+        # even the best chunk is too big on its own, cut it down instead of sending no docs at all
+        best = ranked[0]
+        chunks[best] = _truncate(chunks[best], max_tokens)
+        kept.add(best)
+        used = count_tokens(chunks[best])
+
+    _record("doc_context", tokens, used)
+    return "\n\n".join(chunks[i] for i in sorted(kept))
+
+def _excerpt(content: str, error_text: str, max_tokens: int) -> str:
+    # lines around every "line N" the error mentions, or the top of the file when it mentions none
+    lines = content.split("\n")
+    numbers = sorted({int(n) for n in re.findall(r"(?:line |:)(\d+)", error_text or "") if 0 < int(n) <= len(lines)})
+    if not numbers:
+        return _truncate(content, max_tokens)
+
+    spans = []
+    for n in numbers:
+        start, end = max(0, n - 11), min(len(lines), n + 10)
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    parts = []
+    for start, end in spans:
+        parts.append(f"# lines {start + 1}-{end}\n" + "\n".join(lines[start:end]))
+    return _truncate("\n# ...\n".join(parts), max_tokens)
+
+def _file_blocks(relevant_context: str) -> list:
+    # search_codebase_filesystem joins "FILE: name\n```python\n<content>\n```" blocks with blank lines.
+    # split on the headers instead of the fences, the files themselves can contain ``` (readmes, docstrings)
+    blocks = []
+    for part in re.split(r"\n\n(?=FILE: )", relevant_context):
+        header, _, rest = part.partition("\n")
+        fence, _, body = rest.partition("\n")
+        if not header.startswith("FILE: ") or not fence.startswith("```"):
+            return []
+        blocks.append((header[len("FILE: "):], fence, body[:-4] if body.endswith("\n```") else body, part))
+    return blocks
+
+def trim_files(relevant_context: str, error_text: str, max_tokens: int) -> str:
+    """Fits search_codebase_filesystem's FILE blocks into max_tokens, most relevant (first) file first."""
+    relevant_context = relevant_context or ""
+    tokens = count_tokens(relevant_context)
+    if tokens <= max_tokens:
+        return relevant_context
+
+    blocks = _file_blocks(relevant_context)
+    if not blocks:
+        return trim_log(relevant_context, max_tokens, section="relevant_context")
+
+    kept, used = [], 0
+    for name, fence, body, whole in blocks:
+        size = count_tokens(whole)
+        if used + size <= max_tokens:
+            kept.append(whole)
+            used += size
+            continue
+        room = max_tokens - used - 20
+        if room < 200:
+            break
+        whole = f"FILE: {name} (excerpt)\n{fence}\n{_excerpt(body, error_text, room)}\n```"
+        kept.append(whole)
+        used += count_tokens(whole)
+
+    _record("relevant_context", tokens, used)
+    return "\n\n".join(kept)
+
+def fit_coder_sections(model: str, mode: str, task_desc: str, doc_context: str, existing_code: str, error_report: str,
+                       user_request: str = "") -> tuple[str, str]:
+    """(doc_context, error_report) trimmed so the coder prompt stays inside the model's budget."""
+    if not BUDGET_ENABLED:
+        return doc_context, error_report
+    budget = budget_for(model)
+    # in fix mode existing_code is sent as is, it is the file the coder has to rewrite. build prompts don't include it.
+    # the user request (reused plans only) is never trimmed either
+    fixed = count_tokens(existing_code) if mode == "fix" else count_tokens(task_desc)
+    fixed += count_tokens(user_request) if user_request else 0
+    remaining = max(0, budget - fixed)
+
+    if error_report:
+        share = max(MIN_SECTION_TOKENS, int(remaining * CODER_SHARES["error_report"]))
+        error_report = trim_log(error_report, share, section="error_report")
+        remaining = max(0, remaining - count_tokens(error_report))
+    share = max(MIN_SECTION_TOKENS, int(remaining * CODER_SHARES["doc_context"]))
+    doc_context = trim_docs(doc_context, f"{task_desc} {error_report or ''}", share)
+    return doc_context, error_report
+
+def fit_debugger_sections(model: str, current_error: str, formatted_history: str, relevant_context: str) -> tuple[str, str]:
+    """(current_error, relevant_context) trimmed so the debugger prompt stays inside the model's budget."""
+    if not BUDGET_ENABLED:
+        return current_error, relevant_context
+    remaining = max(0, budget_for(model) - count_tokens(formatted_history))
+
+    share = max(MIN_SECTION_TOKENS, int(remaining * DEBUGGER_SHARES["current_error"]))
+    current_error = trim_log(current_error, share, section="current_error")
+    remaining = max(0, remaining - count_tokens(current_error))
+    share = max(MIN_SECTION_TOKENS, int(remaining * DEBUGGER_SHARES["relevant_context"]))
+    relevant_context = trim_files(relevant_context, current_error, share)
+    return current_error, relevant_context
@@ -170,6 +170,7 @@ Your goal is to break down the plan into a **granular list of FILE CREATION task
 4. Instead output specific file tasks. 
 5. For `related_docs_topic`, be specific (e.g., "React Functional Components", "CSS Flexbox", "Node.js Express Setup").
 6. Ensure the order makes sense (Configs first -> HTML entry -> React entry (main.jsx) -> App component -> Other components).
+7. For `depends_on`, list ONLY the `file_name`s from this manifest that the file directly imports (e.g. `src/App.jsx` depends on `src/components/TodoList.jsx`). Files that do not import anything from the manifest MUST have an empty list so they can be written in parallel.
 
 **Output Format:**
 Return a JSON with `implementation_steps` and `dependencies`.
@@ -214,7 +215,8 @@ Return a JSON with `qa_tasks`.
 
 
 def construct_coder_prompt(filename: str, task_desc: str, doc_context: str, 
-                           mode: str, existing_code: str = "", error_report: str = "", tech_stack: str ="") -> str:
+                           mode: str, existing_code: str = "", error_report: str = "", tech_stack: str ="",
+                           user_request: str = "") -> str:
     """Constructs the prompt for the coder agent."""
     
     file_specific_rules = ""
@@ -299,6 +301,13 @@ def construct_coder_prompt(filename: str, task_desc: str, doc_context: str,
 
     build_rules = BUILD_RULES.get(tech_stack, BUILD_RULES["unknown"])
 
+    # only set when the plan came from the plan library: this run's prompt, so requirements the reused plan doesn't
+    # mention still reach the coder (and aren't undone by a repair)
+    user_request_block = f"""
+        USER REQUEST (the whole project, your file is one part of it; implement whatever of it belongs in this file):
+        {user_request}
+        """ if user_request else ""
+
     if mode == "fix":
         return f"""
         You are a Senior Debugger.
@@ -308,7 +317,7 @@ def construct_coder_prompt(filename: str, task_desc: str, doc_context: str,
         FILE SPECIFIC RULES:{file_specific_rules}
         
         TARGET FILE: {filename}
-        
+        {user_request_block}
         CURRENT CODE:
         ```
         {existing_code}
@@ -327,7 +336,47 @@ def construct_coder_prompt(filename: str, task_desc: str, doc_context: str,
         OUTPUT FORMAT:
         Return ONLY the raw file content. Do NOT wrap it in ```markdown blocks. No explanations.
         """
-    
+
+    elif mode == "patch":
+        return f"""
+        You are a Senior Debugger.
+
+        FIX RULES: {build_rules}
+
+        FILE SPECIFIC RULES:{file_specific_rules}
+
+        TARGET FILE: {filename}
+        {user_request_block}
+        CURRENT CODE:
+        ```
+        {existing_code}
+        ```
+
+        ERROR REPORT:
+        {error_report}
+
+        TASK:
+        Fix the error in the code above with the SMALLEST possible edits.
+        Use the provided documentation if needed.
+
+        RELEVANT DOCS:
+        {doc_context}
+
+        OUTPUT FORMAT:
+        Return ONLY search/replace blocks, one per edit, in the order they appear in the file:
+        <<<<<<< SEARCH
+        (exact lines copied from CURRENT CODE, including indentation, enough of them to be unique)
+        =======
+        (the lines that replace them)
+        >>>>>>> REPLACE
+
+        RULES:
+        1. DO NOT return the whole file. Only the lines that change, plus 1-2 unchanged lines of context if needed to be unique.
+        2. SEARCH must match the current code character for character.
+        3. To add new code, SEARCH for the line it goes after and repeat that line at the top of REPLACE.
+        4. No explanations, no ```markdown blocks.
+        """
+
     else: # mode == "build"
         return f"""
         You are a Senior Developer.
@@ -338,6 +387,7 @@ def construct_coder_prompt(filename: str, task_desc: str, doc_context: str,
         
         TASK DESCRIPTION:
         {task_desc}
+        {user_request_block}
         {file_specific_rules}
         
         RELEVANT DOCS:
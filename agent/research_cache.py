@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from termcolor import cprint
+
+from agent import metrics
+
+# cross session cache for perform_jit_research. the same related_docs_topic ("React useState hook", "Flask routing")
+# comes up in session after session, the docs behind it barely change. results are keyed by normalized topic + tech
+# stack + search method and live in sqlite next to graph.py. vectordb answers only change when setup_vectordb.py
+# rebuilds the store (which clears them), web results go stale sooner, hence the two ttls.
+# sessions asking for the same topic at the same time share one lookup instead of all going to tavily (single flight,
+# per process)
+
+CACHE_ENABLED = os.getenv("LOCKIN_RESEARCH_CACHE", "1") == "1"
+CACHE_PATH = os.getenv("LOCKIN_RESEARCH_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "research_cache.sqlite"))
+CACHE_TTL = {
+    "vectordb": int(os.getenv("LOCKIN_RESEARCH_TTL_VECTORDB", str(30 * 24 * 3600))),  # seconds
+    "tavily": int(os.getenv("LOCKIN_RESEARCH_TTL_TAVILY", str(24 * 3600))),
+}
+CACHE_MAX_BYTES = int(float(os.getenv("LOCKIN_RESEARCH_CACHE_MAX_MB", "32")) * 1024 * 1024)
+
+_init_lock = threading.Lock()
+_initialized = False
+_inflight = {}  # key -> Future of the lookup running right now
+_inflight_lock = threading.Lock()
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    conn = sqlite3.connect(CACHE_PATH, timeout=10)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS research (
+                        key TEXT PRIMARY KEY,
+                        topic TEXT,
+                        tech_stack TEXT,
+                        source TEXT,
+                        value TEXT,
+                        size INTEGER,
+                        expires_at REAL,
+                        last_used REAL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS research_last_used ON research(last_used)")
+                conn.commit()
+                _initialized = True
+    return conn
+
+@contextmanager
+def _db():
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def normalize_topic(topic: str) -> str:
+    # "React  useState Hook." and "react usestate hook" are the same lookup
+    return " ".join(re.findall(r"[a-z0-9.+#_]+", topic.lower())).strip(".")
+
+def research_key(topic: str, tech_stack: str, method: str) -> str:
+    payload = json.dumps({"topic": normalize_topic(topic), "tech_stack": tech_stack or "unknown", "method": method}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def lookup(key: str) -> str | None:
+    now = time.time()
+    try:
+        with _db() as conn:
+            row = conn.execute("SELECT value, expires_at FROM research WHERE key = ?", (key,)).fetchone()
+            if row and row[1] > now:
+                conn.execute("UPDATE research SET last_used = ? WHERE key = ?", (now, key))
+                return row[0]
+            if row:
+                conn.execute("DELETE FROM research WHERE key = ?", (key,))
+    except Exception as e:
+        # a broken cache must never break a run
+        cprint(f"   [Research Cache] Lookup failed: {e}", "yellow")
+    return None
+
+def store(key: str, topic: str, tech_stack: str, source: str, value: str):
+    now = time.time()
+    try:
+        with _db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO research VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, topic, tech_stack, source, value, len(value), now + CACHE_TTL[source], now),
+            )
+            conn.execute("DELETE FROM research WHERE expires_at < ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM research").fetchone()[0]
+            if total > CACHE_MAX_BYTES:
+                # least recently used first, until we are back under the cap
+                for old_key, size in conn.execute("SELECT key, size FROM research ORDER BY last_used").fetchall():
+                    if total <= CACHE_MAX_BYTES:
+                        break
+                    conn.execute("DELETE FROM research WHERE key = ?", (old_key,))
+                    total -= size
+    except Exception as e:
+        cprint(f"   [Research Cache] Store failed: {e}", "yellow")
+
+def clear(source: str = None):
+    """Drops cached results, all of them or only one source's ("vectordb" after the store is rebuilt)."""
+    if not os.path.exists(CACHE_PATH):
+        return
+    try:
+        with _db() as conn:
+            if source:
+                conn.execute("DELETE FROM research WHERE source = ?", (source,))
+            else:
+                conn.execute("DELETE FROM research")
+    except Exception as e:
+        cprint(f"   [Research Cache] Clear failed: {e}", "yellow")
+
+def cached_research(topic: str, tech_stack: str, use_tavily: bool, lookup_docs) -> str:
+    """Cached docs for a topic, or runs `lookup_docs()` -> (context, source) once for everyone asking right now.
+    source is "tavily" / "vectordb" for the method that actually answered, None for a failed lookup (not cached)."""
+    method = "tavily" if use_tavily else "vectordb"
+    if not CACHE_ENABLED:
+        return lookup_docs()[0]
+    key = research_key(topic, tech_stack, method)
+    value = lookup(key)
+    if value is not None:
+        metrics.research_cache_lookups.inc(1, method, "hit")
+        cprint(f"   [Research Cache] Hit for: {topic}", "blue")
+        return value
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        metrics.research_cache_lookups.inc(1, method, "shared")
+        cprint(f"   [Research Cache] Joining in-flight lookup for: {topic}", "blue")
+        return future.result()
+
+    metrics.research_cache_lookups.inc(1, method, "miss")
+    try:
+        context, source = lookup_docs()
+        if source and context.strip():
+            # filed under the method that actually answered. a vectordb fallback after a tavily failure must not sit
+            # under the tavily key (the next tavily request should try tavily again), it is a valid vectordb answer
+            store(research_key(topic, tech_stack, source), topic, tech_stack, source, context)
+        future.set_result(context)
+        return context
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
@@ -0,0 +1,180 @@
+import json
+import os
+import re
+import threading
+import time
+from termcolor import cprint
+
+# local router for the build / debug / learn decision. keyword rules + a tiny tf-idf / logistic regression model
+# answer most prompts in well under a millisecond. only when they are not confident enough does route_query pay for
+# the 70b call, and that answer is logged (capped, see ROUTE_LOG_MAX) so the model keeps learning from the llm's decisions.
+# benchmark against the llm router: python -m agent.benchmark_router
+
+ROUTER_ENABLED = os.getenv("LOCKIN_LOCAL_ROUTER", "1") == "1"
+ROUTER_CONFIDENCE = float(os.getenv("LOCKIN_ROUTER_CONFIDENCE", "0.7"))  # below this we ask the llm
+RETRAIN_EVERY = int(os.getenv("LOCKIN_ROUTER_RETRAIN_EVERY", "25"))       # logged llm routes between retrains
+ROUTE_LOG = os.getenv("LOCKIN_ROUTER_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_log.jsonl"))
+ROUTE_LOG_MAX = int(os.getenv("LOCKIN_ROUTER_LOG_MAX", "5000"))  # newest llm labels kept, older ones are dropped
+
+ROUTES = ("build", "debug", "learn")
+
+# starting point before anything is logged. kept apart from the benchmark prompts on purpose
+SEED_EXAMPLES = [
+    ("build a todo app in react", "build"),
+    ("create a flask api for a bookstore", "build"),
+    ("make a python script that renames files in a folder", "build"),
+    ("generate a landing page for my bakery", "build"),
+    ("I want a weather dashboard with charts", "build"),
+    ("write a cli tool that converts csv to json", "build"),
+    ("build me a chat app with node and express", "build"),
+    ("simple calculator web app", "build"),
+    ("create a portfolio website with a contact form", "build"),
+    ("develop a expense tracker with a react frontend and flask backend", "build"),
+    ("fix this error: TypeError: cannot read properties of undefined", "debug"),
+    ("my flask app crashes with ModuleNotFoundError: No module named 'flask_cors'", "debug"),
+    ("why does this code throw KeyError 'id'", "debug"),
+    ("debug my react component, it renders twice", "debug"),
+    ("Traceback (most recent call last): File \"app.py\", line 3", "debug"),
+    ("npm install fails with ERESOLVE unable to resolve dependency tree", "debug"),
+    ("the tests keep failing with AssertionError", "debug"),
+    ("my fetch call returns a CORS error, how do I fix it", "debug"),
+    ("this function is not working, it returns None instead of the list", "debug"),
+    ("segmentation fault when running the script", "debug"),
+    ("Traceback (most recent call last): TypeError: unsupported operand type(s) for +: 'int' and 'str'", "debug"),
+    ("ModuleNotFoundError: No module named 'requests'", "debug"),
+    ("my django view raises ValueError on submit", "debug"),
+    ("Uncaught TypeError: Cannot read properties of null (reading 'map')", "debug"),
+    ("what is the difference between useEffect and useMemo", "learn"),
+    ("explain how async await works in javascript", "learn"),
+    ("how does python's garbage collector work", "learn"),
+    ("what is a REST api", "learn"),
+    ("teach me the basics of flask blueprints", "learn"),
+    ("when should I use a set instead of a list", "learn"),
+    ("can you explain closures", "learn"),
+    ("what are react hooks", "learn"),
+    ("how do promises differ from callbacks", "learn"),
+    ("what does the virtual dom do", "learn"),
+]
+
+# (pattern, route, weight) added on top of the model's probabilities
+RULES = [
+    # error names and tracebacks in any case (TypeError, Traceback), npm's ERR! / EADDRINUSE codes only in caps
+    (re.compile(r"(?i:traceback|stack ?trace|\b\w+(error|exception)\b|exit code|segmentation fault)|\bERR!|\bE[A-Z]{4,}\b"), "debug", 0.5),
+    (re.compile(r"\b(fix|debug|broken|crash(es|ed|ing)?|fail(s|ed|ing)?|not working|doesn'?t work|bug)\b", re.I), "debug", 0.3),
+    (re.compile(r"^\s*(what|why|how|when|which|can you explain|explain|teach me|difference between)\b", re.I), "learn", 0.3),
+    (re.compile(r"\b(build|create|make|generate|develop|scaffold|set up|setup)\b.*\b(app|site|website|page|api|tool|script|game|bot|dashboard|cli|backend|frontend|project)\b", re.I), "build", 0.4),
+]
+
+_lock = threading.Lock()
+_model = None
+_logged_since_training = 0
+_log_lines = None  # lines in ROUTE_LOG, counted on the first append
+
+def _read_log() -> list:
+    entries = []
+    if not os.path.exists(ROUTE_LOG):
+        return entries
+    with open(ROUTE_LOG, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            # only the llm's answers are labels, local answers would just teach the model its own mistakes.
+            # (older logs still have "local" lines, nothing writes them anymore)
+            if entry.get("source") == "llm" and entry.get("route") in ROUTES:
+                entries.append(entry)
+    return entries
+
+def _load_logged_routes() -> list:
+    return [(entry["prompt"], entry["route"]) for entry in _read_log()]
+
+def _trim_log():
+    # keeps the newest ROUTE_LOG_MAX labels. called with _lock held
+    global _log_lines
+    kept = _read_log()[-ROUTE_LOG_MAX:]
+    tmp = f"{ROUTE_LOG}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in kept)
+    os.replace(tmp, ROUTE_LOG)
+    _log_lines = len(kept)
+
+def train(extra_examples: list = None):
+    """(Re)fits the tf-idf model on the seed examples + every route the llm decided so far."""
+    global _model, _logged_since_training
+    # sklearn is only imported once the router is actually used
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    examples = SEED_EXAMPLES + _load_logged_routes() + (extra_examples or [])
+    texts, labels = zip(*examples)
+    model = make_pipeline(
+        TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, lowercase=True),
+        LogisticRegression(max_iter=1000, C=20.0),
+    )
+    model.fit(texts, labels)
+    with _lock:
+        _model = model
+        _logged_since_training = 0
+    return model
+
+def _get_model():
+    with _lock:
+        model = _model
+    return model if model is not None else train()
+
+def predict(user_prompt: str) -> tuple[str, float]:
+    """(route, confidence) from the rules + model, without any network call."""
+    model = _get_model()
+    probabilities = dict(zip(model.classes_, model.predict_proba([user_prompt])[0]))
+    scores = {route: probabilities.get(route, 0.0) for route in ROUTES}
+    for pattern, route, weight in RULES:
+        if pattern.search(user_prompt):
+            scores[route] += weight
+    total = sum(scores.values())
+    route = max(scores, key=scores.get)
+    return route, scores[route] / total
+
+def classify(user_prompt: str) -> str | None:
+    """The route when the local classifier is confident enough, None to fall back to the llm."""
+    if not ROUTER_ENABLED:
+        return None
+    try:
+        start = time.perf_counter()
+        route, confidence = predict(user_prompt)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        cprint(f"   [Local Router] Failed: {e}", "yellow")
+        return None
+
+    if confidence < ROUTER_CONFIDENCE:
+        cprint(f"   [Local Router] Unsure ({route}, {confidence:.2f}). Asking the LLM...", "yellow")
+        return None
+    # local answers aren't logged, they never become training data and would grow the log with every prompt
+    cprint(f"   [Local Router] {route} ({confidence:.2f}) in {elapsed_ms:.1f}ms", "blue")
+    return route
+
+def log_route(user_prompt: str, route: str, source: str = "llm", confidence: float = None):
+    """Appends an llm routing decision, training data for the next retrain. The log keeps the newest ROUTE_LOG_MAX."""
+    global _logged_since_training, _log_lines
+    try:
+        with _lock:
+            if _log_lines is None:
+                _log_lines = 0
+                if os.path.exists(ROUTE_LOG):
+                    with open(ROUTE_LOG, "rb") as f:
+                        _log_lines = sum(1 for _ in f)
+            with open(ROUTE_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"prompt": user_prompt, "route": route, "source": source, "confidence": confidence, "ts": time.time()}) + "\n")
+            _log_lines += 1
+            if _log_lines > ROUTE_LOG_MAX * 1.2:
+                # some slack so the file isn't rewritten on every append once it is full
+                _trim_log()
+            if source == "llm":
+                _logged_since_training += 1
+            retrain = source == "llm" and _logged_since_training >= RETRAIN_EVERY
+        if retrain:
+            train()
+    except Exception as e:
+        cprint(f"   [Local Router] Could not log route: {e}", "yellow")
@@ -1,9 +1,13 @@
 import json
 import os
+import threading
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 REGISTRY_FILE = os.path.join(SCRIPT_DIR, "active_sandboxes.json")
 
+# sandboxes can now be registered from background threads (speculative warm-up), so writes are serialized
+_registry_lock = threading.Lock()
+
 # done for session persistence in e2b
 # That is, if a sandbox has been created for this session before, then we fetch its ID so that we can warm boot it again
 def get_sandbox_for_session(session_id: str) -> str | None:
@@ -18,21 +22,33 @@ def get_sandbox_for_session(session_id: str) -> str | None:
     except Exception:
         return None
 
-def register_sandbox(session_id: str, sandbox_id: str):
-    """Links a Sandbox ID to a Session ID."""
-    registry = {}
-    
+def _load_registry() -> dict:
     # Load existing registry if it exists
     if os.path.exists(REGISTRY_FILE):
         try:
             with open(REGISTRY_FILE, "r") as f:
-                registry = json.load(f)
+                return json.load(f)
         except Exception:
-            registry = {}
+            return {}
+    return {}
+
+def register_sandbox(session_id: str, sandbox_id: str):
+    """Links a Sandbox ID to a Session ID."""
+    with _registry_lock:
+        registry = _load_registry()
             
-    # Update and save. also create file if it doesnt exist
-    registry[session_id] = sandbox_id
-    with open(REGISTRY_FILE, "w") as f:
-        json.dump(registry, f, indent=4)
+        # Update and save. also create file if it doesnt exist
+        registry[session_id] = sandbox_id
+        with open(REGISTRY_FILE, "w") as f:
+            json.dump(registry, f, indent=4)
     
-    print(f" Linked Session {session_id[:8]}... -> Sandbox {sandbox_id}")
\ No newline at end of file
+    print(f" Linked Session {session_id[:8]}... -> Sandbox {sandbox_id}")
+
+def unregister_sandbox(session_id: str):
+    """Drops the Sandbox ID linked to a Session ID (e.g. a warm sandbox that turned out to be the wrong template)."""
+    with _registry_lock:
+        registry = _load_registry()
+        if registry.pop(session_id, None) is None:
+            return
+        with open(REGISTRY_FILE, "w") as f:
+            json.dump(registry, f, indent=4)
\ No newline at end of file
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import cprint
+from e2b_code_interpreter import Sandbox
+
+from agent.prompts import BUILD_RULES
+from agent.sandbox_registry import get_sandbox_for_session, register_sandbox, unregister_sandbox
+
+# speculative sandbox boot. the planner knows the tech stack long before the executor runs,
+# so the vm boot + base toolchain install can overlap with the architect, coder and qa agents.
+# the warm sandbox is handed over through sandbox_registry, exactly like a sandbox from a previous executor run
+
+# same templates runtime_selector picks from the generated files
+STACK_TEMPLATES = {
+    "react_flask": "node-python-base",
+    "python_script": "python-base",
+    "react_only": "node-base",
+    "node_backend": "node-base",
+}
+
+WARMUP_ENABLED = os.getenv("LOCKIN_SANDBOX_WARMUP", "1") == "1"
+WARMUP_WAIT_TIMEOUT = int(os.getenv("LOCKIN_SANDBOX_WARMUP_WAIT", "180"))  # how long the executor waits for an in-flight boot
+WARMUP_SANDBOX_TTL = int(os.getenv("LOCKIN_SANDBOX_WARMUP_TTL", "1200"))    # the build phase can easily outlive e2b's default 5 min
+
+_warmup_executor = ThreadPoolExecutor(max_workers=4)
+_warmups = {}  # session_id -> {"template": str, "future": Future, "abandoned": bool}
+_lock = threading.Lock()
+
+def pinned_toolchain(tech_stack: str) -> list:
+    """Pulls the exact `package@^version` pins out of BUILD_RULES so the prompts stay the single source of truth."""
+    rules = BUILD_RULES.get(tech_stack, "")
+    return re.findall(r"`(@?[a-z0-9][\w.\-/]*@\^?[\d.]+)`", rules)
+
+def _warmup_commands(template: str, tech_stack: str) -> list:
+    commands = []
+    if "python" in template:
+        # same first install the executor does. it turns into a no-op there
+        commands.append(("pip install pytest --break-system-packages", 60))
+    if "node" in template:
+        pins = pinned_toolchain(tech_stack)
+        if pins:
+            # only fills npm's cache. installing into /home/user/app before the real package.json exists
+            # would fight the executor's `npm install --legacy-peer-deps`
+            commands.append((f"npm cache add {' '.join(pins)}", 180))
+    return commands
+
+def _boot(session_id: str, template: str, tech_stack: str):
+    sandbox = Sandbox.create(template=template, timeout=WARMUP_SANDBOX_TTL)
+    cprint(f"   [Warmup] Sandbox {sandbox.sandbox_id} booted ({template}). Installing toolchain...", "blue")
+
+    for command, timeout in _warmup_commands(template, tech_stack):
+        try:
+            sandbox.commands.run(command, timeout=timeout)
+        except Exception as e:
+            # a half warm sandbox is still a booted sandbox, the executor installs everything again anyway
+            cprint(f"   [Warmup] '{command[:40]}...' failed: {e}", "yellow")
+
+    with _lock:
+        entry = _warmups.get(session_id)
+        abandoned = entry is None or entry["abandoned"]
+        if not abandoned:
+            register_sandbox(session_id, sandbox.sandbox_id)
+
+    if abandoned:
+        # the executor stopped waiting and made its own sandbox. dont overwrite its registry entry
+        cprint(f"   [Warmup] Sandbox {sandbox.sandbox_id} no longer needed. Killing it.", "yellow")
+        sandbox.kill()
+        return None
+
+    cprint(f"   [Warmup] Sandbox {sandbox.sandbox_id} ready for session {session_id[:8]}...", "green")
+    return sandbox
+
+def start_sandbox_warmup(session_id: str, tech_stack: str):
+    """Boots the sandbox template for this tech stack in the background."""
+    template = STACK_TEMPLATES.get(tech_stack)
+    if not WARMUP_ENABLED or not template:
+        return
+
+    with _lock:
+        if session_id in _warmups:
+            return
+        _warmups[session_id] = {
+            "template": template,
+            "future": _warmup_executor.submit(_boot, session_id, template, tech_stack),
+            "abandoned": False,
+        }
+    cprint(f"   [Warmup] Provisioning '{template}' sandbox in the background...", "blue")
+
+def _claim(session_id: str, entry: dict, sandbox, template: str) -> str | None:
+    with _lock:
+        entry["abandoned"] = sandbox is None
+        _warmups.pop(session_id, None)
+
+    if sandbox is None:
+        return None
+
+    if entry["template"] != template:
+        # planner's stack didn't match the files the coder actually produced
+        cprint(f"   [Warmup] Warm sandbox is '{entry['template']}' but '{template}' is needed. Discarding it.", "yellow")
+        unregister_sandbox(session_id)
+        try:
+            sandbox.kill()
+        except Exception:
+            pass
+        return None
+
+    return sandbox.sandbox_id
+
+def await_warm_sandbox(session_id: str, template: str) -> str | None:
+    """
+    Waits for this session's speculative sandbox (if any) and returns its id.
+    Returns None when there was no warm-up, it failed, or it booted the wrong template.
+    """
+    with _lock:
+        entry = _warmups.get(session_id)
+    if entry is None:
+        return None
+
+    future = entry["future"]
+    if not future.done():
+        cprint("   [Warmup] Waiting for the speculative sandbox to finish booting...", "blue")
+    try:
+        sandbox = future.result(timeout=WARMUP_WAIT_TIMEOUT)
+    except Exception as e:
+        cprint(f"   [Warmup] Speculative sandbox not usable: {e}", "yellow")
+        sandbox = None
+
+    return _claim(session_id, entry, sandbox, template)
+
+def release_warm_sandbox(session_id: str):
+    """
+    Drops a warm-up the executor never claimed (the run failed or was cancelled before it got there).
+    A boot still in flight kills its sandbox itself once it sees the entry is gone, a finished one is killed here.
+    Nothing to do after a claim, the sandbox then belongs to the session like any executor sandbox.
+    """
+    with _lock:
+        entry = _warmups.pop(session_id, None)
+        if entry is None:
+            return
+        entry["abandoned"] = True
+        future = entry["future"]
+        if not future.done():
+            future.cancel()  # still waiting for a pool thread, never boots
+            return
+
+    try:
+        sandbox = future.result()
+    except Exception:
+        return
+    if sandbox is None:
+        return
+    cprint(f"   [Warmup] Run ended before the executor claimed sandbox {sandbox.sandbox_id}. Killing it.", "yellow")
+    if get_sandbox_for_session(session_id) == sandbox.sandbox_id:
+        unregister_sandbox(session_id)
+    try:
+        sandbox.kill()
+    except Exception:
+        pass
+
+async def aawait_warm_sandbox(session_id: str, template: str) -> str | None:
+    """Async await_warm_sandbox. The boot itself stays on the warm-up pool, the event loop only waits on it."""
+    with _lock:
+        entry = _warmups.get(session_id)
+    if entry is None:
+        return None
+
+    future = entry["future"]
+    if not future.done():
+        cprint("   [Warmup] Waiting for the speculative sandbox to finish booting...", "blue")
+    try:
+        sandbox = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=WARMUP_WAIT_TIMEOUT)
+    except Exception as e:
+        cprint(f"   [Warmup] Speculative sandbox not usable: {e}", "yellow")
+        sandbox = None
+
+    # kill() on the sync sandbox object is a blocking http call, keep it off the event loop
+    return await asyncio.to_thread(_claim, session_id, entry, sandbox, template)
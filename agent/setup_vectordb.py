@@ -1,14 +1,23 @@
 import os
+import sys
 import json
 import shutil # Import for deleting the old directory
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from langchain_community.document_loaders import UnstructuredMarkdownLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_community.vectorstores import Chroma
 
 load_dotenv()
 
+# run from agent/ (see README), the repo root has to be importable for agent.embeddings
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+from agent.embeddings import EMBEDDING_BACKEND, get_embeddings
+from agent.hybrid_search import INDEX_FILE, BM25Index
+from agent import research_cache
+
 # --- Configuration ---
 DOCS_PATH = "../scraped_documentation" 
 DB_PATH = "chroma_db" # <-- This will be the directory for ChromaDB
@@ -16,8 +25,8 @@ HF_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
 def create_vector_db():
     """Creates a persistent Chroma vector database from markdown documentation."""
-    # Check for Hugging Face API token
-    if not os.getenv("HUGGINGFACEHUB_API_TOKEN"):
+    # Check for Hugging Face API token (only the endpoint backend calls the api)
+    if EMBEDDING_BACKEND == "endpoint" and not os.getenv("HUGGINGFACEHUB_API_TOKEN"):
         raise ValueError("Hugging Face API token not found. Please set HUGGINGFACEHUB_API_TOKEN in your .env file.")
 
     print("Finding and loading documentation from index.json files...")
@@ -59,9 +68,12 @@ def create_vector_db():
                     loaded_docs = loader.load() # This returns a list of Document
                     
                     # Add the correct metadata to each loaded doc
+                    # library + domain let perform_jit_research search only the docs of the task's tech stack
                     for doc in loaded_docs:
                         doc.metadata["source"] = url
                         doc.metadata["title"] = title
+                        doc.metadata["library"] = os.path.basename(root)  # react-docs, flask-docs
+                        doc.metadata["domain"] = urlparse(url).netloc     # matched against TECH_STACK_DOCS
                         all_documents.append(doc)
                         
                 except Exception as e:
@@ -78,10 +90,8 @@ def create_vector_db():
     docs = text_splitter.split_documents(all_documents) # Use all_documents here
     print(f"Split into {len(docs)} chunks.")
 
-    print("Creating embeddings via Hugging Face Endpoint Embeddings...")
-    embeddings = HuggingFaceEndpointEmbeddings(
-        repo_id=HF_EMBEDDING_MODEL
-    )
+    print(f"Creating embeddings ({EMBEDDING_BACKEND} backend)...")
+    embeddings = get_embeddings(HF_EMBEDDING_MODEL)
 
     # --- NEW: Remove old database before creating new one ---
     if os.path.exists(DB_PATH):
@@ -97,5 +107,13 @@ def create_vector_db():
     )
     print(f"Vector database created and saved to '{DB_PATH}'")
 
+    # lexical index over the same chunks, perform_jit_research fuses it with the vector hits
+    print("Building BM25 index...")
+    BM25Index.build(docs).save(DB_PATH)
+    print(f"BM25 index saved to '{os.path.join(DB_PATH, INDEX_FILE)}'")
+
+    # cached vectordb answers came from the old store
+    research_cache.clear("vectordb")
+
 if __name__ == "__main__":
     create_vector_db()
\ No newline at end of file
@@ -27,6 +27,10 @@ class FileTask(BaseModel):
     file_name: str = Field(description="The relative path to the file (e.g., 'src/components/TodoList.js').")
     task_description: str = Field(description="Precise instructions on what to write in this file.")
     related_docs_topic: str = Field(description="The specific library/concept needed (e.g., 'React useState hook' or 'Flask SQLAlchemy').")
+    depends_on: List[str] = Field(
+        default_factory=list,
+        description="The file_name of other files in this manifest that this file imports or is configured against. Empty if it does not need any."
+    )
 
 class TaskPlan(BaseModel):
     """The File Manifest."""
@@ -93,6 +97,7 @@ class GraphState(TypedDict):
 
     route: str | None
     plan: Plan | None
+    plan_reuse: str | None          # plan library entry the planner reused, the architect loads its file tasks from it
     task_queue: List[Dict[str, Any]]  #Replaces 'task_plan'. This is the list of files to build.
     current_task_index: int          # used by coder to loop through the tasks in the task queue
 
@@ -111,5 +116,7 @@ class GraphState(TypedDict):
     attempt_history: Annotated[List[dict], operator.add]
     error_report: str
     status: str
+    failed_tests: List[str]          # test files that failed in the last executor run, rerun first on the next repair iteration
+    full_logs_path: str | None       # uncompacted logs of the last executor run, the evaluator / debugger see the compacted ones
 
     sandbox_id: str | None
@@ -0,0 +1,57 @@
+from typing import Any, Dict, List
+
+# turns the architect's flat task queue into dependency "waves".
+# every task in a wave only depends on tasks from earlier waves, so a whole wave can be handed to the coder pool at once.
+# queue indices are used everywhere (not file names) because the debugger is allowed to put the same file in the queue twice
+
+def _normalize(name: str) -> str:
+    name = (name or "").replace("\\", "/").strip()
+    if name.startswith("./"):
+        name = name[2:]
+    return name.lower()
+
+def _resolve(occurrences: List[int], index: int) -> int | None:
+    # a dependency points at the closest earlier occurrence of that file.
+    # if the architect listed it later in the queue (happens), point at its first occurrence instead
+    earlier = [i for i in occurrences if i < index]
+    if earlier:
+        return earlier[-1]
+    later = [i for i in occurrences if i > index]
+    return later[0] if later else None
+
+def build_task_waves(tasks: List[Dict[str, Any]], start: int = 0) -> List[List[int]]:
+    """Groups the queue indices from `start` onwards into waves that can be generated concurrently."""
+    indices = list(range(start, len(tasks)))
+    occurrences: Dict[str, List[int]] = {}
+    for i in indices:
+        occurrences.setdefault(_normalize(tasks[i].get("file_name")), []).append(i)
+
+    deps: Dict[int, set] = {}
+    for i in indices:
+        name = _normalize(tasks[i].get("file_name"))
+        wanted = set()
+
+        # same file twice in the queue must be written in queue order, never at the same time
+        previous = [j for j in occurrences[name] if j < i]
+        if previous:
+            wanted.add(previous[-1])
+
+        for dep in tasks[i].get("depends_on") or []:
+            j = _resolve(occurrences.get(_normalize(dep), []), i)
+            if j is not None and j != i:
+                wanted.add(j)
+        deps[i] = wanted
+
+    waves = []
+    done = set()
+    remaining = set(indices)
+    while remaining:
+        ready = sorted(i for i in remaining if deps[i] <= done)
+        if not ready:
+            # dependency cycle. break it by falling back to the architect's order
+            ready = [min(remaining)]
+        waves.append(ready)
+        done.update(ready)
+        remaining.difference_update(ready)
+
+    return waves
@@ -0,0 +1,177 @@
+import os
+import re
+from typing import Dict, List, Optional
+
+# test impact selection for the repair loop. after the debugger patched a couple of files there is no point in running
+# the whole suite first: only the tests that (transitively) import a patched file, plus whatever failed last time,
+# can tell us anything new. the executor runs this selection first and only runs the full suite once it passes.
+# mapping comes from two places: the qa plan (target_file -> test_file_name) and the imports found in the code itself
+
+PY_EXTENSIONS = (".py",)
+JS_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".mjs")
+JS_RESOLVE_SUFFIXES = ("", ".js", ".jsx", ".ts", ".tsx", ".mjs", "/index.js", "/index.jsx", "/index.ts", "/index.tsx")
+
+# patching any of these can change every test, so they always mean a full run
+GLOBAL_FILES = re.compile(r"^(conftest\.py|pytest\.ini|setup\.cfg|pyproject\.toml|requirements\.txt|package\.json|"
+                          r"(vite|vitest)\.config\.[jt]s|setupTests\.[jt]sx?|\.babelrc)$")
+
+PY_IMPORT = re.compile(r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+([\w, ()*]+)|import\s+([\w., ]+))", re.MULTILINE)
+JS_IMPORT = re.compile(r"""(?:import\s+(?:[^'"]*?\s+from\s+)?|require\(\s*|import\(\s*)['"](\.{1,2}/[^'"]+)['"]""")
+
+# pytest -q: "FAILED tests/test_api.py::test_x - AssertionError" / "ERROR tests/test_api.py - ImportError"
+PYTEST_FAILED = re.compile(r"^(?:FAILED|ERROR)\s+([\w./\-]+\.py)", re.MULTILINE)
+# vitest: " FAIL  src/App.test.jsx > App > renders"
+VITEST_FAILED = re.compile(r"FAIL\s+([\w./\-]+\.(?:test|spec)\.[jt]sx?)")
+
+def _norm(path: str) -> str:
+    path = (path or "").replace("\\", "/").strip()
+    while path.startswith("./"):
+        path = path[2:]
+    return path
+
+def is_test_file(path: str) -> bool:
+    name = os.path.basename(path)
+    if name.endswith(".py"):
+        return name.startswith("test_") or name.endswith("_test.py")
+    return ".test." in name or ".spec." in name
+
+def _code_files(code_dir: str) -> List[str]:
+    files = []
+    for root, dirs, names in os.walk(code_dir):
+        dirs[:] = [d for d in dirs if d not in ("node_modules", "__pycache__", ".git")]
+        for name in names:
+            if name.endswith(PY_EXTENSIONS + JS_EXTENSIONS):
+                files.append(_norm(os.path.relpath(os.path.join(root, name), code_dir)))
+    return files
+
+def _resolve_python(module: str, importer: str, known: set) -> List[str]:
+    dots = len(module) - len(module.lstrip("."))
+    module_path = module.lstrip(".").replace(".", "/")
+    if dots:
+        # relative import, anchored at the importing package
+        base = os.path.dirname(importer)
+        for _ in range(dots - 1):
+            base = os.path.dirname(base)
+        bases = [base]
+    else:
+        # absolute import. tests run from the app root (and backend/ with PYTHONPATH=.), so try every ancestor
+        bases, base = [], os.path.dirname(importer)
+        while True:
+            bases.append(base)
+            if not base:
+                break
+            base = os.path.dirname(base)
+
+    found = []
+    for base in bases:
+        stem = _norm(os.path.join(base, module_path)) if module_path else _norm(base)
+        for candidate in (f"{stem}.py", f"{stem}/__init__.py"):
+            if candidate in known:
+                found.append(candidate)
+                break
+    return found
+
+def _imports(code_dir: str, path: str, known: set) -> set:
+    try:
+        with open(os.path.join(code_dir, path), "r", encoding="utf-8", errors="ignore") as f:
+            source = f.read()
+    except OSError:
+        return set()
+
+    deps = set()
+    if path.endswith(PY_EXTENSIONS):
+        for from_module, names, plain in PY_IMPORT.findall(source):
+            if from_module:
+                deps.update(_resolve_python(from_module, path, known))
+                # `from pkg import module` imports a submodule, not just a name
+                for name in re.split(r"[,\s()]+", names):
+                    if name and name not in ("*", "as"):
+                        submodule = from_module + name if from_module.endswith(".") else f"{from_module}.{name}"
+                        deps.update(_resolve_python(submodule, path, known))
+            else:
+                for module in plain.split(","):
+                    module = module.strip().split(" ")[0]
+                    if module:
+                        deps.update(_resolve_python(module, path, known))
+    else:
+        for spec in JS_IMPORT.findall(source):
+            stem = _norm(os.path.normpath(os.path.join(os.path.dirname(path), spec)))
+            for suffix in JS_RESOLVE_SUFFIXES:
+                if stem + suffix in known:
+                    deps.add(stem + suffix)
+                    break
+    deps.discard(path)
+    return deps
+
+def failed_tests_from_logs(logs: str) -> List[str]:
+    """Test files that failed or errored in a pytest / vitest run's output."""
+    failed = []
+    for match in PYTEST_FAILED.findall(logs or "") + VITEST_FAILED.findall(logs or ""):
+        match = _norm(match)
+        if match not in failed:
+            failed.append(match)
+    return failed
+
+def _existing(code_dir: str, known: set, path: str) -> Optional[str]:
+    # vitest prints paths relative to the package (frontend/), pytest relative to the app root
+    path = _norm(path)
+    if path in known:
+        return path
+    suffix_matches = [k for k in known if k.endswith("/" + path)]
+    return suffix_matches[0] if len(suffix_matches) == 1 else None
+
+def select_tests(code_dir: str, qa_plan: list, changed_files: List[str], failed_tests: List[str] = None) -> Optional[Dict[str, list]]:
+    """
+    Returns {"python": [test paths], "node": [test paths]} (relative to the app root) for the patched files,
+    or None when a full run is needed anyway (config / dependency file patched, or nothing to select).
+    """
+    changed = [_norm(f) for f in changed_files if f]
+    if not changed:
+        return None
+    for path in changed:
+        if GLOBAL_FILES.match(os.path.basename(path)) or not path.endswith(PY_EXTENSIONS + JS_EXTENSIONS):
+            return None
+
+    files = _code_files(code_dir)
+    known = set(files)
+
+    # reverse import graph: file -> files that import it
+    importers: Dict[str, set] = {}
+    for path in files:
+        for dep in _imports(code_dir, path, known):
+            importers.setdefault(dep, set()).add(path)
+
+    impacted, frontier = set(), [p for p in changed if p in known]
+    while frontier:
+        path = frontier.pop()
+        if path in impacted:
+            continue
+        impacted.add(path)
+        frontier.extend(importers.get(path, ()))
+
+    selected = {p for p in impacted if is_test_file(p)}
+    for task in qa_plan or []:
+        target, test_file = _norm(task.get("target_file")), _norm(task.get("test_file_name"))
+        if target in impacted and test_file in known:
+            selected.add(test_file)
+
+    for failed in failed_tests or []:
+        path = _existing(code_dir, known, failed)
+        if path:
+            selected.add(path)
+
+    if not selected:
+        return None
+    return {
+        "python": sorted(p for p in selected if p.endswith(PY_EXTENSIONS)),
+        "node": sorted(p for p in selected if p.endswith(JS_EXTENSIONS)),
+    }
+
+def package_dir(code_dir: str, path: str) -> str:
+    """Closest folder above a js test that has a package.json (where `npm test` has to run)."""
+    folder = os.path.dirname(path)
+    while folder:
+        if os.path.exists(os.path.join(code_dir, folder, "package.json")):
+            return folder
+        folder = os.path.dirname(folder)
+    return ""
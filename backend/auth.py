@@ -37,6 +37,14 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def get_token_subject(token: str):
+    """Returns the `sub` of a valid access token, None for anything else."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
 def generate_verification_token():
     return secrets.token_urlsafe(32)
 
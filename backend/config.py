@@ -16,4 +16,14 @@ MAIL_FROM = config("MAIL_FROM", default="noreply@lockin.com")
 MAIL_PORT = 587
 MAIL_SERVER = config("MAIL_SERVER", default="smtp.gmail.com")
 MAIL_STARTTLS = True
-MAIL_SSL_TLS = False
\ No newline at end of file
+MAIL_SSL_TLS = False
+
+# Graph job queue (see jobs.py)
+JOB_WORKERS = config("LOCKIN_JOB_WORKERS", default=2, cast=int)              # graphs running at the same time
+JOB_QUEUE_DEPTH = config("LOCKIN_JOB_QUEUE_DEPTH", default=20, cast=int)     # waiting jobs before /prompt answers 429
+JOB_MAX_PER_USER = config("LOCKIN_JOB_MAX_PER_USER", default=2, cast=int)    # queued + running jobs per user
+JOB_MAX_PRIORITY = config("LOCKIN_JOB_MAX_PRIORITY", default=2, cast=int)    # logged in users can ask for 0..this
+JOB_KEEP_SECONDS = config("LOCKIN_JOB_KEEP_SECONDS", default=3600, cast=int) # finished jobs stay visible on /jobs/{id} this long
+
+# Agent start up (see warm_up in agent/graph.py)
+AGENT_WARM_UP = config("LOCKIN_WARM_UP", default=True, cast=bool)  # build llm clients / vector stores at boot instead of on the first request
@@ -0,0 +1,170 @@
+import asyncio
+import itertools
+import time
+import uuid
+
+# admission control for graph runs. /prompt only enqueues a job, a fixed number of worker tasks on the event loop
+# actually run graphs. so a burst of users waits in line instead of all of them hitting groq, e2b and the
+# thread pools at the same time.
+# scheduling: highest priority first, then the user with the fewest running jobs (so one user cant hog every worker),
+# then whoever has been waiting the longest
+
+class QueueFull(Exception):
+    """Raised when a job can't be admitted. The endpoint turns it into a 429."""
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+class Job:
+    def __init__(self, user_key: str, priority: int, run, session_id: str):
+        self.id = str(uuid.uuid4())
+        self.user_key = user_key
+        self.priority = priority
+        self.run = run                # coroutine function, called once a worker picks the job up
+        self.session_id = session_id
+        self.status = "queued"        # queued -> running -> done | failed
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = asyncio.Event()
+        self.task = None              # the running graph, so a job can be cancelled mid run
+
+class JobQueue:
+    def __init__(self, workers: int, max_depth: int, max_per_user: int, keep_seconds: int):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_per_user = max_per_user
+        self.keep_seconds = keep_seconds
+
+        self._jobs = {}       # job_id -> Job, finished ones are kept for keep_seconds so /jobs/{id} can report them
+        self._pending = []    # Jobs waiting for a worker
+        self._running = {}    # user_key -> number of running jobs
+        self._order = itertools.count()
+        self._seq = {}        # job_id -> arrival number, tie breaker
+        self._wakeup = None
+        self._tasks = []
+
+    def start(self):
+        self._wakeup = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            self._jobs.pop(job_id, None)
+
+    def _user_load(self, user_key: str) -> int:
+        return self._running.get(user_key, 0) + sum(1 for j in self._pending if j.user_key == user_key)
+
+    async def submit(self, user_key: str, priority: int, run, session_id: str = None) -> Job:
+        """Admits a job or raises QueueFull. `run` is awaited by a worker as run(job)."""
+        self._prune()
+        if len(self._pending) >= self.max_depth:
+            raise QueueFull(f"Build queue is full ({self.max_depth} waiting). Try again shortly.", retry_after=30)
+        if self._user_load(user_key) >= self.max_per_user:
+            raise QueueFull(f"You already have {self.max_per_user} builds queued or running.", retry_after=60)
+
+        job = Job(user_key, priority, run, session_id)
+        self._jobs[job.id] = job
+        self._seq[job.id] = next(self._order)
+        async with self._wakeup:
+            self._pending.append(job)
+            self._wakeup.notify()
+        return job
+
+    def _next_job(self) -> Job:
+        # highest priority, then least busy user, then first come first served
+        job = min(self._pending, key=lambda j: (-j.priority, self._running.get(j.user_key, 0), self._seq[j.id]))
+        self._pending.remove(job)
+        return job
+
+    async def _worker(self, number: int):
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: self._pending)
+                job = self._next_job()
+                self._running[job.user_key] = self._running.get(job.user_key, 0) + 1
+
+            job.status = "running"
+            job.started_at = time.time()
+            job.task = asyncio.create_task(job.run(job))
+            try:
+                job.result = await job.task
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "cancelled"
+                if asyncio.current_task().cancelling():
+                    raise  # the worker itself is shutting down, not just this job
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                self._seq.pop(job.id, None)
+                self._running[job.user_key] -= 1
+                if not self._running[job.user_key]:
+                    del self._running[job.user_key]
+                job.done.set()
+
+    def cancel(self, job: Job):
+        """Drops a queued job or stops a running one (e.g. the client of a stream went away)."""
+        if job.status == "queued" and job in self._pending:
+            self._pending.remove(job)
+            self._seq.pop(job.id, None)
+            job.status = "failed"
+            job.error = "cancelled"
+            job.finished_at = time.time()
+            job.done.set()
+        elif job.task is not None and not job.task.done():
+            job.task.cancel()
+
+    def active(self, session_id: str) -> Job | None:
+        """The queued or running job of a session, if there is one."""
+        for job in self._jobs.values():
+            if job.session_id == session_id and job.status in ("queued", "running"):
+                return job
+        return None
+
+    def get(self, job_id: str) -> Job | None:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> int | None:
+        """1-based place in line if the scheduler ran right now, None once the job left the queue."""
+        if job.status != "queued":
+            return None
+        ordered = sorted(self._pending, key=lambda j: (-j.priority, self._running.get(j.user_key, 0), self._seq[j.id]))
+        return ordered.index(job) + 1 if job in ordered else None
+
+    def describe(self, job: Job) -> dict:
+        info = {
+            "job_id": job.id,
+            "status": job.status,
+            "session_id": job.session_id,
+            "priority": job.priority,
+            "position": self.position(job),
+            "queued_seconds": round((job.started_at or time.time()) - job.created_at, 2),
+        }
+        if job.started_at:
+            info["run_seconds"] = round((job.finished_at or time.time()) - job.started_at, 2)
+        if job.status == "failed":
+            info["error"] = job.error
+        return info
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": sum(self._running.values()),
+            "queued": len(self._pending),
+            "max_depth": self.max_depth,
+        }
@@ -1,23 +1,24 @@
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, StreamingResponse
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 from models import User, UserCreate, UserLogin, Token
 from pydantic import BaseModel
-import anyio
 import sys
 import os
 import json
+import uuid
 import asyncio
 import httpx
 import certifi
 from pathlib import Path
 from contextlib import asynccontextmanager
-from auth import get_password_hash, create_access_token, generate_verification_token, send_verification_email, authenticate_user
-from config import MONGODB_URL, DATABASE_NAME
+from auth import get_password_hash, create_access_token, generate_verification_token, send_verification_email, authenticate_user, get_token_subject
+from config import MONGODB_URL, DATABASE_NAME, JOB_WORKERS, JOB_QUEUE_DEPTH, JOB_MAX_PER_USER, JOB_MAX_PRIORITY, JOB_KEEP_SECONDS, AGENT_WARM_UP
+from jobs import JobQueue, QueueFull
 import uvicorn
 from github_service import sync_to_github
 
@@ -26,7 +27,14 @@ ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.append(str(ROOT_DIR))
 
-from agent.graph import run_graph, set_file_callback
+from agent.graph import arun_graph, aresume_graph, set_file_callback, warm_up
+from agent.metrics import render_prometheus
+
+# every graph run (/prompt, /prompt/stream, /resume) goes through this queue, see jobs.py
+job_queue = JobQueue(JOB_WORKERS, JOB_QUEUE_DEPTH, JOB_MAX_PER_USER, JOB_KEEP_SECONDS)
+
+SESSIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "agent", "output")
+OWNER_FILE = "owner"  # jwt subject of whoever started the session, next to its checkpoints so it survives a restart
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -43,7 +51,12 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"MongoDB connection failed: {e}")
         app.state.db_client = None
+    job_queue.start()
+    if AGENT_WARM_UP:
+        # in the background so the api answers right away, a request that comes in first waits on the same init
+        app.state.warm_up = asyncio.create_task(asyncio.to_thread(warm_up))
     yield
+    await job_queue.stop()
     if app.state.db_client:
         app.state.db_client.close()
 
@@ -69,6 +82,7 @@ async def add_security_headers(request, call_next):
 class GraphRequest(BaseModel):
     prompt: str
     search_method: bool = False
+    priority: int = 0
 
 @app.post("/signup")
 async def signup(user: UserCreate):
@@ -163,80 +177,161 @@ async def login(user: UserLogin):
 # async def home(token: str = Depends(oauth2_scheme)):
     # return {"message": "Welcome to home page"}
 
-@app.post("/prompt")
-async def run_graph_endpoint(payload: GraphRequest):
-    result = await anyio.to_thread.run_sync(run_graph, payload.prompt, payload.search_method)
-    
-    # Extract session_id from result
-    session_id = result.get("session_id")
-    
-    # Return result with frontend files info
+def _requester(request: Request) -> tuple:
+    """(user key, logged in?) for fairness. the jwt subject when there is a valid token, otherwise the client ip."""
+    auth_header = request.headers.get("authorization", "")
+    if auth_header.lower().startswith("bearer "):
+        subject = get_token_subject(auth_header[7:].strip())
+        if subject:
+            return f"user:{subject}", True
+    return f"ip:{request.client.host if request.client else 'unknown'}", False
+
+def _record_owner(session_id: str, subject: str):
+    session_dir = os.path.join(SESSIONS_DIR, session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    with open(os.path.join(session_dir, OWNER_FILE), "w", encoding="utf-8") as f:
+        f.write(subject)
+
+def _session_owner(session_id: str) -> str | None:
+    try:
+        with open(os.path.join(SESSIONS_DIR, session_id, OWNER_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+async def _admit(request: Request, priority: int, run, session_id: str):
+    user_key, logged_in = _requester(request)
+    # anonymous callers always get the lowest priority
+    priority = max(0, min(priority, JOB_MAX_PRIORITY)) if logged_in else 0
+    try:
+        job = await job_queue.submit(user_key, priority, run, session_id)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    if logged_in:
+        # only logged in sessions can be resumed later, anonymous ones have nobody to check against
+        _record_owner(session_id, user_key.removeprefix("user:"))
+    return job
+
+def _job_result(result: dict) -> dict:
     return {
         "result": result,
-        "session_id": session_id,
+        "session_id": result.get("session_id"),
         "preview_url": result.get("preview_url"),
-        # "frontend_url": f"http://localhost:8000/session/{session_id}/frontend" if session_id else None
     }
 
+@app.post("/prompt", status_code=202)
+async def run_graph_endpoint(payload: GraphRequest, request: Request):
+    # only enqueues the run. poll /jobs/{job_id} for the result
+    session_id = str(uuid.uuid4())
+
+    async def run(job):
+        return _job_result(await arun_graph(payload.prompt, payload.search_method, session_id=session_id))
+
+    job = await _admit(request, payload.priority, run, session_id)
+    return job_queue.describe(job)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    info = job_queue.describe(job)
+    if job.status == "done":
+        info.update(job.result)
+    return info
+
+@app.get("/jobs")
+async def get_job_stats():
+    return job_queue.stats()
+
+@app.post("/resume/{session_id}", status_code=202)
+async def resume_graph_endpoint(session_id: str, request: Request):
+    # picks a crashed run back up from its last checkpointed node instead of starting a new session
+    try:
+        session_id = str(uuid.UUID(session_id))  # also keeps the id from walking out of the output dir
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    auth_header = request.headers.get("authorization", "")
+    subject = get_token_subject(auth_header[7:].strip()) if auth_header.lower().startswith("bearer ") else None
+    if not subject:
+        raise HTTPException(status_code=401, detail="Log in to resume a session")
+    owner = _session_owner(session_id)
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if owner != subject:
+        raise HTTPException(status_code=403, detail="Not your session")
+
+    # a second run on the same thread would interleave its checkpoints with the first one.
+    # nothing awaits between this check and submit() registering the new job, so two resumes can't both get through
+    active = job_queue.active(session_id)
+    if active is not None:
+        raise HTTPException(status_code=409, detail={"message": "Session already has a build queued or running", **job_queue.describe(active)})
+
+    async def run(job):
+        return _job_result(await aresume_graph(session_id))
+
+    job = await _admit(request, 0, run, session_id)
+    return job_queue.describe(job)
+
 @app.post("/prompt/stream")
-async def run_graph_stream_endpoint(payload: GraphRequest):
+async def run_graph_stream_endpoint(payload: GraphRequest, request: Request):
     """Stream file creation events in real-time using Server-Sent Events"""
+    file_queue = asyncio.Queue()
+    session_id = str(uuid.uuid4())
     
-    async def event_generator():
-        file_queue = asyncio.Queue()
-        session_id_holder = {}
-        
-        # Get the current event loop for the callback to use
-        loop = asyncio.get_event_loop()
-        
-        def file_callback(event_type: str, data: dict):
-            """Callback function that runs in the agent thread"""
-            try:
-                filename = data.get('filename', 'N/A')
+    # Get the current event loop for the callback to use
+    loop = asyncio.get_event_loop()
+    
+    def file_callback(event_type: str, data: dict):
+        """Callback function that runs in the agent (either on the event loop or one of the agent's worker pools)"""
+        try:
+            filename = data.get('filename', 'N/A')
+            # file_delta arrives several times a second per file, only log the real file events
+            verbose = event_type != "file_delta"
+            if verbose:
                 print(f"[BACKEND CALLBACK] Received event: {event_type}, file: {filename}")
-                # Use the captured event loop to safely put data from worker thread
-                asyncio.run_coroutine_threadsafe(
-                    file_queue.put({"type": event_type, "data": data}),
-                    loop
-                )
+            # Use the captured event loop to safely put data, this works from the loop itself and from worker threads
+            asyncio.run_coroutine_threadsafe(
+                file_queue.put({"type": event_type, "data": data}),
+                loop
+            )
+            if verbose:
                 print(f"[BACKEND CALLBACK] Successfully queued: {filename}")
-            except Exception as e:
-                print(f"Error in callback: {e}")
-        
-        # Set the callback for this request
-        set_file_callback(file_callback)
-        
-        # Run the agent in a background thread
-        async def run_agent():
-            try:
-                result = await anyio.to_thread.run_sync(
-                    run_graph, 
-                    payload.prompt, 
-                    payload.search_method
-                )
-                session_id = result.get('session_id')
-                preview_url = result.get('preview_url')
-                session_id_holder['id'] = session_id
-                session_id_holder['preview_url'] = preview_url
-                
-                # Only send serializable data in complete event
-                await file_queue.put({
-                    "type": "complete", 
-                    "data": {
-                        "session_id": session_id,
-                        "preview_url": preview_url,
-                        "status": result.get("status", "unknown")
-                    }
-                })
-            except Exception as e:
-                await file_queue.put({"type": "error", "data": {"error": str(e)}})
-            finally:
-                set_file_callback(None)  # Clear callback
-        
-        # Start agent in background
-        agent_task = asyncio.create_task(run_agent())
-        
+        except Exception as e:
+            print(f"Error in callback: {e}")
+    
+    # Runs once a job worker picks this request up
+    async def run_agent(job):
+        # Set the callback for this request, keyed by session so concurrent jobs don't get each other's events
+        set_file_callback(file_callback, session_id)
         try:
+            result = await arun_graph(payload.prompt, payload.search_method, session_id=session_id)
+            preview_url = result.get('preview_url')
+            
+            # Only send serializable data in complete event
+            await file_queue.put({
+                "type": "complete", 
+                "data": {
+                    "session_id": session_id,
+                    "preview_url": preview_url,
+                    "status": result.get("status", "unknown")
+                }
+            })
+            return _job_result(result)
+        except Exception as e:
+            await file_queue.put({"type": "error", "data": {"error": str(e), "session_id": session_id}})
+            raise
+        finally:
+            set_file_callback(None, session_id)  # Clear callback
+    
+    # admission happens before the stream starts so a full queue is a real 429, not an error event
+    job = await _admit(request, payload.priority, run_agent, session_id)
+    
+    async def event_generator():
+        try:
+            yield f"data: {json.dumps({'type': 'queued', 'data': job_queue.describe(job)})}\n\n"
             while True:
                 event = await file_queue.get()
                 event_type = event["type"]
@@ -247,9 +342,9 @@ async def run_graph_stream_endpoint(payload: GraphRequest):
                 if event_type == "complete" or event_type == "error":
                     break
         finally:
-            # Clean up
-            if not agent_task.done():
-                agent_task.cancel()
+            # Clean up, the client went away
+            if not job.done.is_set():
+                job_queue.cancel(job)
     
     return StreamingResponse(
         event_generator(),
@@ -261,6 +356,11 @@ async def run_graph_stream_endpoint(payload: GraphRequest):
         }
     )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    # per node latency / token / sandbox histograms for every run this process has done (prometheus text format)
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/session/{session_id}/files")
 async def get_session_files(session_id: str):
     """Get all generated code files for a session (excluding plan directory)"""
@@ -361,6 +361,19 @@ const Chat = () => {
                 );
                 break;
 
+              case 'file_delta': {
+                // partial content while the coder is still generating, file_created below replaces it with the final file
+                const deltaFile = eventData.filename;
+                // offset 0 means a new generation of this file (fix mode rewrites the whole file)
+                const previous = eventData.offset === 0 ? '' : (streamedFiles[deltaFile] || '');
+                streamedFiles[deltaFile] = previous + eventData.delta;
+                const partialContent = streamedFiles[deltaFile];
+
+                setSessionFiles((prev) => ({ ...prev, [deltaFile]: partialContent }));
+                setSelectedFile((current) => current || deltaFile);
+                break;
+              }
+
               case 'file_created':
                 fileCount++;
                 const filename = eventData.filename;